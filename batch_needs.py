@@ -0,0 +1,199 @@
+"""Columnar batch evaluation of TetInsuranceAgent.analyze_needs
+
+For nightly targeting over the whole customer base. Profiles come in as
+columns (one array per profile field) instead of one dict per customer, and the
+four analyze_needs rules are evaluated as boolean masks:
+
+    travel    "Traveling" in tet_plans, or "trip" in tet_plans.lower(), and not has_travel
+    family    family_size > 2 and not has_life
+    motor     has_motor and "km" in tet_plans.lower()
+    business  business is truthy
+
+The masks are packed into a 4-bit rule pattern per customer, and the top
+MAX_RECOMMENDATIONS product keys for each of the 16 patterns are precomputed.
+Each customer's recommendations are then one table lookup. The result matches
+TetInsuranceAgent.recommended_products() (the distinct products of
+analyze_needs, in order) for every profile; --verify checks that row by row.
+
+tet_plans is free text with few distinct values, so its string tests run once
+per distinct plan. The column may be passed already dictionary-encoded as
+(categories, codes), as Parquet/Arrow dictionary columns provide.
+
+Usage:
+    python batch_needs.py --synthetic 1000000 --verify
+    python batch_needs.py --input customers.jsonl --output targets.jsonl
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+import config
+import tet_insurance_agent as rule_based
+
+RULES = ["travel", "family", "motor", "business"]  # analyze_needs order; bit i of a pattern is RULES[i]
+PRODUCT_KEYS = list(rule_based.INSURANCE_PRODUCTS)
+NO_PRODUCT = -1
+
+
+def pattern_table(limit: int = config.MAX_RECOMMENDATIONS) -> np.ndarray:
+    """Product codes (padded with NO_PRODUCT) for each of the 2**len(RULES) rule patterns"""
+    table = np.full((1 << len(RULES), limit), NO_PRODUCT, dtype=np.int8)
+    for pattern in range(1 << len(RULES)):
+        products = []
+        for bit, rule in enumerate(RULES):
+            if pattern >> bit & 1:
+                products += [key for key in rule_based.NEEDS_PRODUCTS[rule] if key not in products]
+        codes = [PRODUCT_KEYS.index(key) for key in products[:limit]]
+        table[pattern, :len(codes)] = codes
+    return table
+
+
+def factorize(values: Iterable[str]) -> Tuple[List[str], np.ndarray]:
+    """Dictionary-encode strings: (distinct values in first-seen order, code per value)"""
+    values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.intp, count=len(values))
+    return list(index), codes
+
+
+def _truthy(values: Sequence) -> np.ndarray:
+    """Python truthiness of every value"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        return values.astype(bool)
+    return np.fromiter(map(bool, values), dtype=bool, count=len(values))
+
+
+def _column(columns: Dict[str, Sequence], name: str, size: int, default) -> Sequence:
+    values = columns.get(name)
+    return [default] * size if values is None else values
+
+
+def rule_masks(columns: Dict[str, Sequence]) -> np.ndarray:
+    """Boolean (customers x RULES) matrix of the analyze_needs rules that fire"""
+    plans = columns.get('tet_plans')
+    if isinstance(plans, tuple):
+        categories, codes = plans
+    else:
+        categories, codes = factorize(_column(columns, 'tet_plans', len(next(iter(columns.values()))), ''))
+    size = len(codes)
+
+    # String tests once per distinct plan, then broadcast by code
+    lowered = [plan.lower() for plan in categories]
+    travel_plan = np.array([("Traveling" in plan or "trip" in low) for plan, low in zip(categories, lowered)], dtype=bool)
+    long_trip = np.array(["km" in low for low in lowered], dtype=bool)
+
+    masks = np.empty((size, len(RULES)), dtype=bool)
+    masks[:, 0] = travel_plan[codes] & ~_truthy(_column(columns, 'has_travel', size, False))
+    masks[:, 1] = (np.asarray(_column(columns, 'family_size', size, 0)) > 2) & ~_truthy(_column(columns, 'has_life', size, False))
+    masks[:, 2] = _truthy(_column(columns, 'has_motor', size, False)) & long_trip[codes]
+    masks[:, 3] = _truthy(_column(columns, 'business', size, None))
+    return masks
+
+
+def analyze_needs_batch(columns: Dict[str, Sequence], limit: int = config.MAX_RECOMMENDATIONS) -> np.ndarray:
+    """Top `limit` product codes (indices into PRODUCT_KEYS, NO_PRODUCT padded) per customer"""
+    masks = rule_masks(columns)
+    patterns = masks @ (1 << np.arange(len(RULES)))
+    return pattern_table(limit)[patterns]
+
+
+def decode(codes: np.ndarray) -> List[List[str]]:
+    """Product keys per customer from analyze_needs_batch codes"""
+    return [[PRODUCT_KEYS[code] for code in row if code != NO_PRODUCT] for row in codes.tolist()]
+
+
+def profiles_to_columns(profiles: Iterable[Dict]) -> Dict[str, list]:
+    """Columns of the profile fields the rules read (missing fields use analyze_needs defaults)"""
+    defaults = {'tet_plans': '', 'has_travel': False, 'family_size': 0, 'has_life': False,
+                'has_motor': False, 'business': None}
+    columns = {name: [] for name in defaults}
+    for profile in profiles:
+        for name, default in defaults.items():
+            columns[name].append(profile.get(name, default))
+    return columns
+
+
+def synthetic_profiles(count: int, seed: int = 0) -> Iterable[Dict]:
+    """Varied profiles around the CUSTOMER_PROFILES archetypes, covering every rule pattern"""
+    rng = random.Random(seed)
+    archetypes = list(rule_based.CUSTOMER_PROFILES.values())
+    plans = [profile['tet_plans'] for profile in archetypes] + [
+        "", "Road TRIP to Da Lat (400 KM)", "traveling to Hue", "Staying home", "Visiting parents 15km away",
+        "Trip", "Traveling", "Family gathering", "Weekend Trip to Vung Tau 120km"
+    ]
+    for index in range(count):
+        profile = dict(archetypes[index % len(archetypes)])
+        profile['customer_id'] = f"c-{index:07d}"
+        profile['tet_plans'] = rng.choice(plans)
+        profile['has_motor'] = rng.random() < 0.7
+        profile['has_life'] = rng.random() < 0.3
+        profile['has_travel'] = rng.random() < 0.2
+        profile['family_size'] = rng.randint(0, 6)
+        if rng.random() < 0.5:
+            profile.pop('business', None)
+        elif rng.random() < 0.5:
+            profile['business'] = rng.choice(["Restaurant", "Retail", ""])
+        yield profile
+
+
+def verify(profiles: List[Dict], codes: np.ndarray, limit: int) -> int:
+    """Rows where the batch result differs from TetInsuranceAgent.recommended_products"""
+    mismatches = 0
+    for profile, batch in zip(profiles, decode(codes)):
+        scalar = rule_based.TetInsuranceAgent(profile, "pre-tet").recommended_products(limit)
+        if scalar != batch:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch for {profile.get('customer_id')}: scalar {scalar} batch {batch}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch analyze_needs over a customer base")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Customer JSONL file (profile fields, optional customer_id)")
+    source.add_argument("--synthetic", type=int, help="Generate this many synthetic customers")
+    parser.add_argument("--output", help="Write {customer_id, products} JSONL")
+    parser.add_argument("--limit", type=int, default=config.MAX_RECOMMENDATIONS, help="Products per customer")
+    parser.add_argument("--verify", action="store_true", help="Check every row against the scalar analyze_needs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            profiles = [json.loads(line) for line in f if line.strip()]
+    else:
+        profiles = list(synthetic_profiles(args.synthetic, args.seed))
+    columns = profiles_to_columns(profiles)
+
+    started = time.perf_counter()
+    codes = analyze_needs_batch(columns, args.limit)
+    elapsed = time.perf_counter() - started
+    print(f"Customers: {len(profiles)}  Batch: {elapsed:.3f}s ({len(profiles) / elapsed:,.0f} customers/s)")
+
+    counts = np.bincount(codes[codes != NO_PRODUCT], minlength=len(PRODUCT_KEYS))
+    print("Recommended: " + "  ".join(f"{key} {count}" for key, count in zip(PRODUCT_KEYS, counts.tolist())))
+
+    if args.verify:
+        started = time.perf_counter()
+        mismatches = verify(profiles, codes, args.limit)
+        elapsed = time.perf_counter() - started
+        print(f"Verify: {mismatches} mismatches  (scalar: {len(profiles) / elapsed:,.0f} customers/s)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for index, (profile, products) in enumerate(zip(profiles, decode(codes))):
+                record = {'customer_id': profile.get('customer_id', index), 'products': products}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    if args.verify and mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Benchmark suite for the Tet Insurance AI Agent
+
+Covers SimpleEmbedding, KnowledgeBase add/search at several sizes, context
+building, ShortTermMemory and the rule-based agent's responses and destination
+lookups over a fixed corpus of Vietnamese/English prompts, the pricing
+engine's single and batch quotes, the bundle optimizer and the batch needs
+analysis. Gemini is replaced by StubBackend, so no
+API key or network is needed. Results are written as JSON so runs can be
+compared for regressions.
+
+Usage:
+    python benchmark.py                                 # full suite (10 .. 1M documents)
+    python benchmark.py --sizes 10,1000 --quick         # fast smoke run
+    python benchmark.py --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import warnings
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+
+warnings.filterwarnings("ignore", category=FutureWarning)  # google.generativeai deprecation notice
+
+import batch_needs
+import tet_insurance_agent as rule_based
+import tet_insurance_agent_gemini as gemini_agent
+from llm_backends import StubBackend
+
+
+DEFAULT_SIZES = [10, 1_000, 100_000, 1_000_000]
+BUILD_CHUNK = 50_000  # Documents embedded per add_documents call when building large bases
+
+# Fixed prompt corpus (Vietnamese and English)
+PROMPTS = [
+    "Tôi muốn đi du lịch Thái Lan dịp Tết",
+    "Giá bảo hiểm xe máy cho chuyến về quê bao nhiêu?",
+    "Tôi bị tai nạn, giúp tôi với",
+    "Có gói nào cho gia đình không?",
+    "Tôi có 3 người trong gia đình, cần bảo hiểm gì?",
+    "Có gói nào phù hợp với kế hoạch Tết của tôi không?",
+    "Tôi muốn đi Đà Nẵng 5 ngày",
+    "Đồng ý, tôi mua gói này",
+    "Không, đắt quá",
+    "I want travel insurance for a trip to Singapore",
+    "How much does family health insurance cost?",
+    "I had an accident on the highway, how do I claim?",
+    "ok sure",
+    "no thanks",
+    "What do you recommend for Tet?",
+    "Bảo hiểm nhân thọ có lợi gì?",
+]
+
+# Fragments for synthetic knowledge base documents
+DOC_FRAGMENTS = [
+    "Customer has motor insurance.", "Khách hàng có bảo hiểm sức khỏe gia đình.",
+    "Travel insurance covers medical emergencies.", "Bảo hiểm du lịch Tết giá ưu đãi.",
+    "Highway accidents increase during Tet.", "Claim processed within 30 minutes.",
+    "Bồi thường nhanh qua Zalo.", "Family Health Package covers dental.",
+    "Life insurance with savings and returns.", "Giảm giá 30% dịp Tết.",
+    "Policy renewal reminder.", "Khách hàng thích du lịch Đà Nẵng và Phú Quốc.",
+]
+
+
+def make_documents(n: int, seed: int = 0) -> List[tuple]:
+    """Deterministic synthetic (doc_id, content, metadata) documents"""
+    rng = random.Random(seed)
+    return [
+        (f"doc_{i}", " ".join(rng.choice(DOC_FRAGMENTS) for _ in range(rng.randint(1, 4))) + f" #{i}", {'category': 'synthetic'})
+        for i in range(n)
+    ]
+
+
+def summarize(samples: List[float], items_per_call: int = 1) -> Dict[str, float]:
+    """Per-call timing statistics in microseconds"""
+    samples_us = np.array(samples) * 1e6
+    return {
+        'calls': len(samples),
+        'items_per_call': items_per_call,
+        'mean_us': float(samples_us.mean()),
+        'p50_us': float(np.percentile(samples_us, 50)),
+        'p95_us': float(np.percentile(samples_us, 95)),
+        'min_us': float(samples_us.min()),
+        'items_per_sec': float(items_per_call * 1e6 / samples_us.mean())
+    }
+
+
+def measure(fn: Callable[[int], object], repeat: int, warmup: int = 3, items_per_call: int = 1) -> Dict[str, float]:
+    """Time fn(i) for i in range(repeat) after a few warmup calls"""
+    for i in range(warmup):
+        fn(i)
+
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+
+    return summarize(samples, items_per_call)
+
+
+def bench_embedding(results: Dict, repeat: int):
+    embedding = gemini_agent.SimpleEmbedding()
+    texts = [doc[1] for doc in make_documents(1000, seed=1)]
+
+    results['embedding.embed_text'] = measure(lambda i: embedding.embed_text(PROMPTS[i % len(PROMPTS)]), repeat * 10)
+    results['embedding.embed_batch[1000]'] = measure(lambda i: embedding.embed_batch(texts), max(repeat // 10, 3), items_per_call=len(texts))
+
+
+def bench_knowledge_base(results: Dict, sizes: List[int], repeat: int):
+    for size in sizes:
+        documents = make_documents(size)
+        kb = gemini_agent.KnowledgeBase()
+
+        # Bulk build
+        started = time.perf_counter()
+        for start in range(0, size, BUILD_CHUNK):
+            kb.add_documents(documents[start:start + BUILD_CHUNK])
+        results[f'kb.add_documents[{size}]'] = summarize([time.perf_counter() - started], items_per_call=size)
+        del documents
+
+        # Single adds on top of a base of this size
+        extra = make_documents(repeat, seed=2)
+        results[f'kb.add_document[{size}]'] = measure(lambda i: kb.add_document(*extra[i % len(extra)]), repeat, warmup=0)
+
+        # Search (fewer calls on the largest bases)
+        search_repeat = repeat if size <= 100_000 else max(repeat // 10, 5)
+        results[f'kb.search[{size}]'] = measure(lambda i: kb.search(PROMPTS[i % len(PROMPTS)], top_k=5), search_repeat)
+
+        del kb
+
+
+def bench_agent_pipeline(results: Dict, repeat: int):
+    profile = {**rule_based.CUSTOMER_PROFILES['young_professional'], 'travel_history': ["Da Nang", "Phu Quoc"]}
+    agent = gemini_agent.TetInsuranceAgent("benchmark-key", profile, "tet-peak", llm_backend=StubBackend())
+
+    # Measure the full LLM path: no response cache or rule-engine shortcut
+    agent.response_cache = None
+    agent.router = None
+    agent.latency_tracker = None
+
+    results['agent.construct'] = measure(
+        lambda i: gemini_agent.TetInsuranceAgent("benchmark-key", profile, "tet-peak", llm_backend=StubBackend()), repeat
+    )
+    results['agent._build_context'] = measure(lambda i: agent._build_context(PROMPTS[i % len(PROMPTS)]), repeat)
+    results['agent._create_system_prompt'] = measure(lambda i: agent._create_system_prompt(), repeat)
+
+    def turn(i):
+        agent.generate_response(PROMPTS[i % len(PROMPTS)])
+    results['agent.generate_response[stub_llm]'] = measure(turn, repeat)
+
+
+def bench_memory(results: Dict, repeat: int):
+    memory = gemini_agent.ShortTermMemory(max_items=10)
+    types = ['user_intent', 'product_interest', 'concern', 'decision', 'conversation']
+    for i in range(10):
+        memory.add(types[i % len(types)], f"item {i}", {'query': PROMPTS[i % len(PROMPTS)]})
+
+    results['memory.add'] = measure(lambda i: memory.add(types[i % len(types)], f"item {i}"), repeat * 10)
+    results['memory.get_recent'] = measure(lambda i: memory.get_recent(5), repeat * 10)
+    results['memory.get_by_type'] = measure(lambda i: memory.get_by_type('user_intent'), repeat * 10)
+    results['memory.summarize'] = measure(lambda i: memory.summarize(), repeat * 10)
+
+
+def bench_rule_agent(results: Dict, repeat: int):
+    agents = [
+        rule_based.TetInsuranceAgent(profile, phase)
+        for profile in rule_based.CUSTOMER_PROFILES.values()
+        for phase in rule_based.TET_PHASES
+    ]
+
+    def corpus(i):
+        agent = agents[i % len(agents)]
+        for prompt in PROMPTS:
+            agent.generate_response(prompt)
+
+    results['rule_agent.generate_response[corpus]'] = measure(corpus, repeat, items_per_call=len(PROMPTS))
+    results['rule_agent.find_destination'] = measure(
+        lambda i: rule_based.find_destination(PROMPTS[i % len(PROMPTS)]), repeat * 10
+    )
+
+
+def bench_pricing(results: Dict, repeat: int, batch: int = 10_000):
+    engine = rule_based.PRICING
+    rng = np.random.default_rng(0)
+    products = rng.choice(engine.products, batch)
+    phases = rng.choice(engine.phases, batch)
+    days = rng.integers(1, engine.max_days + 1, batch)
+    zones = rng.choice(engine.zones, batch)
+
+    results['pricing.trip_quote'] = measure(lambda i: engine.trip_quote('asean', 'tet-peak', 1 + i % engine.max_days), repeat * 10)
+    results[f'pricing.quote[{batch}]'] = measure(lambda i: engine.quote(products, phases, days, zones), repeat, items_per_call=batch)
+
+    bundles = rule_based.BUNDLES
+    profiles = list(rule_based.CUSTOMER_PROFILES.values())
+
+    def cold_bundle(i):
+        bundles.best_bundle.cache_clear()
+        return bundles.optimize(3_000_000, 'tet-peak', profiles[i % len(profiles)])
+
+    results['bundles.optimize[cold]'] = measure(cold_bundle, repeat * 10)
+    results['bundles.optimize[memoized]'] = measure(
+        lambda i: bundles.optimize(3_000_000, 'tet-peak', profiles[i % len(profiles)]), repeat * 10
+    )
+
+    customers = list(batch_needs.synthetic_profiles(batch))
+    columns = batch_needs.profiles_to_columns(customers)
+    results[f'batch_needs.analyze_needs_batch[{batch}]'] = measure(
+        lambda i: batch_needs.analyze_needs_batch(columns), repeat, items_per_call=batch
+    )
+    results['rule_agent.recommended_products'] = measure(
+        lambda i: rule_based.TetInsuranceAgent(customers[i % batch], 'tet-peak').recommended_products(), repeat * 10
+    )
+
+
+def compare(previous: Dict, current: Dict, threshold: float = 1.2):
+    """Print p50 ratios against a previous run (ratio > threshold is flagged)"""
+    print(f"\n{'benchmark':48} {'old p50 µs':>12} {'new p50 µs':>12} {'ratio':>7}")
+    for name, stats in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        ratio = stats['p50_us'] / old['p50_us'] if old['p50_us'] else float('inf')
+        flag = "  <-- regression" if ratio > threshold else ""
+        print(f"{name:48} {old['p50_us']:12.1f} {stats['p50_us']:12.1f} {ratio:7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tet Insurance AI Agent benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated knowledge base sizes")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per benchmark")
+    parser.add_argument("--quick", action="store_true", help="Fewer calls per benchmark")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON output path")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    repeat = 20 if args.quick else args.repeat
+
+    results = {}
+    bench_embedding(results, repeat)
+    bench_memory(results, repeat)
+    bench_rule_agent(results, repeat)
+    bench_pricing(results, repeat)
+    bench_agent_pipeline(results, repeat)
+    bench_knowledge_base(results, sizes, repeat)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{'benchmark':48} {'p50 µs':>12} {'p95 µs':>12} {'items/s':>14}")
+    for name, stats in results.items():
+        print(f"{name:48} {stats['p50_us']:12.1f} {stats['p95_us']:12.1f} {stats['items_per_sec']:14,.0f}")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f)['results'], results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Best-coverage insurance bundles under a customer budget
+
+The optimizer picks the set of products with the largest total coverage
+whose price fits the budget, given the customer's existing policies:
+
+- A product with an `owned_flag` the customer already has is not offered
+  again (`has_health` -> family_health, `has_life` -> life_savings)
+- A product with a `requires` flag is only offered on top of that policy
+  (`has_motor` -> motor_extension)
+- At most one product per `bundle_group` (one travel policy per trip)
+- Each product costs its phase-discounted catalog price; two or more
+  products get BUNDLE_DISCOUNT off the total
+
+It is a 0/1 knapsack solved by dynamic programming over the products. States
+are (list cost, groups used, one product or several), each keeping its best
+coverage. States that could not fit the budget even with the bundle discount
+are pruned. Budgets are rounded down to `budget_bucket` VND, and results are
+memoized by (budget bucket, owned-policy mask, phase), so repeated questions
+are answered from the cache (treat the returned dicts as read-only).
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import config
+from pricing import PricingEngine
+
+OWNED_POLICY_FLAGS = ("has_motor", "has_health", "has_life")
+
+
+class BundleOptimizer:
+    """Memoized DP knapsack over a product catalog"""
+
+    def __init__(self, products: Dict[str, Dict], pricing: PricingEngine,
+                 bundle_discount: float = config.BUNDLE_DISCOUNT,
+                 budget_bucket: int = config.BUNDLE_BUDGET_BUCKET, cache_size: int = 4096):
+        self.products = products
+        self.pricing = pricing
+        self.bundle_discount = bundle_discount
+        self.budget_bucket = budget_bucket
+        self.best_bundle = lru_cache(maxsize=cache_size)(self._best_bundle)
+
+    @staticmethod
+    def owned_mask(profile: Dict) -> int:
+        """Bit mask of OWNED_POLICY_FLAGS the customer has"""
+        return sum(1 << bit for bit, flag in enumerate(OWNED_POLICY_FLAGS) if profile.get(flag))
+
+    def _eligible(self, owned_mask: int) -> List[str]:
+        owned = {flag for bit, flag in enumerate(OWNED_POLICY_FLAGS) if owned_mask >> bit & 1}
+        return [
+            key for key, product in self.products.items()
+            if product.get('owned_flag') not in owned
+            and (product.get('requires') is None or product['requires'] in owned)
+        ]
+
+    def _bundle_price(self, cost: int, count: int) -> int:
+        return round(cost * (1 - self.bundle_discount)) if count >= 2 else cost
+
+    def optimize(self, budget: int, phase: str, profile: Dict) -> Optional[Dict[str, object]]:
+        """Best bundle for a customer within budget (VND), or None if nothing fits"""
+        return self.best_bundle(int(budget) // self.budget_bucket, self.owned_mask(profile), phase)
+
+    def _best_bundle(self, budget_bucket: int, owned_mask: int, phase: str) -> Optional[Dict[str, object]]:
+        budget = budget_bucket * self.budget_bucket
+        groups = {}
+        # (list cost, groups used bit mask, several products) -> (coverage, products)
+        states: Dict[Tuple[int, int, bool], Tuple[int, Tuple[str, ...]]] = {(0, 0, False): (0, ())}
+
+        for key in self._eligible(owned_mask):
+            product = self.products[key]
+            price = self.pricing.catalog_price(key, phase)
+            group = product.get('bundle_group')
+            group_bit = 1 << groups.setdefault(group, len(groups)) if group else 0
+
+            for (cost, used, _), (coverage, chosen) in list(states.items()):
+                if used & group_bit:
+                    continue
+                new_cost = cost + price
+                if self._bundle_price(new_cost, 2) > budget:
+                    continue  # Over budget even with the bundle discount, and costs only grow
+                state = (new_cost, used | group_bit, bool(chosen))
+                candidate = (coverage + product['coverage_amount'], chosen + (key,))
+                if candidate[0] > states.get(state, (-1, ()))[0]:
+                    states[state] = candidate
+
+        best = None
+        for (cost, _, _), (coverage, chosen) in states.items():
+            if not chosen:
+                continue
+            price = self._bundle_price(cost, len(chosen))
+            if price > budget:
+                continue
+            rank = (coverage, -price, -len(chosen))
+            if best is None or rank > best[0]:
+                best = (rank, cost, price, chosen)
+
+        if best is None:
+            return None
+        _, cost, price, chosen = best
+        return {
+            'products': chosen,
+            'coverage': sum(self.products[key]['coverage_amount'] for key in chosen),
+            'list_price': cost,
+            'bundle_discount': self.bundle_discount if len(chosen) >= 2 else 0.0,
+            'price': price,
+            'budget': budget
+        }
@@ -0,0 +1,259 @@
+"""Bulk proactive Tet outreach campaigns
+
+Streams customers from a JSONL file (or synthetic customers built from the
+CUSTOMER_PROFILES archetypes), generates one personalized proactive message per
+customer for one of the SUPPORTED_PLATFORMS, and appends each result to a JSONL
+output file as soon as it is ready.
+
+- Bounded memory: customers are read lazily through a bounded queue
+- Bounded concurrency: --workers customers in flight, LLM calls further limited
+  by the shared AsyncLLMClient (--llm-concurrency)
+- Checkpoint/resume: the output file is the checkpoint. Re-running with the same
+  --output skips customers that already have a record (use --retry-errors to
+  redo failed ones); a partial last line from a crash is discarded
+- Throughput statistics are printed while running and written to
+  <output>.stats.json at the end
+
+Input records are customer profiles with a unique `customer_id`. An optional
+`archetype` (a CUSTOMER_PROFILES key) fills in missing fields, and optional
+`platform` / `phase` override the campaign defaults:
+
+    {"customer_id": "c-000001", "archetype": "family", "name": "Lan Pham", "age": 33}
+
+Usage:
+    python campaign.py --input customers.jsonl --output greetings.jsonl --phase pre-tet
+    python campaign.py --synthetic 100000 --backend stub --output greetings.jsonl --workers 500
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import warnings
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Set
+
+import numpy as np
+
+warnings.filterwarnings("ignore", category=FutureWarning)  # google.generativeai deprecation notice
+
+import config
+import tet_insurance_agent as rule_based
+import tet_insurance_agent_gemini as gemini_agent
+from llm_backends import StubBackend, create_backend
+
+
+def load_customers(path: str) -> Iterator[Dict]:
+    """Stream customer records from a JSONL file (blank lines are skipped)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def synthetic_customers(count: int, seed: int = 0) -> Iterator[Dict]:
+    """Deterministic synthetic customers derived from the CUSTOMER_PROFILES archetypes"""
+    rng = random.Random(seed)
+    archetypes = list(rule_based.CUSTOMER_PROFILES)
+    for index in range(count):
+        archetype = archetypes[index % len(archetypes)]
+        profile = dict(rule_based.CUSTOMER_PROFILES[archetype])
+        profile['customer_id'] = f"c-{index:07d}"  # After the copy: archetypes carry their own demo id
+        profile['name'] = f"{profile['name']} #{index}"
+        profile['age'] = max(18, profile['age'] + rng.randint(-5, 5))
+        yield {'archetype': archetype, **profile}
+
+
+def make_profile(record: Dict) -> Dict:
+    """Agent profile for an input record (archetype defaults, then the record's own fields)"""
+    defaults = rule_based.CUSTOMER_PROFILES.get(record.get('archetype'), {})
+    return {**defaults, **record}
+
+
+def pick_platform(customer_id: str, platforms: List[str]) -> str:
+    """Stable platform assignment so a resumed run sends to the same channel"""
+    digest = hashlib.sha256(customer_id.encode('utf-8')).digest()
+    return platforms[int.from_bytes(digest[:4], 'big') % len(platforms)]
+
+
+def read_checkpoint(path: str, retry_errors: bool = False) -> Set[str]:
+    """Customer ids already in the output file; drops a partial trailing line"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+
+    for line in data[:end].decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get('status') == 'ok' or not retry_errors:
+            done.add(record['customer_id'])
+    return done
+
+
+class CampaignStats:
+    """Running counters and latency samples for a campaign"""
+
+    def __init__(self, resumed: int = 0):
+        self.started = time.perf_counter()
+        self.resumed = resumed
+        self.sent = 0
+        self.errors = 0
+        self.platforms = Counter()
+        self.latencies = []
+
+    def record(self, platform: str, latency: float, ok: bool):
+        if ok:
+            self.sent += 1
+            self.platforms[platform] += 1
+        else:
+            self.errors += 1
+        self.latencies.append(latency)
+
+    def snapshot(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        processed = self.sent + self.errors
+        p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99]) if self.latencies else (0.0, 0.0, 0.0)
+        return {
+            'processed': processed,
+            'sent': self.sent,
+            'errors': self.errors,
+            'resumed_skipped': self.resumed,
+            'elapsed_s': elapsed,
+            'throughput_per_s': processed / elapsed if elapsed else 0.0,
+            'latency_s': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)},
+            'platforms': dict(self.platforms)
+        }
+
+
+async def process_customer(record: Dict, args, backend, client, platforms: List[str]) -> Dict:
+    """Generate one customer's message; failures become error records"""
+    customer_id = str(record['customer_id'])
+    platform = record.get('platform') or pick_platform(customer_id, platforms)
+    phase = record.get('phase') or args.phase
+    started = time.perf_counter()
+
+    result = {'customer_id': customer_id, 'platform': platform, 'phase': phase}
+    try:
+        profile = make_profile(record)
+        agent = gemini_agent.TetInsuranceAgent(
+            args.api_key, profile, phase,
+            knowledge_index_path=args.knowledge_index,
+            async_llm_client=client, llm_backend=backend
+        )
+        message = await agent.get_proactive_message_async(platform, deadline=args.deadline)
+        result.update(status='ok', name=profile['name'], message=message,
+                      context_tokens=agent.last_context_stats['tokens'])
+    except Exception as e:
+        result.update(status='error', error=f"{type(e).__name__}: {e}")
+
+    result['latency_s'] = round(time.perf_counter() - started, 4)
+    result['completed_at'] = datetime.now().isoformat(timespec='seconds')
+    return result
+
+
+async def run(args) -> Dict:
+    platforms = args.platforms.split(",") if args.platforms else config.SUPPORTED_PLATFORMS
+    customers = load_customers(args.input) if args.input else synthetic_customers(args.synthetic, args.seed)
+
+    done = read_checkpoint(args.output, args.retry_errors)
+    stats = CampaignStats(resumed=len(done))
+
+    if args.backend == "stub":
+        backend = StubBackend(latency=args.stub_latency)
+    else:
+        backend = create_backend(args.backend, args.api_key, model_name=config.GEMINI_MODEL)
+    client = gemini_agent.AsyncLLMClient(
+        max_concurrency=args.llm_concurrency,
+        timeout=config.LLM_TIMEOUT_SECONDS,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=config.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=config.LLM_BACKOFF_MAX_SECONDS
+    )
+
+    queue = asyncio.Queue(maxsize=args.workers * 2)
+
+    async def produce():
+        for record in customers:
+            if str(record['customer_id']) in done:
+                continue
+            await queue.put(record)
+        for _ in range(args.workers):
+            await queue.put(None)
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        async def work():
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                result = await process_customer(record, args, backend, client, platforms)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                stats.record(result['platform'], result['latency_s'], result['status'] == 'ok')
+
+        async def report():
+            while True:
+                await asyncio.sleep(args.progress_every)
+                snapshot = stats.snapshot()
+                print(f"[{snapshot['elapsed_s']:7.1f}s] sent {snapshot['sent']}  errors {snapshot['errors']}  "
+                      f"{snapshot['throughput_per_s']:.1f} msg/s  p95 {snapshot['latency_s']['p95']:.2f}s", flush=True)
+
+        reporter = asyncio.create_task(report())
+        try:
+            await asyncio.gather(produce(), *[work() for _ in range(args.workers)])
+        finally:
+            reporter.cancel()
+
+    return stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk proactive Tet outreach campaign")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Customer JSONL file")
+    source.add_argument("--synthetic", type=int, help="Generate this many synthetic customers")
+    parser.add_argument("--output", required=True, help="Result JSONL file (also the resume checkpoint)")
+    parser.add_argument("--phase", default="pre-tet", choices=list(rule_based.TET_PHASES), help="Default Tet phase")
+    parser.add_argument("--platforms", help=f"Comma-separated subset of {', '.join(config.SUPPORTED_PLATFORMS)}")
+    parser.add_argument("--backend", default=config.LLM_BACKEND, choices=["gemini", "stub"])
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY", ""), help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--workers", type=int, default=200, help="Customers in flight at once")
+    parser.add_argument("--llm-concurrency", type=int, default=config.LLM_MAX_CONCURRENCY, help="Concurrent LLM calls")
+    parser.add_argument("--deadline", type=float, default=config.TARGET_RESPONSE_TIME, help="Per-message LLM deadline (s)")
+    parser.add_argument("--knowledge-index", default=config.KNOWLEDGE_INDEX_DIR, help="Prebuilt shared knowledge index")
+    parser.add_argument("--retry-errors", action="store_true", help="On resume, redo customers whose last record failed")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Stub backend latency per call (s)")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.backend == "gemini" and not args.api_key:
+        parser.error("--api-key or GEMINI_API_KEY is required for the gemini backend")
+
+    report = asyncio.run(run(args))
+
+    with open(args.output + ".stats.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    latency = report['latency_s']
+    print(f"Processed: {report['processed']}  Sent: {report['sent']}  Errors: {report['errors']}  "
+          f"Skipped (already done): {report['resumed_skipped']}")
+    print(f"Throughput: {report['throughput_per_s']:.1f} msg/s over {report['elapsed_s']:.1f}s")
+    print(f"Latency: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s")
+    print(f"Platforms: {report['platforms']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,15 +17,65 @@ POST_TET_START = "2025-02-06"
 # Discount Settings
 TET_PEAK_DISCOUNT = 0.30  # 30% discount during peak
 EARLY_BIRD_DISCOUNT = 0.15  # 15% discount for pre-Tet
+POST_TET_DISCOUNT = 0.10  # 10% discount after Tet (renewals)
 BUNDLE_DISCOUNT = 0.20  # 20% discount for multiple products
+MAX_TRIP_DAYS = 30  # Longest trip in the travel quote tables
+
+# Bundle Offers (best-coverage combo under a budget)
+BUNDLE_BUDGETS = {"low": 1000000, "medium": 3000000, "high": 8000000}  # Default budget (VND) by profile income
+BUNDLE_BUDGET_BUCKET = 50000  # Budgets are rounded down to this step (VND) for caching
 
 # Response Time Settings
 TARGET_RESPONSE_TIME = 30  # seconds
+STREAM_RESPONSES = True  # Render Gemini replies chunk by chunk instead of after a spinner
 CLAIM_CALLBACK_TIME = 30  # minutes
 
+# LLM Backend
+LLM_BACKEND = "gemini"  # "gemini" or "stub" (deterministic offline backend)
+GEMINI_MODEL = "gemini-2.5-flash"
+API_KEY_VALIDATION = "metadata"  # "metadata" (free model lookup) or "lazy" (first real request)
+API_KEY_VALIDATION_TTL_SECONDS = 3600  # Validation results are shared process-wide by key hash
+API_KEY_VALIDATION_RETRY_SECONDS = 60  # An unreachable API leaves the key unverified; check again after this long
+API_KEY_VALIDATION_TIMEOUT_SECONDS = 5  # Per model lookup (not retried)
+
+# LLM Call Settings (async path)
+LLM_MAX_CONCURRENCY = 16  # Concurrent Gemini calls per process
+LLM_TIMEOUT_SECONDS = 20  # Deadline per attempt
+LLM_MAX_RETRIES = 3  # Retries on rate limits / transient upstream errors
+LLM_BACKOFF_BASE_SECONDS = 0.5  # Exponential backoff base (full jitter)
+LLM_BACKOFF_MAX_SECONDS = 8
+
+# Circuit Breaker (answer with the rule-based agent while Gemini is failing)
+CIRCUIT_BREAKER_ENABLED = True
+CIRCUIT_BREAKER_WINDOW = 20  # Most recent LLM calls considered
+CIRCUIT_BREAKER_MIN_CALLS = 10  # Calls needed in the window before the breaker can open
+CIRCUIT_BREAKER_ERROR_RATE = 0.5
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = 15
+CIRCUIT_BREAKER_SLOW_CALL_RATE = 0.8
+CIRCUIT_BREAKER_OPEN_SECONDS = 30  # Time before half-open probes
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = 3  # Successful probes needed to close again
+
+# LLM Priority Scheduling (async path): claims, then purchase flows, then browsing/proactive
+LLM_PRIORITY_SHARE = {"claim": 1.0, "purchase": 0.75, "browsing": 0.5}  # Fraction of LLM_MAX_CONCURRENCY per class
+LLM_PRIORITY_QUEUE_DEPTH = {"claim": None, "purchase": 500, "browsing": 200}  # Waiting calls before rejecting (None: unbounded)
+
+# Prompt Context
+CONTEXT_TOKEN_BUDGET = 600  # Estimated tokens for profile, phase, knowledge and memory (system prompt excluded)
+
+# Response Cache (repeated customer questions)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SIZE = 1024  # Max cached answers per process (LRU eviction)
+RESPONSE_CACHE_TTL_SECONDS = 3600
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = None  # e.g. 0.97 to also reuse near-identical questions
+RESPONSE_CACHE_EXCLUDE_PERSONALIZED = False  # True: never cache history-based answers (else cached per customer_id)
+
 # Payment Methods
 PAYMENT_METHODS = ["MoMo", "ZaloPay", "VNPay", "Bank Transfer"]
 
+# Agent Pool & Knowledge Index
+AGENT_POOL_SIZE = 256  # Max live agents kept per process (LRU eviction)
+KNOWLEDGE_INDEX_DIR = None  # e.g. "knowledge_index" to memory-map a prebuilt shared index
+
 # Messaging Platforms
 SUPPORTED_PLATFORMS = ["Zalo", "Facebook Messenger", "Website Chat", "Mobile App"]
 
@@ -70,8 +120,10 @@ TRACK_RESPONSE_TIME = True
 
 # Feature Flags
 ENABLE_QUICK_QUOTE = True
+ENABLE_HYBRID_ROUTING = True  # Answer claims/quick quotes with the rule engine before calling Gemini
 ENABLE_CLAIM_SUPPORT = True
 ENABLE_PRODUCT_RECOMMENDATIONS = True
+ENABLE_BUNDLE_OFFERS = True  # Answer "which package?" questions with the bundle optimizer
 ENABLE_MULTI_CHANNEL_SYNC = True
 ENABLE_GAMIFICATION = False  # Lì xì (red envelope) features
 
@@ -0,0 +1,214 @@
+"""Destination gazetteer for travel quick quotes
+
+Every Vietnamese province and the main cities and resorts, the ASEAN countries
+and their main destinations, and popular long-haul destinations, each mapped
+to a pricing zone (see TRAVEL_ZONES in tet_insurance_agent.py).
+
+Names and aliases ("Sài Gòn", "HCMC", "sai gon") are indexed in a trie keyed on
+diacritic-folded word tokens, so a lookup costs one trie walk per word of the
+message whatever the size of the gazetteer, and the longest name wins ("Lao
+Cai" over "Laos", "Thua Thien Hue" over "Hue"). As in intent_matcher, a message
+typed without diacritics matches the folded spelling of multi-word names, while
+one typed with diacritics must spell a name or alias exactly ("lao động" is
+not Laos, "huệ" is not Hue, but "đi da nang" is Da Nang). A folded single word
+is usually another common word, so one-word aliases with diacritics ("Lào",
+"Úc") match only as spelled: "lao dong" is not Laos either.
+
+Aliases that are also common Vietnamese words ("Mỹ", "Pháp", "Nhật", "Anh",
+"Ý") are deliberately left out; their longer forms ("nước Mỹ", "Nhật Bản")
+are listed instead.
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from intent_matcher import fold_diacritics, tokenize
+
+# Message vocabulary is small, and folding is most of the cost of a lookup
+_fold_token = lru_cache(maxsize=65536)(fold_diacritics)
+
+
+class Destination(NamedTuple):
+    name: str
+    zone: str
+    country: str
+
+
+# Vietnamese provinces and centrally-run cities: (name, aliases)
+VIETNAM_PROVINCES = [
+    ("An Giang", ["An Giang"]), ("Ba Ria - Vung Tau", ["Bà Rịa - Vũng Tàu", "Bà Rịa Vũng Tàu"]),
+    ("Bac Giang", ["Bắc Giang"]), ("Bac Kan", ["Bắc Kạn", "Bac Can"]), ("Bac Lieu", ["Bạc Liêu"]),
+    ("Bac Ninh", ["Bắc Ninh"]), ("Ben Tre", ["Bến Tre"]), ("Binh Dinh", ["Bình Định"]),
+    ("Binh Duong", ["Bình Dương"]), ("Binh Phuoc", ["Bình Phước"]), ("Binh Thuan", ["Bình Thuận"]),
+    ("Ca Mau", ["Cà Mau"]), ("Can Tho", ["Cần Thơ"]), ("Cao Bang", ["Cao Bằng"]),
+    ("Da Nang", ["Đà Nẵng", "Danang"]), ("Dak Lak", ["Đắk Lắk", "Dak Lac", "Daklak"]),
+    ("Dak Nong", ["Đắk Nông"]), ("Dien Bien", ["Điện Biên"]), ("Dong Nai", ["Đồng Nai"]),
+    ("Dong Thap", ["Đồng Tháp"]), ("Gia Lai", ["Gia Lai"]), ("Ha Giang", ["Hà Giang"]),
+    ("Ha Nam", ["Hà Nam"]), ("Ha Noi", ["Hà Nội", "Hanoi", "Thủ đô Hà Nội"]), ("Ha Tinh", ["Hà Tĩnh"]),
+    ("Hai Duong", ["Hải Dương"]), ("Hai Phong", ["Hải Phòng", "Haiphong"]), ("Hau Giang", ["Hậu Giang"]),
+    ("Hoa Binh", ["Hòa Bình", "Hoà Bình"]), ("Hung Yen", ["Hưng Yên"]), ("Khanh Hoa", ["Khánh Hòa", "Khánh Hoà"]),
+    ("Kien Giang", ["Kiên Giang"]), ("Kon Tum", ["Kon Tum", "Kontum"]), ("Lai Chau", ["Lai Châu"]),
+    ("Lam Dong", ["Lâm Đồng"]), ("Lang Son", ["Lạng Sơn"]), ("Lao Cai", ["Lào Cai"]),
+    ("Long An", ["Long An"]), ("Nam Dinh", ["Nam Định"]), ("Nghe An", ["Nghệ An"]),
+    ("Ninh Binh", ["Ninh Bình"]), ("Ninh Thuan", ["Ninh Thuận"]), ("Phu Tho", ["Phú Thọ"]),
+    ("Phu Yen", ["Phú Yên"]), ("Quang Binh", ["Quảng Bình"]), ("Quang Nam", ["Quảng Nam"]),
+    ("Quang Ngai", ["Quảng Ngãi"]), ("Quang Ninh", ["Quảng Ninh"]), ("Quang Tri", ["Quảng Trị"]),
+    ("Soc Trang", ["Sóc Trăng"]), ("Son La", ["Sơn La"]), ("Tay Ninh", ["Tây Ninh"]),
+    ("Thai Binh", ["Thái Bình"]), ("Thai Nguyen", ["Thái Nguyên"]), ("Thanh Hoa", ["Thanh Hóa", "Thanh Hoá"]),
+    ("Thua Thien Hue", ["Thừa Thiên Huế", "Thừa Thiên - Huế"]), ("Tien Giang", ["Tiền Giang"]),
+    ("Tra Vinh", ["Trà Vinh"]), ("Tuyen Quang", ["Tuyên Quang"]), ("Vinh Long", ["Vĩnh Long"]),
+    ("Vinh Phuc", ["Vĩnh Phúc"]), ("Yen Bai", ["Yên Bái"]),
+    ("Ho Chi Minh City", ["Thành phố Hồ Chí Minh", "TP Hồ Chí Minh", "TP. HCM", "TPHCM", "HCMC",
+                          "Hồ Chí Minh", "Sài Gòn", "Saigon", "sai gon"]),
+]
+
+# Cities, islands and resorts within the provinces above
+VIETNAM_DESTINATIONS = [
+    ("Nha Trang", ["Nha Trang"]), ("Phu Quoc", ["Phú Quốc", "đảo ngọc"]), ("Da Lat", ["Đà Lạt", "Dalat"]),
+    ("Hoi An", ["Hội An"]), ("Hue", ["Huế", "Cố đô Huế"]), ("Ha Long", ["Hạ Long", "Halong", "Vịnh Hạ Long"]),
+    ("Sa Pa", ["Sapa"]), ("Vung Tau", ["Vũng Tàu"]), ("Mui Ne", ["Mũi Né"]), ("Con Dao", ["Côn Đảo"]),
+    ("Quy Nhon", ["Quy Nhơn", "Qui Nhon"]), ("Phan Thiet", ["Phan Thiết"]), ("Vinh", ["Vinh"]),
+    ("Buon Ma Thuot", ["Buôn Ma Thuột", "Buon Me Thuot"]), ("Pleiku", ["Pleiku", "Plei Ku"]),
+    ("Cat Ba", ["Cát Bà"]), ("Phong Nha", ["Phong Nha - Kẻ Bàng", "Phong Nha"]), ("Tam Coc", ["Tam Cốc"]),
+    ("Trang An", ["Tràng An"]), ("Ly Son", ["Lý Sơn"]), ("Moc Chau", ["Mộc Châu"]), ("Mai Chau", ["Mai Châu"]),
+    ("Ha Tien", ["Hà Tiên"]), ("Chau Doc", ["Châu Đốc"]), ("Rach Gia", ["Rạch Giá"]), ("My Tho", ["Mỹ Tho"]),
+    ("Dong Hoi", ["Đồng Hới"]), ("Tuy Hoa", ["Tuy Hòa", "Tuy Hoà"]), ("Cam Ranh", ["Cam Ranh"]),
+    ("Bien Hoa", ["Biên Hòa", "Biên Hoà"]), ("Thu Duc", ["Thủ Đức"]),
+    ("Mu Cang Chai", ["Mù Cang Chải"]), ("Tam Dao", ["Tam Đảo"]), ("Ba Na Hills", ["Bà Nà", "Bà Nà Hills"]),
+    ("Cu Lao Cham", ["Cù Lao Chàm"]), ("Nam Du", ["Nam Du"]), ("Co To", ["Cô Tô"]),
+]
+
+# Countries and destinations by pricing zone: (name, country, aliases)
+ASEAN_DESTINATIONS = [
+    ("Thailand", "Thailand", ["Thái Lan", "Thai Lan"]), ("Bangkok", "Thailand", ["Băng Cốc"]),
+    ("Phuket", "Thailand", []), ("Chiang Mai", "Thailand", ["Chiangmai"]), ("Pattaya", "Thailand", []),
+    ("Krabi", "Thailand", []), ("Singapore", "Singapore", ["Xin-ga-po", "Singapo"]),
+    ("Malaysia", "Malaysia", ["Mã Lai"]), ("Kuala Lumpur", "Malaysia", ["KL"]), ("Penang", "Malaysia", []),
+    ("Langkawi", "Malaysia", []), ("Philippines", "Philippines", ["Philippin", "Phi-líp-pin", "Phi Luật Tân"]),
+    ("Manila", "Philippines", []), ("Cebu", "Philippines", []), ("Boracay", "Philippines", []),
+    ("Indonesia", "Indonesia", ["In-đô-nê-xi-a"]), ("Bali", "Indonesia", []), ("Jakarta", "Indonesia", []),
+    ("Cambodia", "Cambodia", ["Campuchia", "Cam-pu-chia"]), ("Siem Reap", "Cambodia", ["Xiêm Riệp"]),
+    ("Phnom Penh", "Cambodia", ["Nông Pênh", "Phnompenh"]), ("Laos", "Laos", ["Lào", "nước Lào"]),
+    ("Vientiane", "Laos", ["Viêng Chăn"]), ("Luang Prabang", "Laos", ["Luông Pha Băng"]),
+    ("Myanmar", "Myanmar", ["Miến Điện", "Burma"]), ("Yangon", "Myanmar", ["Rangoon"]),
+    ("Brunei", "Brunei", []), ("Bandar Seri Begawan", "Brunei", []),
+    ("Timor-Leste", "Timor-Leste", ["Đông Timor", "East Timor"]),
+]
+
+ASIA_DESTINATIONS = [
+    ("Japan", "Japan", ["Nhật Bản", "nước Nhật"]), ("Tokyo", "Japan", []), ("Osaka", "Japan", []),
+    ("Kyoto", "Japan", []), ("Hokkaido", "Japan", []), ("South Korea", "South Korea", ["Hàn Quốc", "Korea"]),
+    ("Seoul", "South Korea", ["Xơ-un"]), ("Busan", "South Korea", []), ("Jeju", "South Korea", ["Đảo Jeju"]),
+    ("China", "China", ["Trung Quốc"]), ("Beijing", "China", ["Bắc Kinh"]), ("Shanghai", "China", ["Thượng Hải"]),
+    ("Guangzhou", "China", ["Quảng Châu"]), ("Hong Kong", "China", ["Hồng Kông", "Hongkong"]),
+    ("Macau", "China", ["Ma Cao", "Macao"]), ("Taiwan", "Taiwan", ["Đài Loan"]), ("Taipei", "Taiwan", ["Đài Bắc"]),
+    ("India", "India", ["Ấn Độ"]), ("Nepal", "Nepal", []), ("Sri Lanka", "Sri Lanka", []),
+    ("Maldives", "Maldives", []), ("Dubai", "United Arab Emirates", []),
+    ("United Arab Emirates", "United Arab Emirates", ["UAE"]),
+]
+
+WORLDWIDE_DESTINATIONS = [
+    ("Australia", "Australia", ["Úc", "nước Úc"]), ("Sydney", "Australia", []), ("Melbourne", "Australia", []),
+    ("New Zealand", "New Zealand", ["Niu Di-lân"]), ("United States", "United States", ["Hoa Kỳ", "nước Mỹ", "USA", "America"]),
+    ("New York", "United States", []), ("Los Angeles", "United States", []), ("San Francisco", "United States", []),
+    ("Canada", "Canada", []), ("Toronto", "Canada", []), ("Vancouver", "Canada", []),
+    ("United Kingdom", "United Kingdom", ["Vương quốc Anh", "nước Anh", "UK", "England"]),
+    ("London", "United Kingdom", ["Luân Đôn"]), ("France", "France", ["nước Pháp"]), ("Paris", "France", []),
+    ("Germany", "Germany", ["nước Đức"]), ("Italy", "Italy", ["Italia", "nước Ý"]), ("Rome", "Italy", []),
+    ("Switzerland", "Switzerland", ["Thụy Sĩ", "Thuỵ Sĩ"]), ("Spain", "Spain", ["Tây Ban Nha"]),
+    ("Netherlands", "Netherlands", ["Hà Lan"]), ("Russia", "Russia", ["nước Nga"]),
+    ("Turkey", "Turkey", ["Thổ Nhĩ Kỳ"]), ("Egypt", "Egypt", ["Ai Cập"]), ("Europe", "Europe", ["Châu Âu"]),
+]
+
+
+def default_entries() -> Iterable[Tuple[str, str, str, List[str]]]:
+    """(name, zone, country, aliases) for the built-in gazetteer"""
+    for name, aliases in VIETNAM_PROVINCES + VIETNAM_DESTINATIONS:
+        yield name, "domestic", "Vietnam", aliases
+    for zone, destinations in (("asean", ASEAN_DESTINATIONS), ("asia", ASIA_DESTINATIONS),
+                               ("worldwide", WORLDWIDE_DESTINATIONS)):
+        for name, country, aliases in destinations:
+            yield name, zone, country, aliases
+
+
+class DestinationGazetteer:
+    """Trie of destination names over diacritic-folded word tokens"""
+
+    # Terminal keys in a trie node (never tokens): the destination for the folded
+    # spelling, and {exact spelling tokens: destination}
+    _FOLDED = ""
+    _EXACT = " "
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str, Iterable[str]]] = ()):
+        self._root: Dict = {}
+        self.entries = 0
+        self.aliases = 0
+        for name, zone, country, aliases in entries:
+            self.add(name, zone, country, aliases)
+
+    def add(self, name: str, zone: str, country: str, aliases: Iterable[str] = ()) -> Destination:
+        """Index a destination under its name and aliases (later entries win on identical spellings)"""
+        destination = Destination(name, zone, country)
+        for spelling in (name, *aliases):
+            tokens = tuple(tokenize(spelling))
+            if not tokens:
+                continue
+            folded = tuple(fold_diacritics(token) for token in tokens)
+            node = self._root
+            for token in folded:
+                node = node.setdefault(token, {})
+            if folded == tokens or len(tokens) > 1:
+                node[self._FOLDED] = destination
+            node.setdefault(self._EXACT, {})[tokens] = destination
+            self.aliases += 1
+        self.entries += 1
+        return destination
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def _match_at(self, tokens: List[str], folded: List[str], start: int, exact: bool) -> Tuple[int, Optional[Destination]]:
+        """Longest destination starting at token `start`: (tokens consumed, destination)"""
+        node = self._root
+        best = (0, None)
+        for end in range(start, len(tokens)):
+            node = node.get(folded[end])
+            if node is None:
+                break
+            if exact:
+                destination = node.get(self._EXACT, {}).get(tuple(tokens[start:end + 1]))
+            else:
+                destination = node.get(self._FOLDED)
+            if destination is not None:
+                best = (end + 1 - start, destination)
+        return best
+
+    def find(self, text: str) -> Optional[Destination]:
+        """First destination mentioned in text (longest name at the leftmost match), or None"""
+        found = self.find_all(text, limit=1)
+        return found[0] if found else None
+
+    def find_all(self, text: str, limit: int = None) -> List[Destination]:
+        """Destinations mentioned in text, in order (overlapping shorter names are skipped)"""
+        tokens = tokenize(text)
+        folded = [_fold_token(token) for token in tokens]
+        exact = not all(token.isascii() for token in tokens)
+
+        found = []
+        start = 0
+        while start < len(tokens) and (limit is None or len(found) < limit):
+            length, destination = self._match_at(tokens, folded, start, exact)
+            if destination is None:
+                start += 1
+                continue
+            found.append(destination)
+            start += length
+        return found
+
+    def get(self, name: str) -> Optional[Destination]:
+        """Destination whose name or alias is exactly `name` (matched like find_all)"""
+        tokens = tokenize(name)
+        folded = [_fold_token(token) for token in tokens]
+        exact = not all(token.isascii() for token in tokens)
+        length, destination = self._match_at(tokens, folded, 0, exact)
+        return destination if tokens and length == len(tokens) else None
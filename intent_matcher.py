@@ -0,0 +1,118 @@
+"""Single-pass keyword intent matcher shared by the rule-based and Gemini agents
+
+Keywords are matched on whole words, not substrings, so "đi" no longer fires
+inside "điện" and "có" not inside "cóc". Multi-word keywords ("bao nhiêu",
+"đồng ý") match as token sequences. All keywords of all intents are compiled
+into one Aho–Corasick automaton over word tokens, so a message is scanned once
+whatever the size of the catalog.
+
+Diacritics: a message typed with Vietnamese diacritics is matched exactly
+("gia" is not "giá"). A message typed entirely without diacritics ("bao nhieu
+tien", "du lich") is matched against the folded keywords instead. Only
+multi-word keywords are folded: a folded single word is usually another common
+word ("co", "gia", "di", "duoc"), so "giá" or "có" match only with their
+diacritics.
+"""
+
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+WORD_RE = re.compile(r"\w+")
+
+
+def fold_diacritics(text: str) -> str:
+    """Strip Vietnamese diacritics ("Đà Nẵng" -> "Da Nang")"""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase NFC word tokens"""
+    return WORD_RE.findall(unicodedata.normalize("NFC", text.lower()))
+
+
+class _TokenAutomaton:
+    """Aho–Corasick automaton whose alphabet is word tokens"""
+
+    def __init__(self, patterns: Iterable[Tuple[Tuple[str, ...], str, str]]):
+        # Node i: goto[i] (token -> node), fail[i], out[i] [(intent, keyword)]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for tokens, intent, keyword in patterns:
+            node = 0
+            for token in tokens:
+                nxt = self.goto[node].get(token)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][token] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((intent, keyword))
+
+        # Breadth-first failure links; outputs are merged along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def scan(self, tokens: List[str]) -> List[Tuple[str, str]]:
+        """(intent, keyword) for every keyword occurrence, in text order"""
+        goto, fail, out = self.goto, self.fail, self.out
+        found = []
+        node = 0
+        for token in tokens:
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if out[node]:
+                found.extend(out[node])
+        return found
+
+
+class IntentMatcher:
+    """Compiled multi-keyword matcher: {intent: [keywords]} -> intents found in a message"""
+
+    def __init__(self, intents: Dict[str, Iterable[str]], cache_size: int = 1024):
+        patterns = [
+            (tuple(tokenize(keyword)), intent, keyword)
+            for intent, keywords in intents.items()
+            for keyword in keywords
+        ]
+        self.intent_names = list(intents)
+        self._exact = _TokenAutomaton(patterns)
+        self._folded = _TokenAutomaton(
+            (folded, intent, keyword)
+            for tokens, intent, keyword in patterns
+            for folded in [tuple(fold_diacritics(token) for token in tokens)]
+            if folded == tokens or len(tokens) > 1
+        )
+        # The same message is usually classified several times per turn
+        self.intents = lru_cache(maxsize=cache_size)(self._intents)
+
+    def find(self, text: str) -> Dict[str, List[str]]:
+        """Matched keywords per intent (only intents that matched)"""
+        tokens = tokenize(text)
+        automaton = self._exact
+        if all(token.isascii() for token in tokens):
+            automaton = self._folded
+
+        found = {}
+        for intent, keyword in automaton.scan(tokens):
+            found.setdefault(intent, []).append(keyword)
+        return found
+
+    def _intents(self, text: str) -> FrozenSet[str]:
+        return frozenset(self.find(text))
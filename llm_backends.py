@@ -0,0 +1,337 @@
+"""LLM backends for the Tet Insurance AI Agent
+
+Every backend exposes the same three calls: generate (blocking), stream
+(yields text chunks) and generate_async. GeminiBackend talks to Google Gemini;
+StubBackend is a deterministic offline stand-in with configurable latency and
+token counts for benchmarks, load tests and failover drills. CircuitBreakerBackend
+wraps any backend with a CircuitBreaker.
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, Union
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+
+DEFAULT_GEMINI_MODEL = 'gemini-2.5-flash'
+
+
+class LLMBackend:
+    """Base class for LLM backends"""
+
+    name = "base"
+
+    def generate(self, prompt: str) -> str:
+        """Generate the full response text"""
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text chunks (default: the whole response as one chunk)"""
+        yield self.generate(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        """Generate without blocking the event loop (default: run generate in a thread)"""
+        return await asyncio.to_thread(self.generate, prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google-generativeai
+
+    Each backend calls Gemini through its own clients built from its API key.
+    genai.configure is never used: it sets one process-wide key, and a model
+    binds the default client on its first call, so pooled backends could send
+    (and bill) a request under another session's key.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = DEFAULT_GEMINI_MODEL):
+        self.model_name = model_name
+        self._client_options = {"api_key": api_key}
+        self.model = genai.GenerativeModel(model_name)
+        self.model._client = glm.GenerativeServiceClient(client_options=self._client_options)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            yield chunk.text
+
+    async def generate_async(self, prompt: str) -> str:
+        if self.model._async_client is None:
+            # Built on first use, inside the event loop that will drive it
+            self.model._async_client = glm.GenerativeServiceAsyncClient(client_options=self._client_options)
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+
+class StubBackend(LLMBackend):
+    """Deterministic offline backend
+
+    The same prompt always gets the same answer. `latency` is the time to the
+    first token (seconds, or a zero-argument callable sampling it) and
+    `token_latency` the delay per further token. A seeded `error_rate` fraction
+    of calls raises ConnectionError, which callers treat as a retryable
+    upstream failure.
+    """
+
+    name = "stub"
+
+    RESPONSES = [
+        "Chúc mừng năm mới! Với kế hoạch Tết của bạn, bảo hiểm du lịch nội địa là lựa chọn phù hợp.",
+        "Dịp Tết đi đường xa, bạn nên cân nhắc gói mở rộng bảo hiểm xe máy đường cao tốc.",
+        "Gói sức khỏe gia đình giúp cả nhà yên tâm đón Tết, hiện đang có ưu đãi đặc biệt.",
+        "Bảo hiểm tai nạn cá nhân chỉ từ 300,000 VND, bảo vệ bạn suốt cả năm mới.",
+    ]
+
+    def __init__(self, latency: Union[float, Callable[[], float]] = 0.0, token_latency: float = 0.0,
+                 output_tokens: int = 40, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _first_token_delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    @staticmethod
+    def _sleep(seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _tokens(self, prompt: str) -> list:
+        """Deterministic response tokens for a prompt"""
+        self.calls += 1
+        self.prompt_tokens += len(prompt) // 4
+        self.completion_tokens += self.output_tokens
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise ConnectionError("Stub backend injected failure")
+
+        digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+        words = self.RESPONSES[digest % len(self.RESPONSES)].split()
+        return [words[i % len(words)] for i in range(self.output_tokens)]
+
+    def generate(self, prompt: str) -> str:
+        tokens = self._tokens(prompt)
+        self._sleep(self._first_token_delay() + self.token_latency * max(len(tokens) - 1, 0))
+        return " ".join(tokens)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        tokens = self._tokens(prompt)
+        self._sleep(self._first_token_delay())
+        for i, token in enumerate(tokens):
+            if i:
+                self._sleep(self.token_latency)
+            yield token if i == 0 else " " + token
+
+    async def generate_async(self, prompt: str) -> str:
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self._first_token_delay() + self.token_latency * max(len(tokens) - 1, 0))
+        return " ".join(tokens)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Error-rate and slow-call circuit breaker
+    
+    Closed: calls pass and their outcomes fill a rolling window of the last
+    `window` calls. Once `min_calls` are recorded and the error rate reaches
+    `error_rate_threshold`, or the share of calls slower than `slow_call_seconds`
+    reaches `slow_call_rate_threshold`, the breaker opens. Open: calls are
+    rejected for `open_seconds`. Half-open: up to `half_open_probes` calls go
+    through; that many fast successes close the breaker, any failure reopens it.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, window: int = 20, min_calls: int = 10, error_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 15.0, slow_call_rate_threshold: float = 0.8,
+                 open_seconds: float = 30.0, half_open_probes: int = 3, ignored_errors: tuple = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.ignored_errors = ignored_errors  # Caller errors (e.g. a bad API key) that say nothing about upstream health
+        self.clock = clock
+        
+        self._state = self.CLOSED
+        self._outcomes = deque()  # (failed, slow) per call, newest last
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        
+        self.opens = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        return self._state
+    
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self._failures = self._slow = 0
+        self.opens += 1
+    
+    def allow_request(self) -> bool:
+        """Whether a call may go to the backend now (a permitted call must be recorded or abandoned)"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            
+            if self._state == self.HALF_OPEN:
+                if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                self._probes_in_flight += 1
+            
+            return True
+    
+    def record(self, latency: float, ok: bool):
+        """Outcome of a permitted call"""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if ok and not slow:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._state = self.CLOSED
+                else:
+                    self._open()
+                return
+            
+            if self._state == self.OPEN:
+                return  # Late result of a call admitted before the breaker opened
+            
+            self._outcomes.append((not ok, slow))
+            self._failures += not ok
+            self._slow += slow
+            if len(self._outcomes) > self.window:
+                failed, was_slow = self._outcomes.popleft()
+                self._failures -= failed
+                self._slow -= was_slow
+            
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.error_rate_threshold
+                or self._slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._open()
+    
+    def abandon(self):
+        """A permitted call ended without an upstream outcome (abandoned stream, or an ignored error)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+    
+    def stats(self) -> Dict[str, object]:
+        """State, window error/slow rates and open/reject counters"""
+        calls = len(self._outcomes)
+        return {
+            'state': self._state,
+            'window_calls': calls,
+            'error_rate': self._failures / calls if calls else 0.0,
+            'slow_rate': self._slow / calls if calls else 0.0,
+            'opens': self.opens,
+            'rejected': self.rejected
+        }
+
+
+class CircuitBreakerBackend(LLMBackend):
+    """Backend wrapper that records every call in a CircuitBreaker and raises CircuitOpenError while it is open"""
+    
+    def __init__(self, backend: LLMBackend, breaker: CircuitBreaker):
+        self.backend = backend
+        self.breaker = breaker
+        self.name = backend.name
+    
+    def _admit(self):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        return time.monotonic()
+    
+    def _failed(self, error: Exception, started: float):
+        if isinstance(error, self.breaker.ignored_errors):
+            self.breaker.abandon()
+        else:
+            self.breaker.record(time.monotonic() - started, False)
+    
+    def generate(self, prompt: str) -> str:
+        started = self._admit()
+        try:
+            text = self.backend.generate(prompt)
+        except Exception as e:
+            self._failed(e, started)
+            raise
+        self.breaker.record(time.monotonic() - started, True)
+        return text
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        started = self._admit()
+        recorded = False
+        try:
+            yield from self.backend.stream(prompt)
+        except Exception as e:
+            recorded = True
+            self._failed(e, started)
+            raise
+        else:
+            recorded = True
+            self.breaker.record(time.monotonic() - started, True)
+        finally:
+            if not recorded:
+                self.breaker.abandon()  # Consumer stopped reading mid-stream
+    
+    async def generate_async(self, prompt: str) -> str:
+        started = self._admit()
+        try:
+            text = await self.backend.generate_async(prompt)
+        except asyncio.CancelledError:
+            # Usually the caller's per-attempt timeout (asyncio.wait_for) expiring
+            self.breaker.record(time.monotonic() - started, False)
+            raise
+        except Exception as e:
+            self._failed(e, started)
+            raise
+        self.breaker.record(time.monotonic() - started, True)
+        return text
+
+
+def create_backend(name: str, api_key: str = None, **kwargs) -> LLMBackend:
+    """Build a backend by name ("gemini" or "stub")"""
+    if name == GeminiBackend.name:
+        return GeminiBackend(api_key, **kwargs)
+    if name == StubBackend.name:
+        return StubBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
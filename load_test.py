@@ -0,0 +1,188 @@
+"""Tet-peak load test for the Gemini agent with a stubbed LLM backend
+
+Simulates many concurrent customer sessions built from the four
+CUSTOMER_PROFILES archetypes (with synthetic variations) across the three
+TET_PHASES. Each session drives the agent's full async turn pipeline (routing,
+cache, retrieval, prompt building, LLM call, memory update) against a local
+StubBackend with a configurable latency distribution and error rate.
+
+Reports throughput, turn latency percentiles against TARGET_RESPONSE_TIME,
+priority scheduler admissions/shedding and process memory growth.
+
+Usage:
+    python load_test.py --sessions 2000 --concurrency 500 --latency lognormal:1.0,0.5
+    python load_test.py --sessions 200 --latency uniform:0.05,0.2 --error-rate 0.02 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+import warnings
+from typing import Dict, List
+
+import numpy as np
+
+warnings.filterwarnings("ignore", category=FutureWarning)  # google.generativeai deprecation notice
+
+import config
+import tet_insurance_agent as rule_based
+import tet_insurance_agent_gemini as gemini_agent
+from benchmark import PROMPTS
+from llm_backends import StubBackend
+
+
+def make_latency_sampler(spec: str, rng: random.Random):
+    """Seconds per call from constant:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA"""
+    kind, params = spec.split(":")
+    params = [float(p) for p in params.split(",")]
+    if kind == "constant":
+        return lambda: params[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(*params)
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda: rng.lognormvariate(np.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {kind}")
+
+
+def make_profile(archetype: str, index: int, rng: random.Random) -> Dict:
+    """Synthetic customer derived from one of the CUSTOMER_PROFILES archetypes"""
+    profile = dict(rule_based.CUSTOMER_PROFILES[archetype])
+    profile['customer_id'] = f"lt-{index:07d}"
+    profile['name'] = f"{profile['name']} #{index}"
+    profile['age'] = max(18, profile['age'] + rng.randint(-5, 5))
+    profile['travel_history'] = rng.sample(["Da Nang", "Phu Quoc", "Nha Trang", "Ha Noi", "Dalat", "Singapore"], rng.randint(0, 3))
+    if archetype == "family":
+        profile['family_size'] = rng.randint(3, 6)
+    return profile
+
+
+def current_rss_mb() -> float:
+    """Resident set size from /proc (falls back to peak RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_session(index: int, args, llm: StubBackend, cache, router, client, latencies: List[float],
+                      counters: Dict[str, int], slots: asyncio.Semaphore):
+    rng = random.Random(args.seed * 1_000_003 + index)
+    archetype = rng.choice(list(rule_based.CUSTOMER_PROFILES))
+    phase = rng.choice(list(rule_based.TET_PHASES))
+
+    async with slots:
+        agent = gemini_agent.TetInsuranceAgent(
+            "load-test-key", make_profile(archetype, index, rng), phase,
+            async_llm_client=client, response_cache=cache, router=router, llm_backend=llm
+        )
+
+        for _ in range(args.turns):
+            started = time.perf_counter()
+            await agent.generate_response_async(rng.choice(PROMPTS), deadline=args.deadline)
+            latencies.append(time.perf_counter() - started)
+            counters['turns'] += 1
+
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+
+        counters['fallbacks'] += agent.fallbacks
+
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    llm = StubBackend(latency=make_latency_sampler(args.latency, rng), error_rate=args.error_rate, seed=args.seed)
+    cache = gemini_agent.ResponseCache(
+        max_size=config.RESPONSE_CACHE_SIZE,
+        ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold=config.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        exclude_personalized=config.RESPONSE_CACHE_EXCLUDE_PERSONALIZED
+    ) if not args.no_cache else None
+    router = gemini_agent.HybridRouter() if not args.no_router else None
+    client = gemini_agent.AsyncLLMClient(
+        max_concurrency=args.llm_concurrency,
+        timeout=config.LLM_TIMEOUT_SECONDS,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=config.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=config.LLM_BACKOFF_MAX_SECONDS,
+        class_shares=config.LLM_PRIORITY_SHARE,
+        queue_limits=config.LLM_PRIORITY_QUEUE_DEPTH
+    )
+
+    latencies = []
+    counters = {'turns': 0, 'fallbacks': 0}
+    slots = asyncio.Semaphore(args.concurrency)
+
+    rss_start = current_rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        run_session(i, args, llm, cache, router, client, latencies, counters, slots)
+        for i in range(args.sessions)
+    ])
+    elapsed = time.perf_counter() - started
+    rss_end = current_rss_mb()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        'sessions': args.sessions,
+        'turns': counters['turns'],
+        'fallbacks': counters['fallbacks'],
+        'elapsed_s': elapsed,
+        'throughput_turns_per_s': counters['turns'] / elapsed if elapsed else 0.0,
+        'latency_s': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': max(latencies, default=0.0)},
+        'target_response_time_s': config.TARGET_RESPONSE_TIME,
+        'meets_target': bool(p99 <= config.TARGET_RESPONSE_TIME),
+        'llm_calls': llm.calls,
+        'routes': router.stats() if router else None,
+        'cache': cache.stats() if cache else None,
+        'scheduler': client.scheduler.stats(),
+        'circuit_breaker': gemini_agent.get_circuit_breaker().stats() if config.CIRCUIT_BREAKER_ENABLED else None,
+        'memory_mb': {'rss_start': rss_start, 'rss_end': rss_end, 'growth': rss_end - rss_start}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tet-peak load test with a stubbed Gemini backend")
+    parser.add_argument("--sessions", type=int, default=2000, help="Customer sessions to simulate")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per session")
+    parser.add_argument("--concurrency", type=int, default=500, help="Sessions active at once")
+    parser.add_argument("--llm-concurrency", type=int, default=config.LLM_MAX_CONCURRENCY, help="Concurrent LLM calls")
+    parser.add_argument("--latency", default="lognormal:1.0,0.5",
+                        help="LLM latency: constant:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of LLM calls that fail (retryable)")
+    parser.add_argument("--deadline", type=float, default=config.TARGET_RESPONSE_TIME, help="Per-turn LLM deadline (s)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between turns (s)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    parser.add_argument("--no-router", action="store_true", help="Send every turn to the LLM")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    latency = report['latency_s']
+    print(f"Sessions: {report['sessions']}  Turns: {report['turns']}  Rule-based fallbacks: {report['fallbacks']}")
+    print(f"Throughput: {report['throughput_turns_per_s']:.1f} turns/s over {report['elapsed_s']:.1f}s")
+    print(f"Latency: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    print(f"Target ({report['target_response_time_s']}s p99): {'PASS' if report['meets_target'] else 'FAIL'}")
+    print(f"LLM calls: {report['llm_calls']}  Routes: {report['routes']}")
+    print(f"Cache: {report['cache']}")
+    print(f"Circuit breaker: {report['circuit_breaker']}")
+    print("Scheduler: " + "  ".join(
+        f"{cls} admitted {stats['admitted']} shed {stats['shed']}" for cls, stats in report['scheduler'].items()
+    ))
+    print(f"Memory: {report['memory_mb']['rss_start']:.0f} MB -> {report['memory_mb']['rss_end']:.0f} MB "
+          f"(+{report['memory_mb']['growth']:.0f} MB)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Quote and pricing engine for the Tet insurance catalog
+
+All prices come from precomputed NumPy tables over product x phase x trip
+duration x destination zone, so a comparison page or a campaign can price
+thousands of combinations with one fancy-indexing call.
+
+- Phase discounts come from config (EARLY_BIRD_DISCOUNT before Tet,
+  TET_PEAK_DISCOUNT at the peak, POST_TET_DISCOUNT afterwards)
+- Travel products are priced per trip from the zone tariff (base price for a
+  5-day trip, scaled linearly by days); a travel product outside its own zone
+  is not sold (NaN in the float tables, -1 in the integer ones)
+- Every other product has its catalog price whatever the duration and zone
+- Prices are rounded to whole VND (180,000 x 0.7 is 126,000, not the 125,999
+  that truncating the float product gave)
+- Batch lookups take keys or integer code arrays (positions in `products`,
+  `phases`, `zones`); codes skip the key lookup for the largest batches
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+import config
+
+# Discount fraction offered in each Tet phase
+PHASE_DISCOUNTS = {
+    "pre-tet": config.EARLY_BIRD_DISCOUNT,
+    "tet-peak": config.TET_PEAK_DISCOUNT,
+    "post-tet": config.POST_TET_DISCOUNT
+}
+
+QUOTE_REFERENCE_DAYS = 5  # Zone base prices are for a trip of this length
+UNAVAILABLE = -1
+
+
+class PricingEngine:
+    """Precomputed list and discounted price tables for a product catalog"""
+
+    def __init__(self, products: Dict[str, Dict], travel_zones: Dict[str, Dict],
+                 phase_discounts: Dict[str, float] = None, max_days: int = config.MAX_TRIP_DAYS):
+        phase_discounts = PHASE_DISCOUNTS if phase_discounts is None else phase_discounts
+
+        self.products: List[str] = list(products)
+        self.phases: List[str] = list(phase_discounts)
+        self.zones: List[str] = list(travel_zones)
+        self.zone_products = {key: zone['product'] for key, zone in travel_zones.items()}
+        self.max_days = max_days
+        self._product_index = {key: i for i, key in enumerate(self.products)}
+        self._phase_index = {key: i for i, key in enumerate(self.phases)}
+        self._zone_index = {key: i for i, key in enumerate(self.zones)}
+
+        self.discounts = np.array([phase_discounts[phase] for phase in self.phases], dtype=np.float64)
+        catalog = np.array([products[key]['price'] for key in self.products], dtype=np.float64)
+        days = np.arange(1, max_days + 1, dtype=np.float64)
+
+        # list_prices[product, day - 1, zone]
+        self.list_prices = np.broadcast_to(
+            catalog[:, None, None], (len(self.products), max_days, len(self.zones))
+        ).copy()
+        for key in set(self.zone_products.values()):
+            self.list_prices[self._product_index[key]] = np.nan
+        for z, zone in enumerate(travel_zones.values()):
+            self.list_prices[self._product_index[zone['product']], :, z] = zone['base_price'] * (days / QUOTE_REFERENCE_DAYS)
+
+        # catalog_prices[product, phase] and prices[product, phase, day - 1, zone], discount applied
+        factors = 1 - self.discounts
+        self.catalog_prices = self._to_vnd(catalog[:, None] * factors[None, :])
+        self.prices = self._to_vnd(self.list_prices[:, None, :, :] * factors[None, :, None, None])
+        self.list_prices_vnd = self._to_vnd(self.list_prices)
+
+    @staticmethod
+    def _to_vnd(values: np.ndarray) -> np.ndarray:
+        """Round to whole VND; unavailable combinations become UNAVAILABLE"""
+        return np.where(np.isnan(values), UNAVAILABLE, np.round(np.nan_to_num(values))).astype(np.int64)
+
+    @staticmethod
+    def _index(index: Dict[str, int], key: str, axis: str) -> int:
+        try:
+            return index[key]
+        except KeyError:
+            raise ValueError(f"Unknown {axis}: {key}") from None
+
+    def _indices(self, index: Dict[str, int], keys: Sequence[str], axis: str) -> np.ndarray:
+        try:
+            if isinstance(keys, np.ndarray) and keys.dtype.kind in "iu":
+                if keys.size and (keys.min() < 0 or keys.max() >= len(index)):
+                    raise ValueError(f"{axis} code out of range")
+                return keys.astype(np.intp)
+            if isinstance(keys, np.ndarray):
+                keys = keys.tolist()
+            return np.fromiter(map(index.__getitem__, keys), dtype=np.intp, count=len(keys))
+        except KeyError as e:
+            raise ValueError(f"Unknown {axis}: {e.args[0]}") from None
+
+    def _day_indices(self, days) -> np.ndarray:
+        days = np.asarray(days)
+        if np.any((days < 1) | (days > self.max_days)):
+            raise ValueError(f"Trip duration must be between 1 and {self.max_days} days")
+        return days.astype(np.intp) - 1
+
+    def discount(self, phase: str) -> float:
+        """Discount fraction for a phase"""
+        return float(self.discounts[self._index(self._phase_index, phase, "phase")])
+
+    def catalog_price(self, product: str, phase: str) -> int:
+        """Discounted catalog price of a product"""
+        p = self._index(self._product_index, product, "product")
+        return int(self.catalog_prices[p, self._index(self._phase_index, phase, "phase")])
+
+    def trip_quote(self, zone: str, phase: str, days: int) -> Dict[str, object]:
+        """Travel quote for one trip: product, list price, discount and price"""
+        z = self._index(self._zone_index, zone, "zone")
+        product = self.zone_products[zone]
+        p = self._product_index[product]
+        if not 1 <= days <= self.max_days:
+            raise ValueError(f"Trip duration must be between 1 and {self.max_days} days")
+        d = int(days) - 1
+        ph = self._index(self._phase_index, phase, "phase")
+        return {
+            'product': product,
+            'list_price': int(self.list_prices_vnd[p, d, z]),
+            'discount': float(self.discounts[ph]),
+            'price': int(self.prices[p, ph, d, z])
+        }
+
+    def quote(self, products: Sequence[str], phases: Sequence[str], days: Sequence[int],
+              zones: Sequence[str]) -> np.ndarray:
+        """Discounted prices for parallel arrays of combinations (UNAVAILABLE where not sold)"""
+        return self.prices[
+            self._indices(self._product_index, products, "product"),
+            self._indices(self._phase_index, phases, "phase"),
+            self._day_indices(days),
+            self._indices(self._zone_index, zones, "zone")
+        ]
+
+    def quote_grid(self, products: Sequence[str] = None, phases: Sequence[str] = None,
+                   days: Sequence[int] = None, zones: Sequence[str] = None) -> np.ndarray:
+        """Discounted price block over the cross product of the given axes (all values when None)"""
+        return self.prices[np.ix_(
+            self._indices(self._product_index, self.products if products is None else products, "product"),
+            self._indices(self._phase_index, self.phases if phases is None else phases, "phase"),
+            self._day_indices(np.arange(1, self.max_days + 1) if days is None else days),
+            self._indices(self._zone_index, self.zones if zones is None else zones, "zone")
+        )]
@@ -0,0 +1,8 @@
+import os
+import sys
+import warnings
+
+# The modules under test live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+warnings.filterwarnings("ignore", category=FutureWarning)  # google.generativeai deprecation notice
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import batch_needs
+import tet_insurance_agent as rule_based
+
+PROFILES = list(batch_needs.synthetic_profiles(5000, seed=7))
+
+
+def scalar_products(profile, limit):
+    """Distinct products of analyze_needs, in order"""
+    products = []
+    for recommendation in rule_based.TetInsuranceAgent(profile, "pre-tet").analyze_needs():
+        products += [key for key in recommendation['products'] if key not in products]
+    return products[:limit]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 8])
+def test_batch_matches_analyze_needs(limit):
+    batch = batch_needs.decode(batch_needs.analyze_needs_batch(batch_needs.profiles_to_columns(PROFILES), limit))
+    assert batch == [scalar_products(profile, limit) for profile in PROFILES]
+
+
+def test_synthetic_profiles_cover_every_rule_pattern():
+    masks = batch_needs.rule_masks(batch_needs.profiles_to_columns(PROFILES))
+    patterns = masks @ (1 << np.arange(len(batch_needs.RULES)))
+    assert set(patterns.tolist()) == set(range(1 << len(batch_needs.RULES)))
+
+
+def test_numpy_and_dictionary_encoded_columns_give_the_same_result():
+    columns = batch_needs.profiles_to_columns(PROFILES)
+    expected = batch_needs.analyze_needs_batch(columns)
+
+    arrays = {name: np.asarray(values, dtype=object if name in ('tet_plans', 'business') else None)
+              for name, values in columns.items()}
+    assert np.array_equal(batch_needs.analyze_needs_batch(arrays), expected)
+
+    encoded = dict(columns, tet_plans=batch_needs.factorize(columns['tet_plans']))
+    assert np.array_equal(batch_needs.analyze_needs_batch(encoded), expected)
+
+
+def test_missing_fields_use_analyze_needs_defaults():
+    profiles = [{}, {'tet_plans': "Road trip 300km", 'has_motor': True}, {'business': "Retail"}, {'family_size': 4}]
+    columns = batch_needs.profiles_to_columns(profiles)
+    assert batch_needs.decode(batch_needs.analyze_needs_batch(columns)) == [scalar_products(p, 3) for p in profiles]
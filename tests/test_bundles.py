@@ -0,0 +1,62 @@
+from itertools import combinations
+
+import pytest
+
+import tet_insurance_agent as rule_based
+from bundles import OWNED_POLICY_FLAGS, BundleOptimizer
+from tet_insurance_agent_gemini import HybridRouter
+
+
+def brute_force(optimizer, budget, phase, owned_mask):
+    """Best (coverage, -price, -count) over every subset of eligible products"""
+    eligible = optimizer._eligible(owned_mask)
+    best = None
+    for count in range(1, len(eligible) + 1):
+        for chosen in combinations(eligible, count):
+            groups = [optimizer.products[key].get('bundle_group') for key in chosen]
+            groups = [group for group in groups if group]
+            if len(groups) != len(set(groups)):
+                continue
+            cost = sum(optimizer.pricing.catalog_price(key, phase) for key in chosen)
+            price = optimizer._bundle_price(cost, count)
+            if price > budget:
+                continue
+            coverage = sum(optimizer.products[key]['coverage_amount'] for key in chosen)
+            rank = (coverage, -price, -count)
+            if best is None or rank > best:
+                best = rank
+    return best
+
+
+@pytest.mark.parametrize("phase", list(rule_based.TET_PHASES))
+def test_optimizer_matches_brute_force(phase):
+    optimizer = BundleOptimizer(rule_based.INSURANCE_PRODUCTS, rule_based.PRICING)
+    for owned_mask in range(1 << len(OWNED_POLICY_FLAGS)):
+        for budget in range(0, 12_000_000, 50_000):
+            bundle = optimizer.best_bundle(budget // optimizer.budget_bucket, owned_mask, phase)
+            expected = brute_force(optimizer, budget, phase, owned_mask)
+            if expected is None:
+                assert bundle is None
+            else:
+                assert (bundle['coverage'], -bundle['price'], -len(bundle['products'])) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "Có gói nào cho gia đình không?",
+    "Tư vấn gói kết hợp cho chuyến về quê",
+    "Which package is best for my family?",
+    "Can you make a bundle under 2 triệu?",
+])
+def test_explicit_bundle_requests_go_to_the_optimizer(message):
+    assert HybridRouter().classify(message)[0] == HybridRouter.ROUTE_BUNDLE
+    assert "Gói bảo hiểm tối ưu" in rule_based.TetInsuranceAgent(rule_based.CUSTOMER_PROFILES['family'], "pre-tet").generate_response(message)
+
+
+@pytest.mark.parametrize("message", [
+    "How much does the Family Health Package cost?",
+    "Can I cancel my package?",
+    "Is the combo discount still on?",
+])
+def test_product_questions_are_not_bundle_requests(message):
+    assert HybridRouter().classify(message)[0] == HybridRouter.ROUTE_LLM
+    assert "Gói bảo hiểm tối ưu" not in rule_based.TetInsuranceAgent(rule_based.CUSTOMER_PROFILES['family'], "pre-tet").generate_response(message)
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import json
+
+import campaign
+
+
+def make_args(output, synthetic):
+    return argparse.Namespace(
+        input=None, synthetic=synthetic, seed=0, output=str(output), phase="pre-tet", platforms=None,
+        backend="stub", api_key="", workers=4, llm_concurrency=4, deadline=5.0, knowledge_index=None,
+        retry_errors=False, stub_latency=0.0, progress_every=60.0
+    )
+
+
+def test_synthetic_customers_have_unique_ids():
+    customers = list(campaign.synthetic_customers(40))
+    ids = [customer['customer_id'] for customer in customers]
+    assert len(set(ids)) == 40
+    assert ids[:2] == ["c-0000000", "c-0000001"]
+    assert len({campaign.pick_platform(customer_id, ["a", "b", "c", "d"]) for customer_id in ids[::4]}) > 1
+
+
+def test_resume_skips_only_customers_already_sent(tmp_path):
+    output = tmp_path / "greetings.jsonl"
+
+    first = asyncio.run(campaign.run(make_args(output, 12)))
+    assert (first['sent'], first['resumed_skipped']) == (12, 0)
+
+    # A crash mid-write leaves a partial last line, which is discarded
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"customer_id": "c-00000')
+
+    resumed = asyncio.run(campaign.run(make_args(output, 20)))
+    assert (resumed['sent'], resumed['resumed_skipped']) == (8, 12)
+
+    with open(output, encoding="utf-8") as f:
+        ids = [json.loads(line)['customer_id'] for line in f]
+    assert sorted(ids) == [f"c-{index:07d}" for index in range(20)]
@@ -0,0 +1,169 @@
+import pytest
+
+import tet_insurance_agent as rule_based
+from llm_backends import CircuitBreaker, CircuitBreakerBackend, CircuitOpenError, StubBackend
+from tet_insurance_agent_gemini import TetInsuranceAgent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=4, min_calls=4, error_rate_threshold=0.5, slow_call_seconds=1.0,
+                   slow_call_rate_threshold=0.75, open_seconds=10.0, half_open_probes=2, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        assert breaker.allow_request()
+        breaker.record(0.1, False)
+
+
+def open_breaker(breaker, clock):
+    fail(breaker, 4)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10.0
+
+
+def test_opens_at_error_rate_once_min_calls_are_recorded():
+    breaker = make_breaker(FakeClock())
+    fail(breaker, 3)
+    assert breaker.state == CircuitBreaker.CLOSED  # Below min_calls
+
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = make_breaker(FakeClock())
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record(2.0, True)
+    assert breaker.allow_request()
+    breaker.record(0.1, True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_admits_only_the_probes_and_closes_on_success():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    open_breaker(breaker, clock)
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Both probes in flight
+
+    breaker.record(0.1, True)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record(0.1, True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_or_slow_probe_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    open_breaker(breaker, clock)
+
+    assert breaker.allow_request()
+    breaker.record(0.1, False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 10.0
+    assert breaker.allow_request()
+    breaker.record(5.0, True)  # Slow success
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_abandoned_probe_frees_its_slot():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    open_breaker(breaker, clock)
+
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    breaker.abandon()
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_ignored_errors_and_abandoned_streams_are_not_failures():
+    clock = FakeClock()
+    breaker = make_breaker(clock, ignored_errors=(PermissionError,))
+    open_breaker(breaker, clock)
+
+    class BadKeyBackend(StubBackend):
+        def generate(self, prompt):
+            raise PermissionError("bad key")
+
+    with pytest.raises(PermissionError):
+        CircuitBreakerBackend(BadKeyBackend(), breaker).generate("hi")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    stream = CircuitBreakerBackend(StubBackend(), breaker).stream("hi")
+    next(stream)
+    stream.close()  # Consumer stopped reading
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_open_breaker_raises_without_calling_the_backend():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    fail(breaker, 4)
+    backend = StubBackend()
+
+    with pytest.raises(CircuitOpenError):
+        CircuitBreakerBackend(backend, breaker).generate("hi")
+    assert backend.calls == 0
+
+
+def test_failing_backend_falls_back_to_rule_agent_for_profiles_without_greeting():
+    # Gemini app profiles used to have no 'greeting' key
+    profile = {"name": "Minh Nguyen", "age": 28, "segment": "Young Professional", "tone": "casual",
+               "has_motor": True, "tet_plans": "Traveling home to Vinh (300km)"}
+    breaker = make_breaker(FakeClock())
+    agent = TetInsuranceAgent("test-key", profile, "pre-tet", llm_backend=StubBackend(error_rate=1.0),
+                              circuit_breaker=breaker)
+
+    assert agent.get_proactive_message().startswith("Chào Minh Nguyen!")
+    assert "".join(agent.get_proactive_message_stream()).startswith("Chào Minh Nguyen!")
+
+
+CLAIM_INTAKE = "Hỗ trợ bồi thường"
+PAYMENT_PROMPT = "Thanh toán qua"
+
+
+@pytest.mark.parametrize("message", [
+    "Tôi nên mua bảo hiểm gì cho Tết?",
+    "Giá bảo hiểm xe máy cho chuyến về quê bao nhiêu?",
+    "Tôi có 3 người trong gia đình, cần bảo hiểm gì?",
+    "Tôi muốn mua bảo hiểm tai nạn",
+])
+def test_fallback_answers_product_questions_with_a_recommendation(message):
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['family'], "pre-tet",
+                              llm_backend=StubBackend(error_rate=1.0), circuit_breaker=make_breaker(FakeClock()))
+
+    response = agent.generate_response(message)
+    assert agent.fallbacks == 1
+    assert "TẾT SPECIAL" in response
+    assert CLAIM_INTAKE not in response and PAYMENT_PROMPT not in response
+
+
+def test_fallback_still_handles_claims_and_replies():
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['family'], "pre-tet",
+                              llm_backend=StubBackend(error_rate=1.0), circuit_breaker=make_breaker(FakeClock()))
+
+    assert CLAIM_INTAKE in agent._fallback_response("Tôi bị tai nạn, cần bồi thường")
+    assert PAYMENT_PROMPT in agent._fallback_response("Có, tôi đồng ý")
+    assert agent._fallback_response("Không, cảm ơn").startswith("Không sao!")
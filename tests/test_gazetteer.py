@@ -0,0 +1,53 @@
+import pytest
+
+from gazetteer import DestinationGazetteer
+from tet_insurance_agent import GAZETTEER, find_destination
+
+
+@pytest.mark.parametrize("message, destination", [
+    ("Tôi đi Đà Nẵng 5 ngày", "Da Nang"),
+    ("di da nang tet nay", "Da Nang"),
+    ("Về Sài Gòn ăn Tết", "Ho Chi Minh City"),
+    ("ve sai gon", "Ho Chi Minh City"),
+    ("Du lịch Lào dịp Tết", "Laos"),
+    ("di Laos 1 tuan", "Laos"),
+    ("sang nuoc lao choi", "Laos"),
+    ("Lên Lào Cai ngắm tuyết", "Lao Cai"),
+    ("len lao cai", "Lao Cai"),
+    ("Đi Thái Lan", "Thailand"),
+    ("thai lan 7 ngay", "Thailand"),
+    ("Bay sang Singapore", "Singapore"),
+    ("Sang Úc thăm con", "Australia"),
+    ("Going to Hue for Tet", "Hue"),
+])
+def test_finds_destinations(message, destination):
+    assert find_destination(message) == destination
+
+
+@pytest.mark.parametrize("message", [
+    "Tôi là người lao động tự do",
+    "toi la nguoi lao dong tu do",
+    "lao vao lam viec",
+    "Đi mua hoa huệ",
+    "Tôi đi Mỹ",
+    "Tôi học tiếng Anh",
+    "uc che cam xuc",
+])
+def test_common_words_are_not_destinations(message):
+    assert find_destination(message) is None
+
+
+def test_get_matches_names_and_spelled_aliases():
+    assert GAZETTEER.get("Da Nang").zone == "domestic"
+    assert GAZETTEER.get("Lào").name == "Laos"
+    assert GAZETTEER.get("lao") is None
+    assert GAZETTEER.get("Lao Cai").name == "Lao Cai"
+
+
+def test_longest_name_wins_and_later_entries_replace_identical_spellings():
+    gazetteer = DestinationGazetteer([("Lao", "asean", "Laos", ["Lao"]), ("Lao Cai", "domestic", "Vietnam", [])])
+    assert [d.name for d in gazetteer.find_all("lao cai then lao")] == ["Lao Cai", "Lao"]
+
+    gazetteer.add("Laos", "asia", "Laos", ["Lao"])
+    assert gazetteer.find("lao").zone == "asia"
+    assert len(gazetteer) == 3
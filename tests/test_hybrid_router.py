@@ -0,0 +1,44 @@
+import pytest
+
+import tet_insurance_agent as rule_based
+from llm_backends import StubBackend
+from tet_insurance_agent_gemini import HybridRouter, PriorityScheduler, TetInsuranceAgent
+
+CLAIMS_WITH_PURCHASE_OR_PRICING_WORDS = [
+    "Tôi bị tai nạn xe, muốn đăng ký bồi thường",
+    "Tôi bị tai nạn xe, bảo hiểm trả bao nhiêu?",
+    "how much will the claim pay?",
+]
+
+ACCIDENT_PRODUCT_QUESTIONS = [
+    "Tôi muốn mua bảo hiểm tai nạn",
+    "Giá bảo hiểm tai nạn bao nhiêu?",
+    "What does accident insurance cover?",
+]
+
+
+@pytest.mark.parametrize("message", CLAIMS_WITH_PURCHASE_OR_PRICING_WORDS)
+def test_claims_stay_claims_next_to_purchase_or_pricing_words(message):
+    assert HybridRouter().classify(message)[0] == HybridRouter.ROUTE_CLAIM
+
+
+@pytest.mark.parametrize("message", ACCIDENT_PRODUCT_QUESTIONS)
+def test_accident_product_questions_are_not_claims(message):
+    assert HybridRouter().classify(message)[0] == HybridRouter.ROUTE_LLM
+
+
+@pytest.mark.parametrize("message", CLAIMS_WITH_PURCHASE_OR_PRICING_WORDS)
+def test_mixed_claim_is_tagged_urgent_and_scheduled_as_claim(message):
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['young_professional'], "tet-peak",
+                              llm_backend=StubBackend())
+
+    assert agent._request_priority(message) == PriorityScheduler.CLAIM
+    assert "bồi thường" in agent.generate_response(message)
+    assert agent.short_term_memory.latest('user_intent').metadata['urgent']
+
+
+def test_quick_quote_uses_stated_trip_length():
+    router = HybridRouter()
+    assert router.classify("Tôi đi du lịch Đà Nẵng 10 ngày") == (HybridRouter.ROUTE_QUICK_QUOTE, "Da Nang", 10)
+    assert router.classify("Tôi đi du lịch Đà Nẵng 2 tuần")[2] == 14
+    assert router.classify("Tôi đi du lịch Đà Nẵng 60 ngày")[0] == HybridRouter.ROUTE_LLM
@@ -0,0 +1,23 @@
+import tet_insurance_agent as rule_based
+import tet_insurance_agent_gemini as gemini
+from intent_matcher import IntentMatcher
+
+
+def test_whole_words_and_token_sequences():
+    matcher = IntentMatcher({'travel': ["đi", "du lịch"], 'price': ["bao nhiêu"]})
+    assert matcher.intents("Giá điện bao nhiêu?") == {'price'}
+    assert matcher.find("Tôi đi du lịch") == {'travel': ["đi", "du lịch"]}
+
+
+def test_unaccented_messages_fold_only_multi_word_keywords():
+    matcher = IntentMatcher({'agree': ["có", "đồng ý", "ok"], 'price': ["giá"]})
+    assert matcher.intents("dong y, ok") == {'agree'}
+    assert matcher.intents("toi co 2 con") == frozenset()
+    assert matcher.intents("gia dinh toi") == frozenset()
+    assert matcher.intents("giá có rẻ không") == {'agree', 'price'}
+
+
+def test_unaccented_health_question_is_not_a_claim_or_price():
+    message = "Toi muon bao hiem suc khoe gia dinh"
+    assert rule_based.INTENT_MATCHER.intents(message) == frozenset()
+    assert gemini.INTENT_MATCHER.intents(message) == frozenset()
@@ -0,0 +1,66 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import tet_insurance_agent as rule_based
+from llm_backends import CircuitBreaker, StubBackend
+from tet_insurance_agent_gemini import APIKeyValidator, TetInsuranceAgent
+
+
+class FailingBackend(StubBackend):
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def generate(self, prompt):
+        raise self.error
+
+
+def bad_key_error():
+    return google_exceptions.InvalidArgument("API key not valid. Please pass a valid API key.",
+                                             details=["reason: API_KEY_INVALID"])
+
+
+@pytest.mark.parametrize("error, invalid", [
+    (google_exceptions.PermissionDenied("Permission denied"), True),
+    (google_exceptions.Unauthenticated("Unauthenticated"), True),
+    (bad_key_error(), True),
+    (google_exceptions.InvalidArgument("Request contains an invalid argument: temperature"), False),
+    (google_exceptions.ServiceUnavailable("Overloaded"), False),
+    (ConnectionError("reset"), False),
+])
+def test_only_key_errors_reject_the_key(error, invalid):
+    assert APIKeyValidator.is_invalid_key(error) is invalid
+
+
+@pytest.mark.parametrize("error, valid", [
+    (google_exceptions.InvalidArgument("Request contains an invalid argument"), True),
+    (bad_key_error(), False),
+])
+def test_request_errors_fail_only_the_request(error, valid):
+    validator = APIKeyValidator(mode=APIKeyValidator.MODE_LAZY)
+    key_hash = APIKeyValidator.key_hash("test-key")
+    validator.record(key_hash, True)
+    breaker = CircuitBreaker(window=2, min_calls=1, ignored_errors=APIKeyValidator.CALLER_ERRORS)
+
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['senior'], "pre-tet", router=None,
+                              llm_backend=FailingBackend(error), key_validator=validator, circuit_breaker=breaker)
+    agent.response_cache = None
+
+    assert agent.generate_response("Bảo hiểm nhân thọ có lợi gì?")
+    assert agent.fallbacks == 1
+    assert validator.check("test-key")[0] is valid
+    assert breaker.state == CircuitBreaker.CLOSED  # Caller errors say nothing about upstream health
+
+
+def test_unverified_result_is_cached_for_the_retry_window(monkeypatch):
+    validator = APIKeyValidator(retry_seconds=60)
+    calls = []
+
+    def unreachable(*args, **kwargs):
+        calls.append(kwargs['request_options'])
+        raise google_exceptions.ServiceUnavailable("Unreachable")
+
+    monkeypatch.setattr("tet_insurance_agent_gemini.genai.get_model", unreachable)
+    assert validator.check("test-key")[0] is None
+    assert validator.check("test-key")[0] is None
+    assert calls == [{'timeout': validator.timeout_seconds, 'retry': None}]
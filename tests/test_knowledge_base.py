@@ -0,0 +1,84 @@
+import random
+from functools import lru_cache
+
+import pytest
+
+from benchmark import PROMPTS
+from tet_insurance_agent_gemini import KnowledgeBase, SimpleEmbedding, build_shared_knowledge_base
+
+WORDS = ["bảo hiểm", "du lịch", "Tết", "giá", "gia đình", "tai nạn", "xe máy", "travel", "family",
+         "claim", "bồi thường", "Đà Nẵng", "price", "sức khỏe", "quà", "về quê", "VND", "?"]
+
+embed_text = lru_cache(maxsize=None)(SimpleEmbedding.embed_text)
+
+
+def loop_search(kb, query, top_k):
+    """The original scorer: cosine similarity per document, stable sort (ties keep insertion order)"""
+    query_embedding = embed_text(query)
+    similarities = [(i, SimpleEmbedding.cosine_similarity(query_embedding, embed_text(doc['content'])))
+                    for i, doc in enumerate(kb.documents)]
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:top_k]
+
+
+def assert_same_ranking(kb, query, top_k):
+    """Same ranking as the loop scorer, up to the order of scores within float32 rounding of each other"""
+    ranking = loop_search(kb, query, len(kb.documents))
+    # Runs of scores closer than float32 rounding form one group (exact ties included)
+    groups, group = {}, 0
+    for position, (index, score) in enumerate(ranking):
+        if position and ranking[position - 1][1] - score >= 1e-6:
+            group += 1
+        groups[kb.documents[index]['id']] = group
+
+    results = kb.search(query, top_k)
+    expected = ranking[:top_k]
+    assert [groups[doc['id']] for doc in results] == [groups[kb.documents[i]['id']] for i, _ in expected]
+    assert [doc['similarity_score'] for doc in results] == pytest.approx([score for _, score in expected], abs=1e-5)
+    assert len({doc['id'] for doc in results}) == len(results)
+
+
+def random_kb(seed, size):
+    rng = random.Random(seed)
+    kb = KnowledgeBase()
+    kb.add_documents([(f"doc{i}", " ".join(rng.choices(WORDS, k=rng.randint(1, 12))), None) for i in range(size)])
+    return kb
+
+
+@pytest.mark.parametrize("top_k", [1, 3, 7, 100])
+def test_search_matches_loop_scorer_on_shared_knowledge(top_k):
+    kb = build_shared_knowledge_base()
+    for query in PROMPTS:
+        assert_same_ranking(kb, query, top_k)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_search_matches_loop_scorer_on_generated_documents(seed):
+    kb = random_kb(seed, 300)
+    rng = random.Random(seed + 100)
+    for _ in range(20):
+        query = " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))
+        for top_k in (1, 5, 300):
+            assert_same_ranking(kb, query, top_k)
+
+
+def test_ties_keep_insertion_order_across_the_top_k_cut():
+    kb = KnowledgeBase()
+    kb.add_documents([(f"other{i}", "claim bồi thường", None) for i in range(3)])
+    kb.add_documents([(f"tie{i}", "bảo hiểm du lịch Tết", None) for i in range(10)])
+    kb.add_documents([("empty", "", None)])  # All-zero embedding scores 0
+
+    ranking = [f"tie{i}" for i in range(10)] + [f"other{i}" for i in range(3)] + ["empty"]
+    for top_k in (1, 4, 10, 12, 14):
+        assert [doc['id'] for doc in kb.search("bảo hiểm du lịch Tết", top_k)] == ranking[:top_k]
+        assert_same_ranking(kb, "bảo hiểm du lịch Tết", top_k)
+
+    assert_same_ranking(kb, "", 14)
+
+
+def test_loaded_index_ranks_like_the_built_one(tmp_path):
+    kb = random_kb(42, 200)
+    kb.save(str(tmp_path))
+    loaded = KnowledgeBase.load(str(tmp_path))
+    for query in PROMPTS:
+        assert [doc['id'] for doc in loaded.search(query, 5)] == [doc['id'] for doc in kb.search(query, 5)]
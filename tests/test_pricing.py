@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+import config
+import tet_insurance_agent as rule_based
+from pricing import PHASE_DISCOUNTS, QUOTE_REFERENCE_DAYS, UNAVAILABLE, PricingEngine
+
+PRICING = rule_based.PRICING
+
+
+def reference_price(product, phase, days, zone):
+    """Loop formula the tables replace: zone tariff scaled by days for travel, catalog price otherwise"""
+    tariff = rule_based.TRAVEL_ZONES[zone]
+    travel_products = {z['product'] for z in rule_based.TRAVEL_ZONES.values()}
+    if product in travel_products:
+        if tariff['product'] != product:
+            return UNAVAILABLE
+        list_price = tariff['base_price'] * days / QUOTE_REFERENCE_DAYS
+    else:
+        list_price = rule_based.INSURANCE_PRODUCTS[product]['price']
+    return round(list_price * (1 - PHASE_DISCOUNTS[phase]))
+
+
+def test_tables_match_the_reference_formula():
+    grid = PRICING.quote_grid()
+    assert grid.shape == (len(PRICING.products), len(PRICING.phases), config.MAX_TRIP_DAYS, len(PRICING.zones))
+    for p, product in enumerate(PRICING.products):
+        for ph, phase in enumerate(PRICING.phases):
+            for d in range(config.MAX_TRIP_DAYS):
+                for z, zone in enumerate(PRICING.zones):
+                    assert grid[p, ph, d, z] == reference_price(product, phase, d + 1, zone)
+
+
+def test_batch_quote_matches_single_lookups():
+    rng = np.random.default_rng(0)
+    n = 500
+    products = rng.integers(len(PRICING.products), size=n)
+    phases = rng.integers(len(PRICING.phases), size=n)
+    days = rng.integers(1, config.MAX_TRIP_DAYS + 1, size=n)
+    zones = rng.integers(len(PRICING.zones), size=n)
+
+    by_code = PRICING.quote(products, phases, days, zones)
+    by_key = PRICING.quote([PRICING.products[i] for i in products], [PRICING.phases[i] for i in phases],
+                           days, [PRICING.zones[i] for i in zones])
+    assert np.array_equal(by_code, by_key)
+    for i in range(n):
+        assert by_code[i] == reference_price(PRICING.products[products[i]], PRICING.phases[phases[i]],
+                                             days[i], PRICING.zones[zones[i]])
+
+
+def test_phase_discounts_come_from_config():
+    assert PRICING.discount("pre-tet") == config.EARLY_BIRD_DISCOUNT
+    assert PRICING.discount("tet-peak") == config.TET_PEAK_DISCOUNT
+    assert PRICING.discount("post-tet") == config.POST_TET_DISCOUNT
+    assert PRICING.catalog_price("family_health", "post-tet") == round(3500000 * (1 - config.POST_TET_DISCOUNT))
+
+
+def test_prices_are_rounded_not_truncated():
+    quote = PRICING.trip_quote("asean", "tet-peak", 5)
+    assert quote == {'product': "travel_international", 'list_price': 180000,
+                     'discount': config.TET_PEAK_DISCOUNT, 'price': 126000}
+
+
+@pytest.mark.parametrize("days", [1, config.MAX_TRIP_DAYS])
+def test_trip_quote_accepts_the_table_bounds(days):
+    quote = PRICING.trip_quote("domestic", "pre-tet", days)
+    assert quote['list_price'] == round(120000 * days / QUOTE_REFERENCE_DAYS)
+
+
+@pytest.mark.parametrize("days", [0, config.MAX_TRIP_DAYS + 1])
+def test_durations_outside_the_table_are_rejected(days):
+    with pytest.raises(ValueError):
+        PRICING.trip_quote("domestic", "pre-tet", days)
+    with pytest.raises(ValueError):
+        PRICING.quote(["travel_domestic"], ["pre-tet"], [days], ["domestic"])
+
+
+def test_unknown_keys_are_rejected():
+    with pytest.raises(ValueError):
+        PRICING.trip_quote("moon", "pre-tet", 5)
+    with pytest.raises(ValueError):
+        PRICING.catalog_price("accident", "mid-autumn")
+
+
+def test_custom_discounts_and_table_length():
+    engine = PricingEngine(rule_based.INSURANCE_PRODUCTS, rule_based.TRAVEL_ZONES,
+                           phase_discounts={"flash": 0.5}, max_days=60)
+    assert engine.trip_quote("worldwide", "flash", 60)['price'] == round(350000 * 60 / QUOTE_REFERENCE_DAYS * 0.5)
+
+
+@pytest.mark.parametrize("days", [31, 60])
+def test_long_trip_gets_a_quote_unavailable_reply(days):
+    agent = rule_based.TetInsuranceAgent(rule_based.CUSTOMER_PROFILES['young_professional'], "pre-tet")
+    reply = agent.generate_quick_quote("Thailand", days)
+    assert f"{days} ngày" in reply and "💰" not in reply
+    assert "báo giá riêng" in agent.generate_response(f"Tôi đi du lịch Thái Lan {days} ngày")
+
+
+def test_rule_agent_quotes_the_stated_trip_length():
+    agent = rule_based.TetInsuranceAgent(rule_based.CUSTOMER_PROFILES['young_professional'], "pre-tet")
+    assert "📅 Thời gian: 10 ngày" in agent.generate_response("Tôi đi du lịch Đà Nẵng 10 ngày")
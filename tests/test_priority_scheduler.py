@@ -0,0 +1,223 @@
+import asyncio
+import threading
+
+import pytest
+
+from llm_backends import StubBackend
+import tet_insurance_agent as rule_based
+from tet_insurance_agent_gemini import AsyncLLMClient, LoadShedError, PriorityScheduler, TetInsuranceAgent
+
+CLAIM = PriorityScheduler.CLAIM
+PURCHASE = PriorityScheduler.PURCHASE
+BROWSING = PriorityScheduler.BROWSING
+
+
+async def _settle():
+    """Let every ready task run until it blocks"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_free_slot_goes_to_highest_waiting_class():
+    async def scenario():
+        scheduler = PriorityScheduler(capacity=1)
+        granted = []
+
+        async def wait(cls):
+            await scheduler.acquire(cls)
+            granted.append(cls)
+            scheduler.release(cls)
+
+        await scheduler.acquire(PURCHASE)
+        # Queued lowest class first; browsing is only shed while claims wait
+        tasks = [asyncio.create_task(wait(cls)) for cls in (BROWSING, PURCHASE)]
+        await _settle()
+        tasks.append(asyncio.create_task(wait(CLAIM)))
+        await _settle()
+
+        scheduler.release(PURCHASE)
+        await asyncio.gather(*tasks)
+        return granted, scheduler.stats()
+
+    granted, stats = asyncio.run(scenario())
+    assert granted == [CLAIM, PURCHASE, BROWSING]
+    assert all(stats[cls]['active'] == 0 and stats[cls]['waiting'] == 0 for cls in PriorityScheduler.CLASSES)
+
+
+def test_class_limit_keeps_headroom_for_claims():
+    async def scenario():
+        scheduler = PriorityScheduler(capacity=2, class_limits={BROWSING: 1})
+        await scheduler.acquire(BROWSING)
+
+        waiting = asyncio.create_task(scheduler.acquire(BROWSING))
+        await _settle()
+        assert not waiting.done()
+
+        await asyncio.wait_for(scheduler.acquire(CLAIM), 1)  # Admitted at once
+        stats = scheduler.stats()
+
+        scheduler.release(CLAIM)
+        scheduler.release(BROWSING)
+        await asyncio.wait_for(waiting, 1)
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats[BROWSING] == {'active': 1, 'waiting': 1, 'admitted': 1, 'queued': 1, 'shed': 0}
+    assert stats[CLAIM]['active'] == 1
+
+
+def test_browsing_is_shed_while_claims_wait():
+    async def scenario():
+        scheduler = PriorityScheduler(capacity=1)
+        await scheduler.acquire(PURCHASE)
+        claim = asyncio.create_task(scheduler.acquire(CLAIM))
+        await _settle()
+
+        with pytest.raises(LoadShedError):
+            await scheduler.acquire(BROWSING)
+
+        scheduler.release(PURCHASE)
+        await asyncio.wait_for(claim, 1)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats[BROWSING]['shed'] == 1
+    assert stats[CLAIM]['active'] == 1
+
+
+def test_full_queue_sheds_instead_of_waiting():
+    async def scenario():
+        scheduler = PriorityScheduler(capacity=1, queue_limits={PURCHASE: 1})
+        await scheduler.acquire(CLAIM)
+        first = asyncio.create_task(scheduler.acquire(PURCHASE))
+        await _settle()
+
+        with pytest.raises(LoadShedError):
+            await scheduler.acquire(PURCHASE)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats[PURCHASE]['shed'] == 1
+    assert stats[PURCHASE]['waiting'] == 0
+
+
+def test_cancelled_waiter_never_holds_a_slot():
+    async def scenario():
+        scheduler = PriorityScheduler(capacity=1)
+        await scheduler.acquire(CLAIM)
+        waiter = asyncio.create_task(scheduler.acquire(PURCHASE))
+        await _settle()
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(CLAIM)
+
+        await asyncio.wait_for(scheduler.acquire(BROWSING), 1)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats[PURCHASE] == {'active': 0, 'waiting': 0, 'admitted': 0, 'queued': 1, 'shed': 0}
+    assert stats[BROWSING]['active'] == 1
+
+
+def test_purchase_priority_comes_from_the_current_message():
+    profile = rule_based.CUSTOMER_PROFILES['senior']
+    agent = TetInsuranceAgent("test-key", profile, "pre-tet", llm_backend=StubBackend())
+
+    agent.generate_response("Bảo hiểm nhân thọ có lợi gì?")  # "có" is an agreement keyword
+    assert agent.short_term_memory.latest('decision') is not None
+
+    assert agent._request_priority("What do you recommend for Tet?") == BROWSING
+    assert agent._request_priority("Giá bảo hiểm sức khỏe bao nhiêu?") == PURCHASE
+    assert agent._request_priority("Đồng ý, tôi mua gói này") == PURCHASE
+    assert agent._request_priority("Tôi bị tai nạn trên cao tốc") == CLAIM
+
+
+@pytest.mark.parametrize("message, priority", [
+    ("Tôi có 3 người trong gia đình, cần bảo hiểm gì?", BROWSING),  # "có" is not agreement to buy
+    ("Bảo hiểm nhân thọ có lợi gì?", BROWSING),
+    ("Có gói nào phù hợp không?", BROWSING),
+    ("Tôi bị tai nạn xe, bảo hiểm trả bao nhiêu?", CLAIM),  # Claim plus pricing words
+    ("how much will the claim pay?", CLAIM),
+    ("Giá bảo hiểm tai nạn bao nhiêu?", PURCHASE),  # The accident product, not a claim
+])
+def test_mixed_intent_priorities(message, priority):
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['family'], "pre-tet", llm_backend=StubBackend())
+    assert agent._request_priority(message) == priority
+
+
+def _start_blocking(scheduler, cls, granted, timeout=None):
+    def run():
+        try:
+            scheduler.acquire_blocking(cls, timeout)
+            granted.append(cls)
+        except LoadShedError:
+            granted.append('shed')
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_for_waiters(scheduler, cls, count):
+    for _ in range(500):
+        if scheduler.stats()[cls]['waiting'] == count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{cls} waiters never reached {count}")
+
+
+def test_blocking_callers_share_slots_in_priority_order():
+    scheduler = PriorityScheduler(capacity=1)
+    scheduler.acquire_blocking(PURCHASE)
+    granted = []
+
+    browsing = _start_blocking(scheduler, BROWSING, granted)
+    _wait_for_waiters(scheduler, BROWSING, 1)
+    claim = _start_blocking(scheduler, CLAIM, granted)
+    _wait_for_waiters(scheduler, CLAIM, 1)
+
+    scheduler.release(PURCHASE)
+    claim.join(1)
+    assert granted == [CLAIM]
+    scheduler.release(CLAIM)
+    browsing.join(1)
+    assert granted == [CLAIM, BROWSING]
+
+
+def test_blocking_wait_times_out_as_shed():
+    scheduler = PriorityScheduler(capacity=1)
+    scheduler.acquire_blocking(CLAIM)
+
+    with pytest.raises(LoadShedError):
+        scheduler.acquire_blocking(PURCHASE, timeout=0.05)
+    stats = scheduler.stats()
+    assert stats[PURCHASE] == {'active': 0, 'waiting': 0, 'admitted': 0, 'queued': 1, 'shed': 1}
+
+
+def test_sync_and_stream_turns_hold_a_scheduler_slot():
+    client = AsyncLLMClient(max_concurrency=1)
+    agent = TetInsuranceAgent("test-key", rule_based.CUSTOMER_PROFILES['family'], "pre-tet",
+                              llm_backend=StubBackend(), async_llm_client=client)
+    agent.response_cache = None  # Every turn reaches the backend
+
+    agent.generate_response("Giá bảo hiểm sức khỏe gia đình bao nhiêu?")
+    "".join(agent.generate_response_stream("Bảo hiểm nhân thọ có lợi gì?"))
+    stats = client.scheduler.stats()
+    assert stats[PURCHASE]['admitted'] == 1 and stats[BROWSING]['admitted'] == 1
+    assert all(stats[cls]['active'] == 0 for cls in PriorityScheduler.CLASSES)
+
+    # Browsing is shed while a claim waits, so the turn gets the rule-based fallback
+    client.scheduler.acquire_blocking(PURCHASE)
+    granted = []
+    claim = _start_blocking(client.scheduler, CLAIM, granted)
+    _wait_for_waiters(client.scheduler, CLAIM, 1)
+
+    assert agent.generate_response("Bảo hiểm nhân thọ có lợi gì?")
+    assert agent.fallbacks == 1 and client.scheduler.stats()[BROWSING]['shed'] == 1
+
+    client.scheduler.release(PURCHASE)
+    claim.join(1)
+    assert granted == [CLAIM]
@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+import pytest
+
+import tet_insurance_agent as rule_based
+from benchmark import PROMPTS
+from llm_backends import StubBackend
+from tet_insurance_agent_gemini import ResponseCache, TetInsuranceAgent
+
+
+def make_agent(archetype, variant, phase="pre-tet", cache=None):
+    """Two customers per archetype: same segment and tone, different name, age and id"""
+    profile = dict(rule_based.CUSTOMER_PROFILES[archetype])
+    profile.update(customer_id=f"{archetype}-{variant}", name=f"Khách {archetype} {variant}",
+                   age=profile['age'] + variant)
+    return TetInsuranceAgent("test-key", profile, phase, llm_backend=StubBackend(),
+                             response_cache=cache if cache is not None else ResponseCache(), router=None)
+
+
+def test_shared_prompts_are_identical_and_name_free():
+    prompts = defaultdict(set)
+    for archetype in rule_based.CUSTOMER_PROFILES:
+        for phase in rule_based.TET_PHASES:
+            for variant in (1, 2):
+                agent = make_agent(archetype, variant, phase)
+                for message in PROMPTS:
+                    prompt = agent._build_prompt(message, agent._retrieve(message))
+                    if agent._cache_personalization() is False:
+                        assert agent.profile['name'] not in prompt
+                        assert f"{agent.profile['age']} years old" not in prompt
+                        context = agent.response_cache.make_context(agent.profile, phase)
+                        prompts[context, ResponseCache.normalize_query(message)].add(prompt)
+                    else:
+                        assert agent.profile['name'] in prompt
+
+    assert prompts
+    assert all(len(variants) == 1 for variants in prompts.values())
+
+
+def test_shared_answer_is_reused_across_customers():
+    cache = ResponseCache()
+    first, second = make_agent('family', 1, cache=cache), make_agent('family', 2, cache=cache)
+    message = "Bảo hiểm nhân thọ có lợi gì?"
+
+    answer = first.generate_response(message)
+    assert first._cache_personalization() is False
+    assert second.generate_response(message) == answer
+    assert cache.stats()['hits'] == 1
+
+
+def test_answer_with_customer_history_is_scoped_to_the_customer():
+    cache = ResponseCache()
+    first, second = make_agent('family', 1, cache=cache), make_agent('family', 2, cache=cache)
+    message = "How much does family health insurance cost?"
+
+    first.generate_response(message)
+    assert first._cache_personalization() is True
+    assert first.profile['name'] in first._build_prompt(message)
+
+    second.generate_response(message)
+    assert cache.stats()['hits'] == 0 and len(cache) == 2
+
+
+@pytest.mark.parametrize("message", ["Bảo hiểm nhân thọ có lợi gì?", "What do you recommend for Tet?"])
+def test_answers_built_from_conversation_memory_are_not_cached(message):
+    cache = ResponseCache()
+    agent = make_agent('senior', 1, cache=cache)
+    agent.short_term_memory.add('user_intent', 'Asking about pricing', {'query': "Giá bao nhiêu?"})
+
+    agent.generate_response(message)
+    assert agent._cache_personalization() is None
+    assert len(cache) == 0
@@ -2,27 +2,18 @@ import streamlit as st
 import json
 from datetime import datetime, timedelta
 import random
+import re
 
-# Page configuration
-st.set_page_config(
-    page_title="Tet Insurance AI Agent Demo",
-    page_icon="🧧",
-    layout="wide"
-)
-
-# Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'customer_profile' not in st.session_state:
-    st.session_state.customer_profile = None
-if 'current_phase' not in st.session_state:
-    st.session_state.current_phase = "pre-tet"
-if 'conversation_context' not in st.session_state:
-    st.session_state.conversation_context = {}
+import config
+from bundles import BundleOptimizer
+from gazetteer import DestinationGazetteer, default_entries
+from intent_matcher import IntentMatcher
+from pricing import PricingEngine
 
 # Customer profiles database
 CUSTOMER_PROFILES = {
     "young_professional": {
+        "customer_id": "C001",
         "name": "Minh Nguyen",
         "age": 28,
         "segment": "Young Professional",
@@ -36,6 +27,7 @@ CUSTOMER_PROFILES = {
         "tet_plans": "Traveling home to Vinh (300km)"
     },
     "family": {
+        "customer_id": "C002",
         "name": "Linh Tran",
         "age": 35,
         "segment": "Family with Kids",
@@ -50,6 +42,7 @@ CUSTOMER_PROFILES = {
         "tet_plans": "Hosting family gathering"
     },
     "senior": {
+        "customer_id": "C003",
         "name": "Tuấn Lê",
         "age": 55,
         "segment": "Senior/Retiree",
@@ -62,6 +55,7 @@ CUSTOMER_PROFILES = {
         "tet_plans": "Visiting children in Saigon"
     },
     "business_owner": {
+        "customer_id": "C004",
         "name": "Hùng Pham",
         "age": 42,
         "segment": "Small Business Owner",
@@ -104,40 +98,140 @@ INSURANCE_PRODUCTS = {
         "name": "Domestic Travel Insurance",
         "price": 150000,
         "coverage": "50,000,000 VND",
-        "duration": "Per trip (up to 15 days)"
+        "duration": "Per trip (up to 15 days)",
+        "coverage_amount": 50000000,
+        "bundle_group": "travel"
     },
     "travel_international": {
         "name": "International Travel Insurance",
         "price": 500000,
         "coverage": "100,000,000 VND",
-        "duration": "Annual coverage"
+        "duration": "Annual coverage",
+        "coverage_amount": 100000000,
+        "bundle_group": "travel"
     },
     "motor_extension": {
         "name": "Motor Insurance Highway Extension",
         "price": 250000,
         "coverage": "Extended distance + passengers",
-        "duration": "30 days"
+        "duration": "30 days",
+        "coverage_amount": 100000000,  # Passenger cover counted for bundles
+        "requires": "has_motor"
     },
     "family_health": {
         "name": "Family Health Package",
         "price": 3500000,
         "coverage": "Up to 500,000,000 VND",
-        "duration": "Annual"
+        "duration": "Annual",
+        "coverage_amount": 500000000,
+        "owned_flag": "has_health"
     },
     "accident": {
         "name": "Personal Accident Insurance",
         "price": 300000,
         "coverage": "200,000,000 VND",
-        "duration": "Annual"
+        "duration": "Annual",
+        "coverage_amount": 200000000
     },
     "life_savings": {
         "name": "Life + Savings Insurance",
         "price": 5000000,
         "coverage": "1,000,000,000 VND + Returns",
-        "duration": "Annual premium"
+        "duration": "Annual premium",
+        "coverage_amount": 1000000000,
+        "owned_flag": "has_life"
     }
 }
 
+# Intent keywords (whole words; English inflections are listed explicitly)
+# "bảo hiểm" is in almost every question, so it is not a claim signal
+CLAIM_KEYWORDS = ["tai nạn", "accident", "accidents", "claim", "claims", "bồi thường"]
+TRAVEL_KEYWORDS = ["du lịch", "travel", "travels", "traveling", "travelling", "đi", "trip", "trips"]
+PRICE_KEYWORDS = ["giá", "price", "prices", "bao nhiêu", "cost", "costs"]
+AGREE_KEYWORDS = ["yes", "có", "ok", "được", "đồng ý", "sure"]
+DECLINE_KEYWORDS = ["no", "không", "cancel", "thôi"]
+# Explicit bundle requests only: "package"/"combo" alone also name single products ("Family Health Package")
+BUNDLE_KEYWORDS = [
+    "gói nào", "trọn gói", "gói kết hợp", "gói combo", "combo nào", "bundle", "bundles",
+    "combo of", "which package", "which packages", "what package", "best package"
+]
+
+# Claim words naming the Personal Accident product ("mua bảo hiểm tai nạn", "accident insurance")
+ACCIDENT_PRODUCT_KEYWORDS = [
+    "bảo hiểm tai nạn", "gói tai nạn", "tai nạn cá nhân", "personal accident",
+    "accident insurance", "accident cover", "accident coverage", "accident policy", "accident plan"
+]
+
+# All intents compiled into one matcher; generate_response checks them in this order
+INTENT_MATCHER = IntentMatcher({
+    'claim': CLAIM_KEYWORDS,
+    'accident_product': ACCIDENT_PRODUCT_KEYWORDS,
+    'travel': TRAVEL_KEYWORDS,
+    'bundle': BUNDLE_KEYWORDS,
+    'price': PRICE_KEYWORDS,
+    'agree': AGREE_KEYWORDS,
+    'decline': DECLINE_KEYWORDS
+})
+
+# Products suggested by each analyze_needs rule, in rule order
+NEEDS_PRODUCTS = {
+    "travel": ["travel_domestic", "motor_extension"],
+    "family": ["family_health", "life_savings"],
+    "motor": ["motor_extension", "accident"],
+    "business": ["accident", "life_savings"]
+}
+
+# Quick-quote pricing per destination zone (base price for a 5-day trip)
+TRAVEL_ZONES = {
+    "domestic": {"product": "travel_domestic", "base_price": 120000},
+    "asean": {"product": "travel_international", "base_price": 180000},
+    "asia": {"product": "travel_international", "base_price": 250000},
+    "worldwide": {"product": "travel_international", "base_price": 350000}
+}
+
+# Price tables for every product x phase x trip duration x zone
+PRICING = PricingEngine(INSURANCE_PRODUCTS, TRAVEL_ZONES)
+
+# Best-coverage bundles under a budget (BUNDLE_DISCOUNT for 2+ products)
+BUNDLES = BundleOptimizer(INSURANCE_PRODUCTS, PRICING)
+
+# Destinations recognised for quick quotes (provinces, resorts, ASEAN and long-haul)
+GAZETTEER = DestinationGazetteer(default_entries())
+
+
+def find_destination(text):
+    """Return the canonical name of the first known destination mentioned in text, or None"""
+    destination = GAZETTEER.find(text)
+    return destination.name if destination else None
+
+
+BUDGET_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(triệu|trieu|tr|million|nghìn|ngàn|nghin|ngan|k)\b", re.IGNORECASE)
+BUDGET_UNITS = {"triệu": 1000000, "trieu": 1000000, "tr": 1000000, "million": 1000000,
+                "nghìn": 1000, "ngàn": 1000, "nghin": 1000, "ngan": 1000, "k": 1000}
+
+
+DURATION_RE = re.compile(r"(\d+)\s*(ngày|ngay|days?|tuần|tuan|weeks?)\b", re.IGNORECASE)
+DURATION_UNITS = {"ngày": 1, "ngay": 1, "day": 1, "days": 1, "tuần": 7, "tuan": 7, "week": 7, "weeks": 7}
+QUICK_QUOTE_DAYS = 5  # Trip length quoted when the customer doesn't give one
+
+
+def find_duration(text):
+    """Return a trip length in days mentioned in text ("10 ngày", "2 weeks"), or None"""
+    match = DURATION_RE.search(text)
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2).lower()]
+
+
+def find_budget(text):
+    """Return a budget in VND mentioned in text ("5 triệu", "1,5tr", "800k"), or None"""
+    match = BUDGET_RE.search(text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", "."))
+    return int(amount * BUDGET_UNITS[match.group(2).lower()])
+
+
 class TetInsuranceAgent:
     def __init__(self, customer_profile, current_phase):
         self.profile = customer_profile
@@ -145,7 +239,7 @@ class TetInsuranceAgent:
     
     def generate_greeting(self):
         """Generate personalized Tet greeting"""
-        greeting = self.profile['greeting']
+        greeting = self.profile.get('greeting') or f"Chào {self.profile.get('name', 'bạn')}! 🧧"
         
         if self.phase == "pre-tet":
             return f"{greeting} Tết đang đến gần! Bạn đã chuẩn bị gì chưa? 🎊"
@@ -164,7 +258,7 @@ class TetInsuranceAgent:
                 recommendations.append({
                     "type": "travel",
                     "reason": f"Bạn đang có kế hoạch: {self.profile['tet_plans']}",
-                    "products": ["travel_domestic", "motor_extension"]
+                    "products": NEEDS_PRODUCTS["travel"]
                 })
         
         # Family protection
@@ -172,7 +266,7 @@ class TetInsuranceAgent:
             recommendations.append({
                 "type": "family",
                 "reason": "Bảo vệ gia đình trong dịp Tết",
-                "products": ["family_health", "life_savings"]
+                "products": NEEDS_PRODUCTS["family"]
             })
         
         # Motor insurance extension
@@ -180,7 +274,7 @@ class TetInsuranceAgent:
             recommendations.append({
                 "type": "motor",
                 "reason": "Hành trình dài cần bảo vệ tốt hơn",
-                "products": ["motor_extension", "accident"]
+                "products": NEEDS_PRODUCTS["motor"]
             })
         
         # Business protection
@@ -188,23 +282,32 @@ class TetInsuranceAgent:
             recommendations.append({
                 "type": "business",
                 "reason": "Bảo vệ doanh nghiệp trong dịp nghỉ Tết",
-                "products": ["accident", "life_savings"]
+                "products": NEEDS_PRODUCTS["business"]
             })
         
         return recommendations
     
+    def recommended_products(self, limit=config.MAX_RECOMMENDATIONS):
+        """Distinct product keys from analyze_needs, in order, at most `limit`"""
+        products = []
+        for recommendation in self.analyze_needs():
+            for product_key in recommendation['products']:
+                if product_key not in products:
+                    products.append(product_key)
+        return products[:limit]
+    
     def generate_product_recommendation(self, product_key):
         """Generate product recommendation message"""
         product = INSURANCE_PRODUCTS[product_key]
+        discount = PRICING.discount(self.phase)
         
-        if self.phase == "tet-peak":
-            discount = 0.3
-            special_price = int(product['price'] * (1 - discount))
+        if discount:
+            special_price = PRICING.catalog_price(product_key, self.phase)
             return f"""
 🎊 **TẾT SPECIAL - {product['name']}**
 
 Giá thường: {product['price']:,} VND
-🎁 GIÁ TẾT: **{special_price:,} VND** (Giảm {int(discount*100)}%)
+🎁 GIÁ TẾT: **{special_price:,} VND** (Giảm {round(discount*100)}%)
 
 ✅ Bảo hiểm: {product['coverage']}
 ✅ Thời hạn: {product['duration']}
@@ -223,23 +326,58 @@ Bạn có muốn tôi chuẩn bị gói này không?
 Bạn quan tâm đến gói này không?
 """
     
-    def generate_quick_quote(self, destination, duration=5):
-        """Generate quick travel insurance quote"""
-        if destination.lower() in ["thailand", "singapore", "malaysia", "philippines"]:
-            base_price = 180000
-            product_type = "travel_international"
+    def generate_bundle_recommendation(self, budget=None):
+        """Recommend the best-coverage bundle within budget (default: by profile income)"""
+        if budget is None:
+            budget = config.BUNDLE_BUDGETS.get(self.profile.get('income'), config.BUNDLE_BUDGETS["medium"])
+        bundle = BUNDLES.optimize(budget, self.phase, self.profile)
+        
+        if bundle is None:
+            return f"Với ngân sách {budget:,} VND hiện chưa có gói phù hợp. Bạn có thể cho tôi biết ngân sách khác không?"
+        
+        lines = "\n".join(
+            f"✅ {INSURANCE_PRODUCTS[key]['name']}: {PRICING.catalog_price(key, self.phase):,} VND"
+            for key in bundle['products']
+        )
+        if bundle['bundle_discount']:
+            total = f"Tổng: {bundle['list_price']:,} VND → **{bundle['price']:,} VND** (giảm thêm {round(bundle['bundle_discount']*100)}% khi mua combo)"
         else:
-            base_price = 120000
-            product_type = "travel_domestic"
+            total = f"Tổng: **{bundle['price']:,} VND**"
+        
+        return f"""
+🎁 **Gói bảo hiểm tối ưu cho bạn** (ngân sách {bundle['budget']:,} VND)
+
+{lines}
+
+💰 {total}
+🛡️ Tổng quyền lợi bảo hiểm: {bundle['coverage']:,} VND
+
+Bạn có muốn tôi chuẩn bị combo này không?
+"""
+    
+    def generate_quick_quote(self, destination, duration=QUICK_QUOTE_DAYS):
+        """Generate quick travel insurance quote"""
+        if not 1 <= duration <= PRICING.max_days:
+            # Outside the price tables: valid trip, no instant price
+            return f"""
+✈️ **Báo giá du lịch - {destination}, {duration} ngày**
+
+Báo giá nhanh áp dụng cho chuyến đi từ 1 đến {PRICING.max_days} ngày. Với chuyến đi dài ngày của bạn, chuyên viên sẽ liên hệ gửi báo giá riêng! 📞
+"""
         
-        total_price = base_price * (duration / 5)
+        entry = GAZETTEER.get(destination)
+        quote = PRICING.trip_quote(entry.zone if entry else "domestic", self.phase, duration)
+        
+        price_line = f"💰 Giá: **{quote['price']:,} VND**"
+        if quote['discount']:
+            price_line += f" (Giảm {round(quote['discount']*100)}% dịp Tết, giá gốc {quote['list_price']:,} VND)"
         
         return f"""
 ✈️ **Báo giá nhanh - Bảo hiểm du lịch**
 
 📍 Điểm đến: {destination}
 📅 Thời gian: {duration} ngày
-💰 Giá: **{int(total_price):,} VND**
+{price_line}
 🛡️ Bảo hiểm: 50,000,000 VND
 
 Bao gồm:
@@ -274,29 +412,28 @@ Bạn có thể gửi ảnh cho tôi bây giờ không?
 
     def generate_response(self, user_input):
         """Generate contextual response based on user input"""
-        user_input_lower = user_input.lower()
+        intents = INTENT_MATCHER.intents(user_input)
         
-        # Claim handling
-        if any(word in user_input_lower for word in ["tai nạn", "accident", "claim", "bồi thường", "bảo hiểm"]):
+        # Claim handling (not for questions about the accident insurance product)
+        if 'claim' in intents and 'accident_product' not in intents:
             return self.handle_claim_request()
         
         # Travel inquiry
-        if any(word in user_input_lower for word in ["du lịch", "travel", "đi", "trip"]):
+        if 'travel' in intents:
             # Try to extract destination
-            destinations = ["thailand", "singapore", "da nang", "nha trang", "phu quoc", "ha noi", "sai gon"]
-            found_destination = None
-            for dest in destinations:
-                if dest in user_input_lower:
-                    found_destination = dest.title()
-                    break
+            found_destination = find_destination(user_input)
             
             if found_destination:
-                return self.generate_quick_quote(found_destination)
+                return self.generate_quick_quote(found_destination, find_duration(user_input) or QUICK_QUOTE_DAYS)
             else:
                 return "Tuyệt! Bạn dự định đi đâu trong dịp Tết? Tôi sẽ báo giá bảo hiểm du lịch ngay cho bạn! ✈️"
         
+        # Package question ("Có gói nào cho gia đình không?")
+        if 'bundle' in intents:
+            return self.generate_bundle_recommendation(find_budget(user_input))
+        
         # Price inquiry
-        if any(word in user_input_lower for word in ["giá", "price", "bao nhiêu", "cost"]):
+        if 'price' in intents:
             recommendations = self.analyze_needs()
             if recommendations:
                 product_key = recommendations[0]['products'][0]
@@ -304,8 +441,11 @@ Bạn có thể gửi ảnh cho tôi bây giờ không?
             else:
                 return "Bạn quan tâm đến loại bảo hiểm nào? Tôi có thể báo giá:\n- Du lịch\n- Xe máy\n- Sức khỏe gia đình\n- Tai nạn cá nhân"
         
+        # Replies to an offer ("Có", "Không, cảm ơn"); "có"/"không" also frame questions
+        is_question = user_input.rstrip().endswith("?")
+        
         # Positive responses
-        if any(word in user_input_lower for word in ["yes", "có", "ok", "được", "đồng ý", "sure"]):
+        if 'agree' in intents and not is_question:
             return """
 Tuyệt vời! 🎉
 
@@ -320,7 +460,7 @@ Bạn muốn thanh toán bằng cách nào?
 """
         
         # Negative responses
-        if any(word in user_input_lower for word in ["no", "không", "cancel", "thôi"]):
+        if 'decline' in intents and not is_question:
             return "Không sao! Nếu cần gì, cứ nhắn cho tôi nhé. Chúc bạn một mùa Tết vui vẻ! 🧧"
         
         # Default contextual response
@@ -340,6 +480,23 @@ Tôi hiểu rồi!
 
 # Streamlit UI
 def main():
+    # Page configuration
+    st.set_page_config(
+        page_title="Tet Insurance AI Agent Demo",
+        page_icon="🧧",
+        layout="wide"
+    )
+    
+    # Initialize session state
+    if 'messages' not in st.session_state:
+        st.session_state.messages = []
+    if 'customer_profile' not in st.session_state:
+        st.session_state.customer_profile = None
+    if 'current_phase' not in st.session_state:
+        st.session_state.current_phase = "pre-tet"
+    if 'conversation_context' not in st.session_state:
+        st.session_state.conversation_context = {}
+    
     st.title("🧧 Tet Insurance AI Agent Demo")
     st.markdown("*Tư vấn bảo hiểm thông minh cho mùa Tết*")
     
@@ -522,9 +679,10 @@ def main():
                 st.write(f"**Coverage:** {product['coverage']}")
                 st.write(f"**Duration:** {product['duration']}")
                 
-                if st.session_state.current_phase == "tet-peak":
-                    discount_price = int(product['price'] * 0.7)
-                    st.success(f"🎁 Tet Special: {discount_price:,} VND (30% off)")
+                discount = PRICING.discount(st.session_state.current_phase)
+                if discount:
+                    discount_price = PRICING.catalog_price(product_key, st.session_state.current_phase)
+                    st.success(f"🎁 Tet Special: {discount_price:,} VND ({round(discount*100)}% off)")
         
         st.divider()
         
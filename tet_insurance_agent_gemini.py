@@ -1,64 +1,91 @@
 import streamlit as st
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
 from datetime import datetime, timedelta
 import json
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet, Iterator, Optional, Tuple
 import pickle
 import os
+import tempfile
+import hashlib
+import threading
+import asyncio
+import random
+import time
+import re
+import functools
+import copy
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from collections import OrderedDict, deque
 
-# Page configuration
-st.set_page_config(
-    page_title="Tet Insurance AI Agent - Gemini Powered",
-    page_icon="🧧",
-    layout="wide"
-)
-
-# Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'customer_profile' not in st.session_state:
-    st.session_state.customer_profile = None
-if 'current_phase' not in st.session_state:
-    st.session_state.current_phase = "pre-tet"
-if 'short_term_memory' not in st.session_state:
-    st.session_state.short_term_memory = []
-if 'conversation_summary' not in st.session_state:
-    st.session_state.conversation_summary = ""
-if 'gemini_model' not in st.session_state:
-    st.session_state.gemini_model = None
+import config
+import tet_insurance_agent as rule_based
+from intent_matcher import IntentMatcher
+import pricing
+from llm_backends import CircuitBreaker, CircuitBreakerBackend, LLMBackend, create_backend
 
 
 class SimpleEmbedding:
     """Simple embedding using character-level features for semantic similarity"""
     
+    # Character frequency vector (a-z, 0-9, common Vietnamese characters)
+    CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789 àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ'
+    DIMENSIONS = len(CHARS) + 10  # Extra features
+    
+    # Code point -> vector index lookup table (-1 for characters we don't track)
+    _CHAR_INDEX = np.full(max(map(ord, CHARS)) + 1, -1, dtype=np.int64)
+    _CHAR_INDEX[[ord(c) for c in CHARS]] = np.arange(len(CHARS))
+    
     @staticmethod
     def embed_text(text: str) -> np.ndarray:
         """Create a simple embedding vector from text"""
+        return SimpleEmbedding.embed_batch([text])[0]
+    
+    @staticmethod
+    def embed_batch(texts: List[str]) -> np.ndarray:
+        """Create embedding vectors for many texts in one pass (one row per text)"""
         # Normalize text
-        text = text.lower().strip()
-        
-        # Character frequency vector (a-z, 0-9, common Vietnamese characters)
-        chars = 'abcdefghijklmnopqrstuvwxyz0123456789 àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ'
-        vector = np.zeros(len(chars) + 10)  # Extra features
-        
-        # Character frequencies
-        for i, char in enumerate(chars):
-            vector[i] = text.count(char) / max(len(text), 1)
+        texts = [text.lower().strip() for text in texts]
+        n_texts = len(texts)
+        n_chars = len(SimpleEmbedding.CHARS)
+        dims = SimpleEmbedding.DIMENSIONS
+        
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=n_texts)
+        denominators = np.maximum(lengths, 1).astype(np.float32)
+        
+        # Character frequencies: map every code point of every text to its
+        # vector index and count (row, index) pairs with a single bincount
+        code_points = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+        rows = np.repeat(np.arange(n_texts, dtype=np.int64), lengths)
+        lut = SimpleEmbedding._CHAR_INDEX
+        in_range = code_points < len(lut)
+        indices = np.full(code_points.shape, -1, dtype=np.int64)
+        indices[in_range] = lut[code_points[in_range]]
+        tracked = indices >= 0
+        counts = np.bincount(
+            rows[tracked] * dims + indices[tracked],
+            minlength=n_texts * dims
+        ).reshape(n_texts, dims)
+        
+        vectors = counts.astype(np.float32)
+        vectors[:, :n_chars] /= denominators[:, None]
         
         # Additional features
-        vector[-10] = len(text) / 100.0  # Length
-        vector[-9] = text.count(' ') / max(len(text), 1)  # Word density
-        vector[-8] = 1 if 'bảo hiểm' in text else 0
-        vector[-7] = 1 if 'giá' in text or 'price' in text else 0
-        vector[-6] = 1 if 'tết' in text or 'tet' in text else 0
-        vector[-5] = 1 if 'du lịch' in text or 'travel' in text else 0
-        vector[-4] = 1 if 'tai nạn' in text or 'accident' in text else 0
-        vector[-3] = 1 if 'gia đình' in text or 'family' in text else 0
-        vector[-2] = 1 if 'claim' in text or 'bồi thường' in text else 0
-        vector[-1] = sum(1 for c in text if c.isupper()) / max(len(text), 1)
-        
-        return vector
+        vectors[:, -10] = lengths / 100.0  # Length
+        vectors[:, -9] = vectors[:, SimpleEmbedding.CHARS.index(' ')]  # Word density
+        for row, text in enumerate(texts):
+            vectors[row, -8] = 1 if 'bảo hiểm' in text else 0
+            vectors[row, -7] = 1 if 'giá' in text or 'price' in text else 0
+            vectors[row, -6] = 1 if 'tết' in text or 'tet' in text else 0
+            vectors[row, -5] = 1 if 'du lịch' in text or 'travel' in text else 0
+            vectors[row, -4] = 1 if 'tai nạn' in text or 'accident' in text else 0
+            vectors[row, -3] = 1 if 'gia đình' in text or 'family' in text else 0
+            vectors[row, -2] = 1 if 'claim' in text or 'bồi thường' in text else 0
+            vectors[row, -1] = sum(map(str.isupper, text)) / denominators[row]
+        
+        return vectors
     
     @staticmethod
     def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
@@ -74,46 +101,107 @@ class SimpleEmbedding:
 
 
 class KnowledgeBase:
-    """Knowledge base with semantic search capabilities"""
+    """Knowledge base with semantic search capabilities
+    
+    Embeddings are kept L2-normalized in one contiguous float32 matrix that
+    grows in amortized (doubling) chunks, so a search is a single mat-vec
+    product followed by an argpartition top-k. A saved index is reopened with
+    the matrix memory-mapped read-only; adding documents copies it on grow.
+    """
+    
+    INITIAL_CAPACITY = 64
+    MATRIX_FILE = 'embeddings.npy'
+    DOCUMENTS_FILE = 'documents.json'
+    MANIFEST_FILE = 'CURRENT'
     
     def __init__(self):
         self.documents = []
-        self.embeddings = []
         self.embedding_model = SimpleEmbedding()
+        self._matrix = np.zeros((self.INITIAL_CAPACITY, SimpleEmbedding.DIMENSIONS), dtype=np.float32)
+        self._size = 0
+        self.read_only = False
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        """L2-normalized embedding matrix, one row per document"""
+        return self._matrix[:self._size]
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows in place (all-zero rows stay zero)"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+    
+    def _reserve(self, extra: int):
+        """Make room for `extra` more rows, doubling capacity when full"""
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        
+        while capacity < needed:
+            capacity = max(capacity * 2, self.INITIAL_CAPACITY)
+        
+        grown = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
     
     def add_document(self, doc_id: str, content: str, metadata: Dict[str, Any] = None):
         """Add a document to the knowledge base"""
-        embedding = self.embedding_model.embed_text(content)
+        self.add_documents([(doc_id, content, metadata)])
+    
+    def add_documents(self, documents: List[tuple]):
+        """Add many (doc_id, content, metadata) documents with one batch embedding"""
+        if self.read_only:
+            raise RuntimeError("Knowledge base is read-only")
+        if not documents:
+            return
+        
+        embeddings = self._normalize(
+            self.embedding_model.embed_batch([content for _, content, _ in documents])
+        )
         
-        self.documents.append({
-            'id': doc_id,
-            'content': content,
-            'metadata': metadata or {},
-            'timestamp': datetime.now().isoformat()
-        })
-        self.embeddings.append(embedding)
+        self._reserve(len(documents))
+        self._matrix[self._size:self._size + len(documents)] = embeddings
+        self._size += len(documents)
+        
+        timestamp = datetime.now().isoformat()
+        for doc_id, content, metadata in documents:
+            self.documents.append({
+                'id': doc_id,
+                'content': content,
+                'metadata': metadata or {},
+                'timestamp': timestamp
+            })
     
     def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Search for relevant documents using semantic similarity"""
-        if not self.documents:
+        if not self.documents or top_k <= 0:
             return []
         
-        query_embedding = self.embedding_model.embed_text(query)
+        query_embedding = self._normalize(self.embedding_model.embed_batch([query]))[0]
         
-        # Calculate similarities
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = self.embedding_model.cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((i, similarity))
+        # Cosine similarity against every (pre-normalized) row at once. einsum
+        # sums every row the same way, so identical documents score identically
+        # (BLAS mat-vec can round the trailing rows differently and break ties)
+        scores = np.einsum('ij,j->i', self.embeddings, query_embedding)
         
-        # Sort by similarity
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Top-k without a full sort, then order the k winners (ties by insertion order)
+        k = min(top_k, len(scores))
+        if k < len(scores):
+            # Every row tied with the k-th score, so the earliest ties win the cut
+            kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            candidates = np.flatnonzero(scores >= kth_score)
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
         
         # Return top-k results
         results = []
-        for i, score in similarities[:top_k]:
+        for i in candidates:
             result = self.documents[i].copy()
-            result['similarity_score'] = score
+            result['similarity_score'] = float(scores[i])
             results.append(result)
         
         return results
@@ -121,37 +209,274 @@ class KnowledgeBase:
     def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents in the knowledge base"""
         return self.documents
+    
+    def freeze(self) -> 'KnowledgeBase':
+        """Make the knowledge base read-only so it can be shared across sessions"""
+        if self._matrix.shape[0] != self._size:
+            self._matrix = self._matrix[:self._size].copy()  # Drop spare capacity
+        self._matrix.setflags(write=False)
+        self.read_only = True
+        return self
+    
+    def save(self, path: str):
+        """Persist the index as an embedding matrix (.npy) plus a JSON document sidecar
+        
+        Each save writes a fresh version directory under `path` and then swaps
+        the one-line MANIFEST_FILE naming it, so concurrent writers never share
+        a temp file and readers always open a complete matrix/sidecar pair.
+        Older versions are left in place, since workers may still have them mapped.
+        """
+        os.makedirs(path, exist_ok=True)
+        version = tempfile.mkdtemp(prefix='v-', dir=path)
+        os.chmod(version, 0o755)  # mkdtemp is owner-only; other workers must read it
+        
+        with open(os.path.join(version, self.MATRIX_FILE), 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.embeddings))
+        with open(os.path.join(version, self.DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'count': self._size,
+                'dimensions': self._matrix.shape[1],
+                'documents': self.documents
+            }, f, ensure_ascii=False, separators=(',', ':'))
+        
+        fd, manifest_tmp = tempfile.mkstemp(prefix='.manifest-', dir=path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(os.path.basename(version))
+        os.chmod(manifest_tmp, 0o644)
+        os.replace(manifest_tmp, os.path.join(path, self.MANIFEST_FILE))
+    
+    @classmethod
+    def current_version(cls, path: str) -> Optional[str]:
+        """Directory of the saved index's current version, or None if nothing was saved at path"""
+        try:
+            with open(os.path.join(path, cls.MANIFEST_FILE), encoding='utf-8') as f:
+                return os.path.join(path, f.read().strip())
+        except FileNotFoundError:
+            return None
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> 'KnowledgeBase':
+        """Open a saved index; the embedding matrix is memory-mapped (shared via the OS page cache)"""
+        version = cls.current_version(path)
+        if version is None:
+            raise FileNotFoundError(f"No knowledge index saved at {path}")
+        
+        with open(os.path.join(version, cls.DOCUMENTS_FILE), encoding='utf-8') as f:
+            sidecar = json.load(f)
+        
+        matrix = np.load(os.path.join(version, cls.MATRIX_FILE), mmap_mode=mmap_mode)
+        if matrix.shape != (sidecar['count'], sidecar['dimensions']) or matrix.dtype != np.float32:
+            raise ValueError(f"Knowledge index at {path} is inconsistent: matrix {matrix.shape} vs {sidecar['count']} documents")
+        
+        kb = cls()
+        kb._matrix = matrix
+        kb._size = sidecar['count']
+        kb.documents = sidecar['documents']
+        return kb
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class SegmentedKnowledgeBase:
+    """Knowledge base made of a shared read-only segment plus a per-customer overlay
+    
+    New documents go to the overlay; searches take top-k from each segment and
+    merge them (overlay first on ties, so customer history wins).
+    """
+    
+    def __init__(self, shared: KnowledgeBase, overlay: KnowledgeBase = None):
+        self.shared = shared
+        self.overlay = overlay if overlay is not None else KnowledgeBase()
+    
+    @property
+    def segments(self) -> List[KnowledgeBase]:
+        return [self.overlay, self.shared]
+    
+    def add_document(self, doc_id: str, content: str, metadata: Dict[str, Any] = None):
+        """Add a document to the overlay segment"""
+        self.overlay.add_document(doc_id, content, metadata)
+    
+    def add_documents(self, documents: List[tuple]):
+        """Add many (doc_id, content, metadata) documents to the overlay segment"""
+        self.overlay.add_documents(documents)
+    
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Search every segment and merge the per-segment top-k"""
+        results = []
+        for segment in self.segments:
+            results.extend(segment.search(query, top_k=top_k))
+        
+        results.sort(key=lambda doc: doc['similarity_score'], reverse=True)
+        return results[:top_k]
+    
+    def get_all_documents(self) -> List[Dict[str, Any]]:
+        """Get all documents across segments"""
+        return [doc for segment in self.segments for doc in segment.get_all_documents()]
+    
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+
+# Static product catalog knowledge (identical for every customer and phase)
+PRODUCT_KNOWLEDGE = {
+    'travel_domestic': {
+        'name': 'Domestic Travel Insurance',
+        'description': 'Comprehensive coverage for travel within Vietnam. Covers medical emergencies, trip cancellation, lost baggage, and 24/7 assistance.',
+        'price': 150000,
+        'coverage': 50000000,
+        'best_for': 'Weekend trips, Tet travel to hometown, domestic vacations'
+    },
+    'travel_international': {
+        'name': 'International Travel Insurance',
+        'description': 'Full protection for overseas travel. Includes medical coverage up to 100 million VND, emergency evacuation, and trip interruption.',
+        'price': 500000,
+        'coverage': 100000000,
+        'best_for': 'ASEAN travel, long-distance flights, adventure trips'
+    },
+    'motor_extension': {
+        'name': 'Motor Insurance Highway Extension',
+        'description': 'Extends your motor insurance for long-distance travel. Covers highway accidents, passenger protection, and roadside assistance.',
+        'price': 250000,
+        'coverage': 'Extended distance + 3 passengers',
+        'best_for': 'Tet journey home, long road trips, highway travel'
+    },
+    'family_health': {
+        'name': 'Family Health Package',
+        'description': 'Complete health coverage for entire family. Includes annual checkups, hospitalization, outpatient care, and dental.',
+        'price': 3500000,
+        'coverage': 500000000,
+        'best_for': 'Families with children, comprehensive protection, peace of mind'
+    },
+    'accident': {
+        'name': 'Personal Accident Insurance',
+        'description': 'Protection against accidents resulting in injury or death. Covers medical expenses, disability benefits, and death benefits.',
+        'price': 300000,
+        'coverage': 200000000,
+        'best_for': 'Active lifestyle, motorbike riders, additional protection'
+    },
+    'life_savings': {
+        'name': 'Life Insurance with Savings',
+        'description': 'Dual benefit policy combining life protection with savings. Guaranteed returns plus insurance coverage for family.',
+        'price': 5000000,
+        'coverage': '1 billion VND + investment returns',
+        'best_for': 'Long-term planning, wealth building, family security'
+    }
+}
+
+# Tet-specific knowledge (the phase-dependent discount doc is added per agent)
+TET_KNOWLEDGE = {
+    'tet_travel_peak': 'During Tet, traffic accidents increase by 40%. Highway travel is especially risky. Extended motor insurance is crucial.',
+    'tet_family_gathering': 'Tet is time for family reunion. Many people host large gatherings, increasing health risks. Family health packages popular.',
+    'tet_gift_insurance': 'Insurance as Tet gift is becoming popular. Shows care for loved ones. Life insurance and health insurance most gifted.',
+    'tet_budget': 'People receive bonuses before Tet. Good time to invest in insurance. Many willing to spend on protection.'
+}
+
+
+# Discount percentage offered in each Tet phase (same settings as the price tables)
+PHASE_DISCOUNTS = {phase: round(discount * 100) for phase, discount in pricing.PHASE_DISCOUNTS.items()}
+
+
+def build_shared_knowledge_base() -> KnowledgeBase:
+    """Build the read-only product and Tet insights segment"""
+    kb = KnowledgeBase()
+    
+    product_docs = []
+    for product_id, product_info in PRODUCT_KNOWLEDGE.items():
+        content = f"{product_info['name']}: {product_info['description']} Price: {product_info['price']:,} VND. Coverage: {product_info['coverage']}. Best for: {product_info['best_for']}"
+        
+        product_docs.append((
+            f'product_{product_id}',
+            content,
+            {'category': 'product', 'product_id': product_id, **product_info}
+        ))
+    
+    kb.add_documents(product_docs)
+    kb.add_documents([
+        (knowledge_id, content, {'category': 'tet_insights'})
+        for knowledge_id, content in TET_KNOWLEDGE.items()
+    ])
+    
+    return kb.freeze()
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_knowledge_base(index_path: str = None) -> KnowledgeBase:
+    """Process-wide shared segment, built (or memory-mapped from index_path) once
+    
+    Only this customer-independent segment is ever persisted; customer history
+    and the phase discount live in each agent's in-memory overlay.
+    """
+    if index_path and KnowledgeBase.current_version(index_path) is not None:
+        return KnowledgeBase.load(index_path).freeze()
+    
+    kb = build_shared_knowledge_base()
+    if index_path:
+        kb.save(index_path)
+    return kb
+
+
+class MemoryItem:
+    """Compact short-term memory record (epoch-float timestamp)"""
+    
+    __slots__ = ('type', 'content', 'metadata', 'timestamp')
+    
+    def __init__(self, item_type: str, content: str, metadata: Dict[str, Any] = None, timestamp: float = None):
+        self.type = item_type
+        self.content = content
+        self.metadata = metadata
+        self.timestamp = time.time() if timestamp is None else timestamp
+    
+    def __repr__(self) -> str:
+        return f"MemoryItem({self.type!r}, {self.content!r})"
 
 
 class ShortTermMemory:
-    """Short-term memory for conversation context"""
+    """Short-term memory for conversation context
+    
+    A fixed-size ring buffer (deque) plus one deque per item type, so add and
+    latest are O(1) and get_by_type copies only items of that type. The item
+    evicted from the ring is always the oldest of its type, so the per-type
+    index is trimmed from the left in step.
+    """
     
     def __init__(self, max_items: int = 10):
         self.max_items = max_items
-        self.items = []
+        self.items = deque(maxlen=max_items)
+        self._by_type = {}
     
     def add(self, item_type: str, content: str, metadata: Dict[str, Any] = None):
         """Add an item to short-term memory"""
-        memory_item = {
-            'type': item_type,
-            'content': content,
-            'metadata': metadata or {},
-            'timestamp': datetime.now().isoformat()
-        }
-        
+        if len(self.items) == self.max_items:
+            evicted = self.items[0]
+            same_type = self._by_type[evicted.type]
+            same_type.popleft()
+            if not same_type:
+                del self._by_type[evicted.type]
+        
+        memory_item = MemoryItem(item_type, content, metadata or None)
         self.items.append(memory_item)
         
-        # Keep only the most recent items
-        if len(self.items) > self.max_items:
-            self.items = self.items[-self.max_items:]
+        same_type = self._by_type.get(item_type)
+        if same_type is None:
+            same_type = self._by_type[item_type] = deque()
+        same_type.append(memory_item)
     
-    def get_recent(self, n: int = 5) -> List[Dict[str, Any]]:
-        """Get the n most recent items"""
-        return self.items[-n:] if self.items else []
+    def get_recent(self, n: int = 5) -> List[MemoryItem]:
+        """Get the n most recent items (oldest first)"""
+        if n <= 0:
+            return []
+        # Copying the bounded ring is faster than indexed deque access at these sizes
+        return list(self.items)[-n:]
     
-    def get_by_type(self, item_type: str) -> List[Dict[str, Any]]:
-        """Get all items of a specific type"""
-        return [item for item in self.items if item['type'] == item_type]
+    def get_by_type(self, item_type: str) -> List[MemoryItem]:
+        """Get all items of a specific type (oldest first)"""
+        return list(self._by_type.get(item_type, ()))
+    
+    def latest(self, item_type: str) -> Optional[MemoryItem]:
+        """Most recent item of a type, or None"""
+        same_type = self._by_type.get(item_type)
+        return same_type[-1] if same_type else None
     
     def summarize(self) -> str:
         """Generate a summary of short-term memory"""
@@ -160,41 +485,1035 @@ class ShortTermMemory:
         
         summary_parts = []
         
-        # Group by type
+        # Latest item per type
         for item_type in ['user_intent', 'product_interest', 'concern', 'decision']:
-            items = self.get_by_type(item_type)
-            if items:
-                latest = items[-1]
-                summary_parts.append(f"{item_type}: {latest['content']}")
+            latest = self.latest(item_type)
+            if latest is not None:
+                summary_parts.append(f"{item_type}: {latest.content}")
         
         return " | ".join(summary_parts) if summary_parts else "Recent conversation context available."
     
     def clear(self):
         """Clear all items from memory"""
-        self.items = []
+        self.items.clear()
+        self._by_type.clear()
+    
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __reversed__(self):
+        return reversed(self.items)
+
+
+class ContextAssembler:
+    """Fills a token budget with prompt context sections in priority order
+    
+    Sections are taken in the order given and lines within a section in order.
+    The first line that does not fit is truncated to the remaining budget (if
+    at least MIN_TRUNCATED_TOKENS remain) and every line after it is dropped,
+    so the same inputs always give the same context.
+    """
+    
+    MIN_TRUNCATED_TOKENS = 8
+    ELLIPSIS = "…"
+    
+    def __init__(self, max_tokens: int = 600):
+        self.max_tokens = max_tokens
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count: ~4 UTF-8 bytes per token (Vietnamese diacritics cost more)"""
+        return (len(text.encode('utf-8')) + 3) // 4
+    
+    def _truncate(self, line: str, max_tokens: int) -> str:
+        """Cut a line on a character boundary so it fits max_tokens, ellipsis included"""
+        max_bytes = max_tokens * 4 - len(self.ELLIPSIS.encode('utf-8'))
+        return line.encode('utf-8')[:max_bytes].decode('utf-8', errors='ignore').rstrip() + self.ELLIPSIS
+    
+    def assemble(self, sections: List[Tuple[Optional[str], List[str]]]) -> Dict[str, Any]:
+        """Join (header, lines) sections within the budget; headers only appear with a kept line
+        
+        `section_lines` counts the kept lines of each section; they are always
+        that section's first lines.
+        """
+        parts = []
+        used = 0
+        kept = dropped = 0
+        section_lines = []
+        truncated = exhausted = False
+        
+        for header, lines in sections:
+            header_cost = self.estimate_tokens(header) if header else 0
+            header_written = header is None
+            section_lines.append(0)
+            
+            for line in lines:
+                if exhausted:
+                    dropped += 1
+                    continue
+                
+                pending_header = 0 if header_written else header_cost
+                cost = pending_header + self.estimate_tokens(line)
+                if used + cost > self.max_tokens:
+                    exhausted = True
+                    remaining = self.max_tokens - used - pending_header
+                    if remaining < self.MIN_TRUNCATED_TOKENS:
+                        dropped += 1
+                        continue
+                    line = self._truncate(line, remaining)
+                    cost = pending_header + self.estimate_tokens(line)
+                    truncated = True
+                
+                if not header_written:
+                    parts.append(header)
+                    header_written = True
+                parts.append(line)
+                used += cost
+                kept += 1
+                section_lines[-1] += 1
+        
+        return {
+            'text': "\n".join(parts),
+            'tokens': used,
+            'budget': self.max_tokens,
+            'lines_kept': kept,
+            'lines_dropped': dropped,
+            'section_lines': section_lines,
+            'truncated': truncated
+        }
+
+
+class LoadShedError(Exception):
+    """Raised when the scheduler rejects an LLM call instead of queueing it"""
+
+
+class _SlotWaiter:
+    """A queued acquire, woken through its event loop (async callers) or an event (blocking callers)"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+    
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+    
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+
+class PriorityScheduler:
+    """Priority admission for LLM calls: claims, then purchase flows, then browsing
+    
+    A freed slot always goes to the highest waiting class. Each class has its
+    own concurrency cap (lower classes are capped below the total, so claims
+    find headroom even though running calls cannot be preempted) and an
+    optional queue-depth cap. The lowest class is shed outright while claims
+    are waiting. Thread-safe: async callers (on any event loop) and blocking
+    callers (Streamlit script threads) share the same slots.
+    """
+    
+    CLAIM = 'claim'
+    PURCHASE = 'purchase'
+    BROWSING = 'browsing'
+    CLASSES = (CLAIM, PURCHASE, BROWSING)  # Highest priority first
+    
+    def __init__(self, capacity: int = 16, class_limits: Dict[str, int] = None,
+                 queue_limits: Dict[str, Optional[int]] = None):
+        self.capacity = capacity
+        self.class_limits = {cls: capacity for cls in self.CLASSES}
+        self.class_limits.update(class_limits or {})
+        self.queue_limits = {cls: None for cls in self.CLASSES}
+        self.queue_limits.update(queue_limits or {})
+        
+        self._lock = threading.Lock()
+        self._active = {cls: 0 for cls in self.CLASSES}
+        self._waiters = {cls: deque() for cls in self.CLASSES}
+        
+        self.admitted = {cls: 0 for cls in self.CLASSES}
+        self.queued = {cls: 0 for cls in self.CLASSES}
+        self.shed = {cls: 0 for cls in self.CLASSES}
+    
+    def _has_slot(self, cls: str) -> bool:
+        return sum(self._active.values()) < self.capacity and self._active[cls] < self.class_limits[cls]
+    
+    def _grant(self, cls: str):
+        self._active[cls] += 1
+        self.admitted[cls] += 1
+    
+    def _enqueue(self, cls: str, waiter: _SlotWaiter) -> bool:
+        """Take a free slot (False) or queue the waiter (True); raises LoadShedError"""
+        if cls not in self.CLASSES:
+            raise ValueError(f"Unknown priority class: {cls}")
+        
+        with self._lock:
+            waiters = self._waiters[cls]
+            if not waiters and self._has_slot(cls):
+                self._grant(cls)
+                return False
+            
+            limit = self.queue_limits[cls]
+            if cls == self.CLASSES[-1] and self._waiters[self.CLAIM]:
+                reason = "claims are waiting"
+            elif limit is not None and len(waiters) >= limit:
+                reason = f"queue depth {limit} reached"
+            else:
+                waiters.append(waiter)
+                self.queued[cls] += 1
+                return True
+            self.shed[cls] += 1
+        raise LoadShedError(f"{cls} request shed: {reason}")
+    
+    def _withdraw(self, cls: str, waiter: _SlotWaiter) -> bool:
+        """Dequeue a waiter that gave up; True if it was granted a slot in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters[cls].remove(waiter)
+            return False
+    
+    async def acquire(self, cls: str):
+        """Wait for a slot for this class, or raise LoadShedError"""
+        waiter = _SlotWaiter(asyncio.get_running_loop())
+        if not self._enqueue(cls, waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if self._withdraw(cls, waiter):
+                self.release(cls)  # Granted just as the caller gave up
+            raise
+    
+    def acquire_blocking(self, cls: str, timeout: float = None):
+        """Block the calling thread until a slot is free; raises LoadShedError (also after `timeout` seconds)"""
+        waiter = _SlotWaiter()
+        if not self._enqueue(cls, waiter) or waiter.event.wait(timeout):
+            return
+        if self._withdraw(cls, waiter):
+            return  # Granted just as the wait timed out
+        with self._lock:
+            self.shed[cls] += 1
+        raise LoadShedError(f"{cls} request shed: no slot within {timeout}s")
+    
+    def release(self, cls: str):
+        """Free a slot and hand it to the highest-priority waiter"""
+        woken = []
+        with self._lock:
+            self._active[cls] -= 1
+            for waiting_cls in self.CLASSES:
+                waiters = self._waiters[waiting_cls]
+                while waiters and self._has_slot(waiting_cls):
+                    waiter = waiters.popleft()
+                    waiter.granted = True
+                    self._grant(waiting_cls)
+                    woken.append((waiting_cls, waiter))
+                if waiters and sum(self._active.values()) >= self.capacity:
+                    break  # No free slot left; lower classes keep waiting
+        
+        for waiting_cls, waiter in woken:
+            try:
+                waiter.wake()
+            except RuntimeError:
+                self.release(waiting_cls)  # Its event loop has closed
+    
+    @asynccontextmanager
+    async def slot(self, cls: str):
+        await self.acquire(cls)
+        try:
+            yield
+        finally:
+            self.release(cls)
+    
+    @contextmanager
+    def blocking_slot(self, cls: str, timeout: float = None):
+        self.acquire_blocking(cls, timeout)
+        try:
+            yield
+        finally:
+            self.release(cls)
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-class active, waiting, admitted, queued and shed counts"""
+        with self._lock:
+            return {
+                cls: {
+                    'active': self._active[cls],
+                    'waiting': len(self._waiters[cls]),
+                    'admitted': self.admitted[cls],
+                    'queued': self.queued[cls],
+                    'shed': self.shed[cls]
+                }
+                for cls in self.CLASSES
+            }
+
+
+class ScheduledBackend(LLMBackend):
+    """Backend wrapper that holds a PriorityScheduler slot of one class for every call
+    
+    Used for the synchronous and streaming turns (the Streamlit UI), which
+    don't go through AsyncLLMClient. A stream holds its slot until it ends or
+    is closed. A blocking caller waits at most `queue_timeout` seconds.
+    """
+    
+    def __init__(self, backend: LLMBackend, scheduler: PriorityScheduler, priority: str,
+                 queue_timeout: float = None):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.priority = priority
+        self.queue_timeout = queue_timeout
+        self.name = backend.name
+    
+    def generate(self, prompt: str) -> str:
+        with self.scheduler.blocking_slot(self.priority, self.queue_timeout):
+            return self.backend.generate(prompt)
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        with self.scheduler.blocking_slot(self.priority, self.queue_timeout):
+            yield from self.backend.stream(prompt)
+    
+    async def generate_async(self, prompt: str) -> str:
+        async with self.scheduler.slot(self.priority):
+            return await self.backend.generate_async(prompt)
+
+
+class AsyncLLMClient:
+    """Async Gemini caller with priority scheduling, per-call deadlines and jittered retries
+    
+    Works with any LLMBackend, so it can be driven by the offline StubBackend.
+    Concurrency is shared between priority classes by a PriorityScheduler.
+    """
+    
+    # Upstream errors worth retrying (rate limits, overload, transient failures)
+    RETRYABLE_ERRORS = (
+        asyncio.TimeoutError,
+        ConnectionError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+    
+    def __init__(self, max_concurrency: int = 16, timeout: float = 20.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 class_shares: Dict[str, float] = None, queue_limits: Dict[str, Optional[int]] = None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.scheduler = PriorityScheduler(
+            capacity=max_concurrency,
+            class_limits={cls: max(1, int(max_concurrency * share)) for cls, share in (class_shares or {}).items()},
+            queue_limits=queue_limits
+        )
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _remaining(self, started: float, deadline: float) -> float:
+        """Seconds left before the overall deadline (raises once it has passed)"""
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            raise asyncio.TimeoutError(f"LLM deadline of {deadline}s exceeded")
+        return remaining
+    
+    async def generate(self, backend: LLMBackend, prompt: str, deadline: float = None,
+                       priority: str = PriorityScheduler.PURCHASE) -> str:
+        """Generate text, retrying retryable errors until max_retries or the overall deadline (seconds)
+        
+        Time spent queued for a slot counts against the deadline. LoadShedError
+        is not retried.
+        """
+        started = time.monotonic()
+        
+        for attempt in range(self.max_retries + 1):
+            if deadline is None:
+                await self.scheduler.acquire(priority)
+            else:
+                await asyncio.wait_for(self.scheduler.acquire(priority), self._remaining(started, deadline))
+            
+            try:
+                timeout = self.timeout
+                if deadline is not None:
+                    timeout = min(timeout, self._remaining(started, deadline))
+                return await asyncio.wait_for(backend.generate_async(prompt), timeout)
+            except self.RETRYABLE_ERRORS:
+                if attempt == self.max_retries or (deadline is not None and time.monotonic() - started >= deadline):
+                    raise
+            finally:
+                self.scheduler.release(priority)
+            
+            # Back off without holding a slot
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+
+@st.cache_resource(show_spinner=False)
+def get_async_llm_client() -> AsyncLLMClient:
+    """Process-wide async client, so the concurrency limit applies across all agents"""
+    return AsyncLLMClient(
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        timeout=config.LLM_TIMEOUT_SECONDS,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=config.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=config.LLM_BACKOFF_MAX_SECONDS,
+        class_shares=config.LLM_PRIORITY_SHARE,
+        queue_limits=config.LLM_PRIORITY_QUEUE_DEPTH
+    )
+
+
+class ResponseCache:
+    """LRU + TTL cache of generated answers keyed by (normalized query, segment, tone, phase)
+    
+    Optionally also serves a cached answer whose query embedding is at least
+    `similarity_threshold` cosine-similar within the same key context. Shared
+    entries must come from prompts that depend only on the key: the agent
+    builds them without the customer's name, age, history or memory. Answers
+    personalized from customer data are either skipped (`exclude_personalized`)
+    or cached in a scope keyed by the profile's `customer_id`, so they are never
+    served to someone else; without a customer id they are not cached.
+    Answers built from conversation memory are never cached (callers skip them).
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600,
+                 similarity_threshold: float = None, exclude_personalized: bool = False):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.exclude_personalized = exclude_personalized
+        self.embedding_model = SimpleEmbedding()
+        
+        # (context, query) -> (response, expires_at); context -> {query: embedding}
+        self._entries = OrderedDict()
+        self._embeddings = {}
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r'\s+', ' ', query.lower()).strip().rstrip('?!.…').strip()
+    
+    def make_context(self, profile: Dict, phase: str, personalized: bool = False) -> Optional[tuple]:
+        """Key context; personalized answers are scoped to the customer (None: not cacheable)"""
+        scope = None
+        if personalized:
+            scope = profile.get('customer_id')
+            if self.exclude_personalized or scope is None:
+                return None
+        return (profile['segment'], profile['tone'], phase, scope)
+    
+    def _embed(self, query: str) -> np.ndarray:
+        return KnowledgeBase._normalize(self.embedding_model.embed_batch([query]))[0]
+    
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        context, query = key
+        bucket = self._embeddings.get(context)
+        if bucket is not None:
+            bucket.pop(query, None)
+            if not bucket:
+                del self._embeddings[context]
+    
+    def get(self, query: str, profile: Dict, phase: str, personalized: bool = False) -> Optional[str]:
+        """Return a cached answer or None"""
+        context = self.make_context(profile, phase, personalized)
+        if context is None:
+            return None
+        normalized = self.normalize_query(query)
+        now = time.monotonic()
+        
+        with self._lock:
+            key = (context, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+                entry = None
+            
+            # Nearest cached query in the same context
+            if entry is None and self.similarity_threshold is not None and self._embeddings.get(context):
+                bucket = self._embeddings[context]
+                queries = list(bucket)
+                scores = np.stack([bucket[q] for q in queries]) @ self._embed(normalized)
+                best = int(np.argmax(scores))
+                candidate = (context, queries[best])
+                if scores[best] >= self.similarity_threshold and self._entries[candidate][1] > now:
+                    key, entry = candidate, self._entries[candidate]
+                    self.semantic_hits += 1
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, query: str, response: str, profile: Dict, phase: str, personalized: bool = False):
+        """Cache an answer (unless it is personalized and cannot be scoped to the customer)"""
+        context = self.make_context(profile, phase, personalized)
+        if context is None:
+            self.skipped += 1
+            return
+        normalized = self.normalize_query(query)
+        embedding = self._embed(normalized) if self.similarity_threshold is not None else None
+        
+        with self._lock:
+            key = (context, normalized)
+            self._entries[key] = (response, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            if embedding is not None:
+                self._embeddings.setdefault(context, {})[normalized] = embedding
+            
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'skipped_personalized': self.skipped,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache shared by all agents"""
+    return ResponseCache(
+        max_size=config.RESPONSE_CACHE_SIZE,
+        ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold=config.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        exclude_personalized=config.RESPONSE_CACHE_EXCLUDE_PERSONALIZED
+    )
+
+
+class LatencyTracker:
+    """In-process latency histograms per pipeline stage
+    
+    Keeps cumulative Prometheus-style buckets plus a bounded window of recent
+    samples for p50/p95/p99, exportable as JSON or Prometheus text.
+    """
+    
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+    METRIC_NAME = 'tet_agent_stage_latency_seconds'
+    
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for a stage"""
+        with self._lock:
+            data = self._stages.get(stage)
+            if data is None:
+                data = self._stages[stage] = {
+                    'samples': deque(maxlen=self.max_samples),
+                    'buckets': [0] * len(self.BUCKETS),
+                    'count': 0,
+                    'sum': 0.0
+                }
+            data['samples'].append(seconds)
+            data['count'] += 1
+            data['sum'] += seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    data['buckets'][i] += 1
+    
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as one observation of `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean and p50/p95/p99/max (seconds, over the recent window) per stage"""
+        with self._lock:
+            stages = {stage: (list(data['samples']), data['count'], data['sum']) for stage, data in self._stages.items()}
+        
+        snapshot = {}
+        for stage, (samples, count, total) in sorted(stages.items()):
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            snapshot[stage] = {
+                'count': count,
+                'mean': total / count,
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+                'max': max(samples)
+            }
+        return snapshot
+    
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+    
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (histogram per stage)"""
+        lines = [
+            f"# HELP {self.METRIC_NAME} Latency of TetInsuranceAgent pipeline stages.",
+            f"# TYPE {self.METRIC_NAME} histogram"
+        ]
+        with self._lock:
+            for stage, data in sorted(self._stages.items()):
+                for bound, count in zip(self.BUCKETS, data['buckets']):
+                    lines.append(f'{self.METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{self.METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {data["count"]}')
+                lines.append(f'{self.METRIC_NAME}_sum{{stage="{stage}"}} {data["sum"]}')
+                lines.append(f'{self.METRIC_NAME}_count{{stage="{stage}"}} {data["count"]}')
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def get_latency_tracker() -> LatencyTracker:
+    """Process-wide latency histograms"""
+    return LatencyTracker()
+
+
+def timed_stage(stage: str):
+    """Method decorator recording the call duration under `stage` (sync or async)"""
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                with self._span(stage):
+                    return await method(self, *args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._span(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Intents used for routing, request priority and memory, compiled into one matcher
+INTENT_MATCHER = IntentMatcher({
+    'claim': rule_based.CLAIM_KEYWORDS,
+    'accident_product': rule_based.ACCIDENT_PRODUCT_KEYWORDS,
+    'travel': rule_based.TRAVEL_KEYWORDS,
+    'pricing': rule_based.PRICE_KEYWORDS,
+    'purchase': ["mua", "buy", "thanh toán", "pay", "đăng ký"],
+    'bundle': rule_based.BUNDLE_KEYWORDS,
+    'agreement': rule_based.AGREE_KEYWORDS,
+    'objection': ["no", "không", "expensive", "đắt"]
+})
+
+# Intents that make a claim word part of a product question rather than a claim.
+# Purchase and pricing words don't: "muốn đăng ký bồi thường", "how much will the claim pay?"
+NOT_A_CLAIM_INTENTS = frozenset({'accident_product'})
+
+
+def is_claim(intents: FrozenSet[str]) -> bool:
+    """Claim intake, unless the claim word names the accident insurance product"""
+    return 'claim' in intents and not intents & NOT_A_CLAIM_INTENTS
+
+
+class HybridRouter:
+    """Cheap intent router in front of Gemini
+    
+    Deterministic intents (claim intake, travel quick quote with a known
+    destination and a quotable trip length, "which package?" questions
+    answered with the optimal bundle) are answered locally by the rule-based
+    agent; everything else goes to the LLM. Per-route counters are kept for
+    monitoring.
+    """
+    
+    ROUTE_CLAIM = 'claim'
+    ROUTE_QUICK_QUOTE = 'quick_quote'
+    ROUTE_BUNDLE = 'bundle'
+    ROUTE_LLM = 'llm'
+    
+    def __init__(self, enable_claims: bool = True, enable_quick_quote: bool = True, enable_bundles: bool = True):
+        self.enable_claims = enable_claims
+        self.enable_quick_quote = enable_quick_quote
+        self.enable_bundles = enable_bundles
+        self.counters = {self.ROUTE_CLAIM: 0, self.ROUTE_QUICK_QUOTE: 0, self.ROUTE_BUNDLE: 0, self.ROUTE_LLM: 0}
+        self._lock = threading.Lock()
+    
+    def classify(self, user_message: str) -> tuple:
+        """Return (route, destination, trip days) for a message"""
+        intents = INTENT_MATCHER.intents(user_message)
+        
+        if self.enable_claims and is_claim(intents):
+            return self.ROUTE_CLAIM, None, None
+        
+        if self.enable_quick_quote and 'travel' in intents:
+            destination = rule_based.find_destination(user_message)
+            days = rule_based.find_duration(user_message) or rule_based.QUICK_QUOTE_DAYS
+            # Trips longer than the price tables cover are left to the LLM
+            if destination and 1 <= days <= config.MAX_TRIP_DAYS:
+                return self.ROUTE_QUICK_QUOTE, destination, days
+        
+        if self.enable_bundles and 'bundle' in intents:
+            return self.ROUTE_BUNDLE, None, None
+        
+        return self.ROUTE_LLM, None, None
+    
+    def route(self, rule_agent: 'rule_based.TetInsuranceAgent', user_message: str) -> Optional[str]:
+        """Answer locally when the intent is deterministic; None means use the LLM"""
+        route, destination, days = self.classify(user_message)
+        
+        with self._lock:
+            self.counters[route] += 1
+        
+        if route == self.ROUTE_CLAIM:
+            return rule_agent.handle_claim_request()
+        if route == self.ROUTE_QUICK_QUOTE:
+            return rule_agent.generate_quick_quote(destination, days)
+        if route == self.ROUTE_BUNDLE:
+            return rule_agent.generate_bundle_recommendation(rule_based.find_budget(user_message))
+        return None
+    
+    def stats(self) -> Dict[str, int]:
+        """Per-route counters"""
+        return dict(self.counters)
+
+
+@st.cache_resource(show_spinner=False)
+def get_router() -> HybridRouter:
+    """Process-wide router (shared counters)"""
+    return HybridRouter(
+        enable_claims=config.ENABLE_CLAIM_SUPPORT,
+        enable_quick_quote=config.ENABLE_QUICK_QUOTE,
+        enable_bundles=config.ENABLE_BUNDLE_OFFERS
+    )
+
+
+class APIKeyValidator:
+    """Process-wide cache of Gemini API key checks, keyed by key hash with a TTL
+    
+    In "metadata" mode a key is checked with a free model lookup instead of a
+    billable generate_content call. In "lazy" mode nothing is called up front;
+    agents report the outcome of the first real request through record().
+    Transient failures (network, 5xx) leave a key unverified rather than invalid;
+    that result is cached for `retry_seconds`, so reruns don't repeat a
+    lookup that just failed, and each lookup gives up after `timeout_seconds`.
+    """
+    
+    MODE_METADATA = "metadata"
+    MODE_LAZY = "lazy"
+    
+    # Errors that mean the key itself is bad (InvalidArgument only with reason API_KEY_INVALID)
+    AUTH_ERRORS = (
+        google_exceptions.Unauthenticated,
+        google_exceptions.PermissionDenied,
+    )
+    INVALID_KEY_REASON = "API_KEY_INVALID"
+    
+    # Errors caused by the request rather than upstream health (not counted by the circuit breaker)
+    CALLER_ERRORS = AUTH_ERRORS + (google_exceptions.InvalidArgument,)
+    
+    def __init__(self, mode: str = "metadata", ttl_seconds: float = 3600, model_name: str = 'gemini-2.5-flash',
+                 retry_seconds: float = 60, timeout_seconds: float = 5):
+        if mode not in (self.MODE_METADATA, self.MODE_LAZY):
+            raise ValueError(f"Unknown API key validation mode: {mode}")
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds
+        self.model_name = model_name
+        self.retry_seconds = retry_seconds
+        self.timeout_seconds = timeout_seconds
+        self._results = {}  # key hash -> (valid, error, checked_at)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.checks = 0
+    
+    @classmethod
+    def is_invalid_key(cls, error: Exception) -> bool:
+        """Whether an error rejects the API key (any other InvalidArgument is a bad request)"""
+        if isinstance(error, cls.AUTH_ERRORS):
+            return True
+        return isinstance(error, google_exceptions.InvalidArgument) and (
+            error.reason == cls.INVALID_KEY_REASON or cls.INVALID_KEY_REASON in str(error)
+        )
+    
+    @staticmethod
+    def key_hash(api_key: str) -> str:
+        """Short SHA-256 digest; the raw API key is never stored"""
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    
+    def _cached(self, key_hash: str):
+        with self._lock:
+            self.lookups += 1
+            result = self._results.get(key_hash)
+            ttl = self.retry_seconds if result is not None and result[0] is None else self.ttl_seconds
+            if result is not None and time.time() - result[2] > ttl:
+                del self._results[key_hash]
+                result = None
+        return result
+    
+    def record(self, key_hash: str, valid: Optional[bool], error: str = None):
+        """Store the outcome of a check or of a real request made with this key"""
+        with self._lock:
+            self._results[key_hash] = (valid, error, time.time())
+    
+    def is_known_valid(self, key_hash: str) -> bool:
+        result = self._cached(key_hash)
+        return result is not None and result[0]
+    
+    def check(self, api_key: str) -> tuple:
+        """(valid, error): valid is True/False, or None while the key is unverified"""
+        key_hash = self.key_hash(api_key)
+        cached = self._cached(key_hash)
+        if cached is not None:
+            return cached[0], cached[1]
+        
+        if self.mode == self.MODE_LAZY:
+            return None, None
+        
+        self.checks += 1
+        try:
+            # A client of its own: genai.configure would change the key of every other session
+            client = glm.ModelServiceClient(client_options={'api_key': api_key})
+            genai.get_model(f"models/{self.model_name}", client=client,
+                            request_options={'timeout': self.timeout_seconds, 'retry': None})
+        except Exception as e:
+            if self.is_invalid_key(e):
+                self.record(key_hash, False, str(e))
+                return False, str(e)
+            # Could not reach the API; defer to the first real request, and don't retry on every rerun
+            self.record(key_hash, None, str(e))
+            return None, str(e)
+        
+        self.record(key_hash, True)
+        return True, None
+    
+    def stats(self) -> Dict[str, int]:
+        """Cached results and lookup/check counters"""
+        return {'size': len(self._results), 'lookups': self.lookups, 'checks': self.checks}
+
+
+@st.cache_resource(show_spinner=False)
+def get_key_validator() -> APIKeyValidator:
+    """Process-wide API key validator shared by all Streamlit sessions"""
+    return APIKeyValidator(
+        mode=config.API_KEY_VALIDATION,
+        ttl_seconds=config.API_KEY_VALIDATION_TTL_SECONDS,
+        model_name=config.GEMINI_MODEL,
+        retry_seconds=config.API_KEY_VALIDATION_RETRY_SECONDS,
+        timeout_seconds=config.API_KEY_VALIDATION_TIMEOUT_SECONDS
+    )
+
+
+class SystemPromptRegistry:
+    """Precompiled system prompts keyed by (tone, phase, segment, discount)
+    
+    Every variant starts with the same STATIC_PREFIX, byte for byte, and only
+    the trailing CURRENT SITUATION block differs, so provider-side prefix
+    caching can reuse the bulk of the prompt. Variants are built once and
+    returned as the same string object afterwards.
+    """
+    
+    STATIC_PREFIX = """You are an AI insurance agent for a Vietnamese insurance company, specializing in Tet (Lunar New Year) season.
+
+ROLE & PERSONALITY:
+- Friendly, helpful, and culturally aware Vietnamese insurance advisor
+- Adapt to the communication tone given under CURRENT SITUATION
+- Use appropriate Vietnamese greetings and expressions
+- Be empathetic and understanding of customer needs
+- Focus on family protection and Tet traditions
+
+OBJECTIVES:
+1. Understand customer needs through natural conversation
+2. Provide personalized insurance recommendations based on their profile and history
+3. Be proactive about Tet-related risks and opportunities
+4. Handle inquiries about pricing, coverage, and claims
+5. Create urgency during peak periods while being respectful
+
+GUIDELINES:
+- Always reference customer's historical data when relevant
+- Mention specific Tet plans and adapt recommendations accordingly
+- Use Vietnamese language naturally (mix with English for technical terms if needed)
+- Be concise but warm in responses
+- Focus on value and protection, not just selling
+- Address concerns with empathy
+- For claims, prioritize safety first, then process
+
+IMPORTANT CULTURAL NOTES:
+- Tet is about family, reunion, and fresh starts
+- Insurance is increasingly seen as showing care for loved ones
+- Lucky numbers (8, 9) and avoiding unlucky (4) matters to some customers
+- Gifting insurance during Tet is becoming popular
+
+Remember: You're not just selling insurance, you're helping families protect what matters most during the most important holiday of the year."""
+    
+    SITUATION_TEMPLATE = """
+
+CURRENT SITUATION:
+- Communication tone: {tone} (adapt accordingly)
+- Tet Phase: {phase}
+- Discount Available: {discount}%
+- Customer Segment: {segment}"""
+    
+    def __init__(self):
+        self._prompts = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, tone: str, phase: str, segment: str, discount: int) -> str:
+        """System prompt for one variant (built on first use)"""
+        key = (tone, phase, segment, discount)
+        prompt = self._prompts.get(key)
+        if prompt is not None:
+            self.hits += 1
+            return prompt
+        
+        with self._lock:
+            self.misses += 1
+            return self._prompts.setdefault(
+                key,
+                self.STATIC_PREFIX + self.SITUATION_TEMPLATE.format(tone=tone, phase=phase, discount=discount, segment=segment)
+            )
+    
+    def precompile(self, variants) -> int:
+        """Build every (tone, phase, segment, discount) variant up front"""
+        for variant in variants:
+            self.get(*variant)
+        return len(self._prompts)
+    
+    def stats(self) -> Dict[str, int]:
+        """Compiled variants and hit/miss counters"""
+        return {'variants': len(self._prompts), 'hits': self.hits, 'misses': self.misses}
+
+
+@st.cache_resource(show_spinner=False)
+def get_system_prompts() -> SystemPromptRegistry:
+    """Process-wide system prompt registry, precompiled for the demo profiles and phases"""
+    registry = SystemPromptRegistry()
+    registry.precompile(
+        (profile['tone'], phase, profile['segment'], discount)
+        for profile in rule_based.CUSTOMER_PROFILES.values()
+        for phase, discount in PHASE_DISCOUNTS.items()
+    )
+    return registry
+
+
+@st.cache_resource(show_spinner=False)
+def get_circuit_breaker() -> CircuitBreaker:
+    """Process-wide breaker for the LLM backend (shared by all agents)"""
+    return CircuitBreaker(
+        window=config.CIRCUIT_BREAKER_WINDOW,
+        min_calls=config.CIRCUIT_BREAKER_MIN_CALLS,
+        error_rate_threshold=config.CIRCUIT_BREAKER_ERROR_RATE,
+        slow_call_seconds=config.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate_threshold=config.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+        open_seconds=config.CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_probes=config.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+        ignored_errors=APIKeyValidator.CALLER_ERRORS
+    )
 
 
 class TetInsuranceAgent:
     """AI Agent with Gemini LLM, knowledge base, and memory"""
     
-    def __init__(self, gemini_api_key: str, customer_profile: Dict, current_phase: str):
+    # Knowledge categories that make an answer specific to this customer ('communication' only
+    # restates the tone, which is part of every cache key)
+    PERSONAL_CATEGORIES = {'purchase_history', 'interaction_history', 'behavior', 'demographics'}
+    
+    def __init__(self, gemini_api_key: str, customer_profile: Dict, current_phase: str,
+                 knowledge_index_path: str = None, async_llm_client: AsyncLLMClient = None,
+                 response_cache: ResponseCache = None, router: HybridRouter = None,
+                 latency_tracker: LatencyTracker = None, llm_backend: LLMBackend = None,
+                 key_validator: APIKeyValidator = None, system_prompts: SystemPromptRegistry = None,
+                 circuit_breaker: CircuitBreaker = None):
         self.profile = customer_profile
         self.phase = current_phase
         
-        # Initialize Gemini
-        genai.configure(api_key=gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Initialize knowledge base and memory
-        self.knowledge_base = KnowledgeBase()
+        # Outcomes of real requests confirm or reject the API key (None disables reporting)
+        self.key_validator = key_validator
+        self.key_hash = APIKeyValidator.key_hash(gemini_api_key) if key_validator is not None else None
+        
+        # Initialize the LLM backend (Gemini unless configured otherwise)
+        if llm_backend is None:
+            backend_options = {'model_name': config.GEMINI_MODEL} if config.LLM_BACKEND == 'gemini' else {}
+            llm_backend = create_backend(config.LLM_BACKEND, gemini_api_key, **backend_options)
+        
+        # Circuit breaker around the backend; while open, turns are answered by the rule-based agent
+        if circuit_breaker is None and config.CIRCUIT_BREAKER_ENABLED:
+            circuit_breaker = get_circuit_breaker()
+        self.circuit_breaker = circuit_breaker
+        self.llm = CircuitBreakerBackend(llm_backend, circuit_breaker) if circuit_breaker is not None else llm_backend
+        self.fallbacks = 0
+        self.async_llm_client = async_llm_client or get_async_llm_client()
+        
+        # Shared answer cache (None disables caching)
+        if response_cache is None and config.RESPONSE_CACHE_ENABLED:
+            response_cache = get_response_cache()
+        self.response_cache = response_cache
+        
+        # Rule-based fast path for deterministic intents (None sends everything to Gemini)
+        if router is None and config.ENABLE_HYBRID_ROUTING:
+            router = get_router()
+        self.router = router
+        self.rule_agent = rule_based.TetInsuranceAgent(customer_profile, current_phase)
+        
+        # Per-stage timing spans (None disables tracking)
+        if latency_tracker is None and config.TRACK_RESPONSE_TIME:
+            latency_tracker = get_latency_tracker()
+        self.latency_tracker = latency_tracker
+        
+        # Initialize knowledge base (shared product segment + per-customer overlay) and memory
+        self.knowledge_base = SegmentedKnowledgeBase(get_shared_knowledge_base(knowledge_index_path))
         self.short_term_memory = ShortTermMemory(max_items=10)
         
+        # Shared precompiled system prompts
+        self.system_prompts = system_prompts or get_system_prompts()
+        
+        # Token budget for the context block; stats of the last assembled context and prompt
+        self.context_assembler = ContextAssembler(config.CONTEXT_TOKEN_BUDGET)
+        self.last_context_stats = None
+        
         # Load customer historical data
         self._load_customer_history()
         
-        # Load insurance product knowledge
+        # Load phase-specific product knowledge
         self._load_product_knowledge()
     
+    def for_session(self, short_term_memory: ShortTermMemory) -> 'TetInsuranceAgent':
+        """Per-session view: shares the backend, knowledge base and rule agent, owns its memory and turn stats"""
+        view = copy.copy(self)
+        view.short_term_memory = short_term_memory
+        view.last_context_stats = None
+        view.fallbacks = 0
+        return view
+    
     def _load_customer_history(self):
         """Load customer historical data into knowledge base"""
         profile = self.profile
@@ -252,86 +1571,16 @@ class TetInsuranceAgent:
         )
     
     def _load_product_knowledge(self):
-        """Load insurance product information into knowledge base"""
-        
-        products = {
-            'travel_domestic': {
-                'name': 'Domestic Travel Insurance',
-                'description': 'Comprehensive coverage for travel within Vietnam. Covers medical emergencies, trip cancellation, lost baggage, and 24/7 assistance.',
-                'price': 150000,
-                'coverage': 50000000,
-                'best_for': 'Weekend trips, Tet travel to hometown, domestic vacations'
-            },
-            'travel_international': {
-                'name': 'International Travel Insurance',
-                'description': 'Full protection for overseas travel. Includes medical coverage up to 100 million VND, emergency evacuation, and trip interruption.',
-                'price': 500000,
-                'coverage': 100000000,
-                'best_for': 'ASEAN travel, long-distance flights, adventure trips'
-            },
-            'motor_extension': {
-                'name': 'Motor Insurance Highway Extension',
-                'description': 'Extends your motor insurance for long-distance travel. Covers highway accidents, passenger protection, and roadside assistance.',
-                'price': 250000,
-                'coverage': 'Extended distance + 3 passengers',
-                'best_for': 'Tet journey home, long road trips, highway travel'
-            },
-            'family_health': {
-                'name': 'Family Health Package',
-                'description': 'Complete health coverage for entire family. Includes annual checkups, hospitalization, outpatient care, and dental.',
-                'price': 3500000,
-                'coverage': 500000000,
-                'best_for': 'Families with children, comprehensive protection, peace of mind'
-            },
-            'accident': {
-                'name': 'Personal Accident Insurance',
-                'description': 'Protection against accidents resulting in injury or death. Covers medical expenses, disability benefits, and death benefits.',
-                'price': 300000,
-                'coverage': 200000000,
-                'best_for': 'Active lifestyle, motorbike riders, additional protection'
-            },
-            'life_savings': {
-                'name': 'Life Insurance with Savings',
-                'description': 'Dual benefit policy combining life protection with savings. Guaranteed returns plus insurance coverage for family.',
-                'price': 5000000,
-                'coverage': '1 billion VND + investment returns',
-                'best_for': 'Long-term planning, wealth building, family security'
-            }
-        }
-        
-        for product_id, product_info in products.items():
-            content = f"{product_info['name']}: {product_info['description']} Price: {product_info['price']:,} VND. Coverage: {product_info['coverage']}. Best for: {product_info['best_for']}"
-            
-            self.knowledge_base.add_document(
-                f'product_{product_id}',
-                content,
-                {'category': 'product', 'product_id': product_id, **product_info}
-            )
-        
-        # Tet-specific knowledge
-        tet_knowledge = {
-            'tet_travel_peak': 'During Tet, traffic accidents increase by 40%. Highway travel is especially risky. Extended motor insurance is crucial.',
-            'tet_family_gathering': 'Tet is time for family reunion. Many people host large gatherings, increasing health risks. Family health packages popular.',
-            'tet_gift_insurance': 'Insurance as Tet gift is becoming popular. Shows care for loved ones. Life insurance and health insurance most gifted.',
-            'tet_budget': 'People receive bonuses before Tet. Good time to invest in insurance. Many willing to spend on protection.',
-            'tet_discount': f'Special Tet promotions available. {self._get_phase_discount()}% discount during {self.phase} phase.'
-        }
-        
-        for knowledge_id, content in tet_knowledge.items():
-            self.knowledge_base.add_document(
-                knowledge_id,
-                content,
-                {'category': 'tet_insights'}
-            )
+        """Load phase-specific insurance knowledge (the static catalog is in the shared segment)"""
+        self.knowledge_base.add_document(
+            'tet_discount',
+            f'Special Tet promotions available. {self._get_phase_discount()}% discount during {self.phase} phase.',
+            {'category': 'tet_insights'}
+        )
     
     def _get_phase_discount(self) -> int:
         """Get discount percentage based on current phase"""
-        if self.phase == "tet-peak":
-            return 30
-        elif self.phase == "pre-tet":
-            return 15
-        else:
-            return 10
+        return PHASE_DISCOUNTS.get(self.phase, PHASE_DISCOUNTS["post-tet"])
     
     def _get_phase_context(self) -> str:
         """Get context about current Tet phase"""
@@ -342,142 +1591,313 @@ class TetInsuranceAgent:
         }
         return phase_contexts.get(self.phase, "")
     
-    def _build_context(self, user_message: str) -> str:
-        """Build context from knowledge base and memory"""
+    def _span(self, stage: str):
+        """Timing span for a pipeline stage (no-op when tracking is off)"""
+        if self.latency_tracker is None:
+            return nullcontext()
+        return self.latency_tracker.span(stage)
+    
+    def _observe(self, stage: str, seconds: float):
+        if self.latency_tracker is not None:
+            self.latency_tracker.observe(stage, seconds)
+    
+    @timed_stage('context.kb_search')
+    def _retrieve(self, user_message: str) -> List[Dict[str, Any]]:
+        """Search knowledge base for relevant information"""
+        return self.knowledge_base.search(user_message, top_k=5)
+    
+    def _record_key_result(self, error: Exception = None):
+        """Report a real LLM call's outcome to the key validator"""
+        if self.key_validator is None:
+            return
+        if error is None:
+            if not self.key_validator.is_known_valid(self.key_hash):
+                self.key_validator.record(self.key_hash, True)
+        elif APIKeyValidator.is_invalid_key(error):
+            self.key_validator.record(self.key_hash, False, str(error))
+    
+    def _fallback_response(self, user_message: str) -> str:
+        """Rule-based answer when the LLM call fails or its circuit is open (memory is updated as for LLM turns)"""
+        self.fallbacks += 1
+        response = self.rule_agent.generate_response(user_message)
+        self._update_memory(user_message, response)
+        return response
+    
+    def _request_priority(self, user_message: str) -> str:
+        """Scheduler class for a turn: claims (or a claim in progress), then purchase flows, then browsing
         
-        # Search knowledge base for relevant information
-        relevant_docs = self.knowledge_base.search(user_message, top_k=5)
+        Purchase is decided by pricing or buying words in this message alone.
+        Agreement words don't count: "có" frames most Vietnamese questions.
+        """
+        intents = INTENT_MATCHER.intents(user_message)
         
-        # Build context string
-        context_parts = []
+        latest_intent = self.short_term_memory.latest('user_intent')
+        if (is_claim(intents)
+                or (latest_intent is not None and latest_intent.metadata and latest_intent.metadata.get('urgent'))):
+            return PriorityScheduler.CLAIM
+        
+        if intents & {'purchase', 'pricing'}:
+            return PriorityScheduler.PURCHASE
+        
+        return PriorityScheduler.BROWSING
+    
+    def _scheduled(self, priority: str) -> LLMBackend:
+        """The backend behind a slot of the shared scheduler (for calls not made through AsyncLLMClient)"""
+        return ScheduledBackend(self.llm, self.async_llm_client.scheduler, priority,
+                                queue_timeout=config.LLM_TIMEOUT_SECONDS)
+    
+    def _cache_personalization(self) -> Optional[bool]:
+        """Cache scope of the last assembled context: None if it includes conversation memory
+        (the answer is not cacheable), else whether it includes this customer's data"""
+        stats = self.last_context_stats
+        if stats is None or stats['memory_lines']:
+            return None
+        return stats['named']
+    
+    def _build_context(self, user_message: str, relevant_docs: List[Dict[str, Any]] = None,
+                       shareable: bool = False) -> str:
+        """Build context from knowledge base and memory
         
-        # Add customer profile context
-        context_parts.append(f"CUSTOMER PROFILE: {self.profile['name']}, {self.profile['age']} years old, {self.profile['segment']}")
+        With `shareable`, the profile line leaves out the customer's name and
+        age unless customer history or conversation memory reaches the context
+        anyway, so the same question gets the same prompt for every customer
+        of a segment, tone and phase.
+        """
         
-        # Add phase context
-        context_parts.append(f"TET PHASE: {self._get_phase_context()}")
+        # Search knowledge base for relevant information
+        if relevant_docs is None:
+            relevant_docs = self._retrieve(user_message)
         
-        # Add relevant knowledge
-        if relevant_docs:
-            context_parts.append("RELEVANT CUSTOMER HISTORY & KNOWLEDGE:")
-            for doc in relevant_docs:
-                if doc['similarity_score'] > 0.1:  # Only include relevant matches
-                    context_parts.append(f"- {doc['content']}")
+        # Only include relevant matches
+        knowledge_docs = [doc for doc in relevant_docs or [] if doc['similarity_score'] > 0.1]
+        knowledge_lines = [f"- {doc['content']}" for doc in knowledge_docs]
         
         # Add short-term memory
-        recent_memory = self.short_term_memory.get_recent(5)
-        if recent_memory:
-            context_parts.append("RECENT CONVERSATION:")
-            for memory in recent_memory:
-                context_parts.append(f"- {memory['type']}: {memory['content']}")
-        
-        return "\n".join(context_parts)
+        with self._span('context.memory'):
+            recent_memory = self.short_term_memory.get_recent(5)
+            memory_lines = [f"- {memory.type}: {memory.content}" for memory in reversed(recent_memory)]
+        
+        def assemble(named: bool) -> Dict[str, Any]:
+            # Sections in priority order: profile, phase, knowledge (best match first), memory (newest first)
+            profile = self.profile
+            customer = f"{profile['name']}, {profile['age']} years old, {profile['segment']}" if named else profile['segment']
+            return self.context_assembler.assemble([
+                (None, [f"CUSTOMER PROFILE: {customer}", f"TET PHASE: {self._get_phase_context()}"]),
+                ("RELEVANT CUSTOMER HISTORY & KNOWLEDGE:", knowledge_lines),
+                ("RECENT CONVERSATION (newest first):", memory_lines)
+            ])
+        
+        # What reached the context decides how the answer may be cached
+        def personal_lines(context: Dict[str, Any]) -> Tuple[int, int]:
+            _, knowledge_kept, memory_kept = context['section_lines']
+            personal_docs = sum(
+                doc['metadata'].get('category') in self.PERSONAL_CATEGORIES for doc in knowledge_docs[:knowledge_kept]
+            )
+            return personal_docs, memory_kept
+        
+        named = not shareable
+        context = assemble(named)
+        personal_docs, memory_kept = personal_lines(context)
+        if not named and (personal_docs or memory_kept):
+            # Customer-specific anyway: name the customer
+            named = True
+            context = assemble(named)
+            personal_docs, memory_kept = personal_lines(context)
+        
+        self.last_context_stats = {k: v for k, v in context.items() if k != 'text'}
+        self.last_context_stats.update(named=named, personal_docs=personal_docs, memory_lines=memory_kept)
+        return context['text']
     
+    @timed_stage('system_prompt')
     def _create_system_prompt(self) -> str:
-        """Create system prompt for Gemini"""
-        
-        prompt = f"""You are an AI insurance agent for a Vietnamese insurance company, specializing in Tet (Lunar New Year) season.
-
-ROLE & PERSONALITY:
-- Friendly, helpful, and culturally aware Vietnamese insurance advisor
-- Communication tone: {self.profile['tone']} (adapt accordingly)
-- Use appropriate Vietnamese greetings and expressions
-- Be empathetic and understanding of customer needs
-- Focus on family protection and Tet traditions
-
-CURRENT SITUATION:
-- Tet Phase: {self.phase}
-- Discount Available: {self._get_phase_discount()}%
-- Customer Segment: {self.profile['segment']}
-
-OBJECTIVES:
-1. Understand customer needs through natural conversation
-2. Provide personalized insurance recommendations based on their profile and history
-3. Be proactive about Tet-related risks and opportunities
-4. Handle inquiries about pricing, coverage, and claims
-5. Create urgency during peak periods while being respectful
-
-GUIDELINES:
-- Always reference customer's historical data when relevant
-- Mention specific Tet plans and adapt recommendations accordingly
-- Use Vietnamese language naturally (mix with English for technical terms if needed)
-- Be concise but warm in responses
-- Focus on value and protection, not just selling
-- Address concerns with empathy
-- For claims, prioritize safety first, then process
-
-IMPORTANT CULTURAL NOTES:
-- Tet is about family, reunion, and fresh starts
-- Insurance is increasingly seen as showing care for loved ones
-- Lucky numbers (8, 9) and avoiding unlucky (4) matters to some customers
-- Gifting insurance during Tet is becoming popular
-
-Remember: You're not just selling insurance, you're helping families protect what matters most during the most important holiday of the year."""
-
-        return prompt
+        """System prompt for Gemini (shared, precompiled variant)"""
+        return self.system_prompts.get(self.profile['tone'], self.phase, self.profile['segment'], self._get_phase_discount())
     
-    def generate_response(self, user_message: str) -> str:
-        """Generate response using Gemini with context"""
+    def _build_prompt(self, user_message: str, relevant_docs: List[Dict[str, Any]] = None) -> str:
+        """Build the full Gemini prompt for a user turn"""
         
         # Build context from knowledge base and memory
-        context = self._build_context(user_message)
+        context = self._build_context(user_message, relevant_docs, shareable=True)
         
         # Create full prompt
         system_prompt = self._create_system_prompt()
         
-        full_prompt = f"""{system_prompt}
+        prompt = f"""{system_prompt}
 
 {context}
 
 USER MESSAGE: {user_message}
 
 Provide a helpful, natural response. Be specific and reference the customer's context when relevant. Keep response concise (2-4 sentences for simple queries, longer for complex ones)."""
-
+        self.last_context_stats['prompt_tokens'] = ContextAssembler.estimate_tokens(prompt)
+        return prompt
+    
+    def _route_locally(self, user_message: str) -> Optional[str]:
+        """Rule-based answer for deterministic intents (memory is updated as for LLM turns)"""
+        if self.router is None:
+            return None
+        
+        response = self.router.route(self.rule_agent, user_message)
+        if response is not None:
+            self._update_memory(user_message, response)
+        return response
+    
+    def _get_cached_response(self, user_message: str) -> Optional[str]:
+        """Cached answer for the prompt just built, if its context is cacheable"""
+        personalized = self._cache_personalization()
+        if self.response_cache is None or personalized is None:
+            return None
+        return self.response_cache.get(user_message, self.profile, self.phase, personalized)
+    
+    def _cache_response(self, user_message: str, response: str):
+        personalized = self._cache_personalization()
+        if self.response_cache is not None and personalized is not None:
+            self.response_cache.put(user_message, response, self.profile, self.phase, personalized)
+    
+    @timed_stage('turn')
+    def generate_response(self, user_message: str) -> str:
+        """Generate response using Gemini with context"""
+        
+        local_response = self._route_locally(user_message)
+        if local_response is not None:
+            return local_response
+        
+        relevant_docs = self._retrieve(user_message)
+        full_prompt = self._build_prompt(user_message, relevant_docs)
+        
+        cached = self._get_cached_response(user_message)
+        if cached is not None:
+            self._update_memory(user_message, cached)
+            return cached
+        
         try:
             # Generate response using Gemini
-            response = self.model.generate_content(full_prompt)
-            
-            generated_text = response.text
+            with self._span('llm'):
+                generated_text = self._scheduled(self._request_priority(user_message)).generate(full_prompt)
+            self._record_key_result()
             
             # Update short-term memory
             self._update_memory(user_message, generated_text)
+            self._cache_response(user_message, generated_text)
             
             return generated_text
             
         except Exception as e:
-            return f"Xin lỗi, tôi gặp chút vấn đề kỹ thuật. Bạn có thể thử lại không? (Error: {str(e)})"
+            self._record_key_result(e)
+            return self._fallback_response(user_message)
+    
+    @timed_stage('turn')
+    async def generate_response_async(self, user_message: str, deadline: float = None) -> str:
+        """Async generate_response through the shared AsyncLLMClient (limits, deadlines, retries)"""
+        
+        local_response = self._route_locally(user_message)
+        if local_response is not None:
+            return local_response
+        
+        relevant_docs = self._retrieve(user_message)
+        full_prompt = self._build_prompt(user_message, relevant_docs)
+        
+        cached = self._get_cached_response(user_message)
+        if cached is not None:
+            self._update_memory(user_message, cached)
+            return cached
+        
+        try:
+            with self._span('llm'):
+                generated_text = await self.async_llm_client.generate(
+                    self.llm, full_prompt, deadline=deadline, priority=self._request_priority(user_message)
+                )
+        except Exception as e:
+            self._record_key_result(e)
+            return self._fallback_response(user_message)
+        self._record_key_result()
+        
+        # Update short-term memory
+        self._update_memory(user_message, generated_text)
+        self._cache_response(user_message, generated_text)
+        
+        return generated_text
+    
+    def generate_response_stream(self, user_message: str) -> Iterator[str]:
+        """Stream the Gemini response chunk by chunk; memory is updated once the stream completes"""
+        
+        started = time.perf_counter()
+        try:
+            yield from self._stream_turn(user_message, started)
+        finally:
+            self._observe('turn', time.perf_counter() - started)
     
+    def _stream_turn(self, user_message: str, started: float) -> Iterator[str]:
+        local_response = self._route_locally(user_message)
+        if local_response is not None:
+            yield local_response
+            return
+        
+        relevant_docs = self._retrieve(user_message)
+        full_prompt = self._build_prompt(user_message, relevant_docs)
+        
+        cached = self._get_cached_response(user_message)
+        if cached is not None:
+            self._update_memory(user_message, cached)
+            yield cached
+            return
+        
+        chunks = []
+        llm_started = time.perf_counter()
+        try:
+            for chunk in self._scheduled(self._request_priority(user_message)).stream(full_prompt):
+                if not chunks:
+                    self._observe('llm.first_chunk', time.perf_counter() - llm_started)
+                    self._observe('turn.first_chunk', time.perf_counter() - started)
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            self._record_key_result(e)
+            yield ("\n\n" if chunks else "") + self._fallback_response(user_message)
+            return
+        finally:
+            self._observe('llm', time.perf_counter() - llm_started)
+        
+        self._record_key_result()
+        
+        # Update short-term memory with the complete response
+        generated_text = "".join(chunks)
+        self._update_memory(user_message, generated_text)
+        self._cache_response(user_message, generated_text)
+    
+    @timed_stage('update_memory')
     def _update_memory(self, user_message: str, agent_response: str):
         """Update short-term memory based on conversation"""
         
-        user_lower = user_message.lower()
+        intents = INTENT_MATCHER.intents(user_message)
         
         # Detect user intent and store in memory
-        if any(word in user_lower for word in ['giá', 'price', 'bao nhiêu', 'cost']):
+        if 'pricing' in intents:
             self.short_term_memory.add('user_intent', 'Asking about pricing', {'query': user_message})
         
-        if any(word in user_lower for word in ['du lịch', 'travel', 'đi']):
+        if 'travel' in intents:
             self.short_term_memory.add('user_intent', 'Interested in travel insurance', {'query': user_message})
         
-        if any(word in user_lower for word in ['tai nạn', 'accident', 'claim']):
+        if is_claim(intents):
             self.short_term_memory.add('user_intent', 'Needs claim support', {'query': user_message, 'urgent': True})
         
-        if any(word in user_lower for word in ['yes', 'có', 'ok', 'được', 'đồng ý']):
+        if 'agreement' in intents:
             self.short_term_memory.add('decision', 'Customer showing interest/agreement', {'response': user_message})
         
-        if any(word in user_lower for word in ['no', 'không', 'expensive', 'đắt']):
+        if 'objection' in intents:
             self.short_term_memory.add('concern', 'Customer has concerns or objections', {'response': user_message})
         
         # Store general conversation context
         self.short_term_memory.add('conversation', f"User: {user_message} | Agent: {agent_response[:100]}...")
     
-    def get_proactive_message(self) -> str:
-        """Generate proactive outreach message"""
+    def _build_proactive_prompt(self, platform: str = None) -> str:
+        """Build the Gemini prompt for a proactive outreach message (optionally for one messaging platform)"""
         
         context = self._build_context("generate proactive Tet greeting and recommendation")
         system_prompt = self._create_system_prompt()
+        channel = f"\n- It will be sent as a {platform} message; format it for that channel" if platform else ""
         
-        prompt = f"""{system_prompt}
+        return f"""{system_prompt}
 
 {context}
 
@@ -486,29 +1906,197 @@ Generate a warm, personalized proactive message to reach out to this customer fo
 - Reference their specific situation or Tet plans
 - Suggest 1-2 relevant insurance products
 - Create natural urgency based on the current phase
-- Keep it friendly and not too salesy (3-5 sentences)"""
-
+- Keep it friendly and not too salesy (3-5 sentences){channel}"""
+    
+    def get_proactive_message(self) -> str:
+        """Generate proactive outreach message"""
+        
+        prompt = self._build_proactive_prompt()
+        
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            with self._span('llm'):
+                message = self._scheduled(PriorityScheduler.BROWSING).generate(prompt)
         except Exception as e:
-            return f"Chúc mừng năm mới! 🧧 (Error generating message: {str(e)})"
+            self._record_key_result(e)
+            return self.rule_agent.generate_greeting()
+        
+        self._record_key_result()
+        return message
+    
+    def get_proactive_message_stream(self) -> Iterator[str]:
+        """Stream the proactive outreach message chunk by chunk"""
+        
+        prompt = self._build_proactive_prompt()
+        
+        try:
+            yield from self._scheduled(PriorityScheduler.BROWSING).stream(prompt)
+        except Exception as e:
+            self._record_key_result(e)
+            yield self.rule_agent.generate_greeting()
+            return
+        
+        self._record_key_result()
+    
+    async def get_proactive_message_async(self, platform: str = None, deadline: float = None) -> str:
+        """Proactive message through the shared AsyncLLMClient
+        
+        Unlike get_proactive_message, errors are raised instead of replaced by a
+        fallback greeting, so batch callers can record and retry them.
+        """
+        
+        prompt = self._build_proactive_prompt(platform)
+        
+        try:
+            with self._span('llm'):
+                message = await self.async_llm_client.generate(
+                    self.llm, prompt, deadline=deadline, priority=PriorityScheduler.BROWSING
+                )
+        except Exception as e:
+            self._record_key_result(e)
+            raise
+        
+        self._record_key_result()
+        return message
 
 
-def init_gemini_model(api_key: str):
-    """Initialize Gemini model with API key"""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        # Test the model
-        test_response = model.generate_content("Say hello")
-        return model, None
-    except Exception as e:
-        return None, str(e)
+class AgentPool:
+    """Bounded LRU registry of live agents keyed by (API key hash, customer, phase)
+    
+    Reusing an agent skips LLM backend setup (GenerativeModel creation) and
+    the knowledge base build on every turn. A pooled agent is shared by every
+    session with the same key, customer and phase, possibly on concurrent
+    threads, so it is never given session state: its knowledge overlay is
+    frozen, and sessions run turns on a for_session() view holding their own
+    memory.
+    """
+    
+    def __init__(self, max_size: int = 256, knowledge_index_path: str = None,
+                 key_validator: APIKeyValidator = None):
+        self.max_size = max_size
+        self.knowledge_index_path = knowledge_index_path
+        self.key_validator = key_validator
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(api_key: str, customer_profile: Dict, phase: str) -> tuple:
+        """Pool key; the raw API key is never stored"""
+        return (APIKeyValidator.key_hash(api_key), customer_profile['name'], phase)
+    
+    def get(self, api_key: str, customer_profile: Dict, phase: str) -> 'TetInsuranceAgent':
+        """Return the live agent for this key, building (and possibly evicting) on a miss"""
+        key = self.make_key(api_key, customer_profile, phase)
+        
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None and agent.profile == customer_profile:
+                self._agents.move_to_end(key)
+                self.hits += 1
+                return agent
+        
+        # Build outside the lock so one slow construction doesn't block other sessions
+        agent = TetInsuranceAgent(api_key, customer_profile, phase,
+                                  knowledge_index_path=self.knowledge_index_path,
+                                  key_validator=self.key_validator)
+        agent.knowledge_base.overlay.freeze()
+        
+        with self._lock:
+            self.misses += 1
+            self._agents[key] = agent
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_size:
+                self._agents.popitem(last=False)
+                self.evictions += 1
+        
+        return agent
+    
+    def invalidate(self, api_key: str = None, customer_name: str = None, phase: str = None) -> int:
+        """Drop every agent matching the given fields (None matches anything)"""
+        key_hash = APIKeyValidator.key_hash(api_key) if api_key else None
+        
+        with self._lock:
+            stale = [
+                key for key in self._agents
+                if (key_hash is None or key[0] == key_hash)
+                and (customer_name is None or key[1] == customer_name)
+                and (phase is None or key[2] == phase)
+            ]
+            for key in stale:
+                del self._agents[key]
+        
+        return len(stale)
+    
+    def stats(self) -> Dict[str, int]:
+        """Pool size and hit/miss/eviction counters"""
+        return {
+            'size': len(self._agents),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+    
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+@st.cache_resource(show_spinner=False)
+def get_agent_pool() -> AgentPool:
+    """Process-wide agent pool shared by all Streamlit sessions"""
+    return AgentPool(max_size=config.AGENT_POOL_SIZE, knowledge_index_path=config.KNOWLEDGE_INDEX_DIR,
+                     key_validator=get_key_validator())
+
+
+def get_session_agent(api_key: str) -> 'TetInsuranceAgent':
+    """View of the pooled agent for this session's customer/phase, with the session's own memory"""
+    agent = get_agent_pool().get(
+        api_key,
+        st.session_state.customer_profile,
+        st.session_state.current_phase
+    )
+    return agent.for_session(st.session_state.short_term_memory)
+
+
+def stream_into_chat(chat_container, chunks: Iterator[str], user_message: str = None) -> str:
+    """Render a streamed assistant reply (after the user's message, if given) and return the full text"""
+    with chat_container:
+        if user_message:
+            with st.chat_message("user"):
+                st.markdown(user_message)
+        with st.chat_message("assistant"):
+            return st.write_stream(chunks)
+
+
+def validate_api_key(api_key: str) -> tuple:
+    """(valid, error) for the entered key; only the Gemini backend needs a real key"""
+    if config.LLM_BACKEND != 'gemini':
+        return True, None
+    return get_key_validator().check(api_key)
 
 
 # Streamlit UI
 def main():
+    # Page configuration
+    st.set_page_config(
+        page_title="Tet Insurance AI Agent - Gemini Powered",
+        page_icon="🧧",
+        layout="wide"
+    )
+    
+    # Initialize session state
+    if 'messages' not in st.session_state:
+        st.session_state.messages = []
+    if 'customer_profile' not in st.session_state:
+        st.session_state.customer_profile = None
+    if 'current_phase' not in st.session_state:
+        st.session_state.current_phase = "pre-tet"
+    if 'short_term_memory' not in st.session_state:
+        st.session_state.short_term_memory = ShortTermMemory(max_items=10)
+    if 'conversation_summary' not in st.session_state:
+        st.session_state.conversation_summary = ""
+    
     st.title("🧧 Tet Insurance AI Agent - Gemini Powered")
     st.markdown("*AI Agent với Gemini LLM, Knowledge Base & Memory*")
     
@@ -525,15 +2113,15 @@ def main():
         )
         
         if gemini_api_key:
-            if 'api_key_validated' not in st.session_state:
-                model, error = init_gemini_model(gemini_api_key)
-                if error:
-                    st.error(f"❌ Invalid API key: {error}")
-                    st.session_state.api_key_validated = False
-                else:
-                    st.success("✅ API key validated!")
-                    st.session_state.gemini_model = model
-                    st.session_state.api_key_validated = True
+            # Cached per key hash, so this is a dict lookup on every rerun after the first check
+            valid, error = validate_api_key(gemini_api_key)
+            st.session_state.api_key_validated = valid is not False
+            if valid:
+                st.success("✅ API key validated!")
+            elif valid is None:
+                st.info("🔑 API key will be verified on the first request")
+            else:
+                st.error(f"❌ Invalid API key: {error}")
         else:
             st.warning("⚠️ Please enter Gemini API key to use the agent")
             st.info("Get free API key at: https://makersuite.google.com/app/apikey")
@@ -545,10 +2133,12 @@ def main():
         
         customer_profiles = {
             "Minh (28) - Young Professional": {
+                "customer_id": "C001",
                 "name": "Minh Nguyen",
                 "age": 28,
                 "segment": "Young Professional",
                 "tone": "casual",
+                "greeting": "Chào Minh! 🧧",
                 "has_motor": True,
                 "has_health": False,
                 "has_life": False,
@@ -557,10 +2147,12 @@ def main():
                 "tet_plans": "Traveling home to Vinh (300km)"
             },
             "Linh (35) - Family with Kids": {
+                "customer_id": "C002",
                 "name": "Linh Tran",
                 "age": 35,
                 "segment": "Family with Kids",
                 "tone": "friendly",
+                "greeting": "Chúc mừng năm mới chị Linh!",
                 "has_motor": True,
                 "has_health": True,
                 "has_life": False,
@@ -571,10 +2163,12 @@ def main():
                 "tet_plans": "Hosting family gathering at home"
             },
             "Tuấn (55) - Senior": {
+                "customer_id": "C003",
                 "name": "Tuấn Lê",
                 "age": 55,
                 "segment": "Senior/Retiree",
                 "tone": "formal",
+                "greeting": "Kính chúc quý khách năm mới an khang thịnh vượng",
                 "has_motor": True,
                 "has_health": True,
                 "has_life": True,
@@ -583,10 +2177,12 @@ def main():
                 "tet_plans": "Visiting children in Saigon"
             },
             "Hùng (42) - Business Owner": {
+                "customer_id": "C004",
                 "name": "Hùng Pham",
                 "age": 42,
                 "segment": "Small Business Owner",
                 "tone": "professional",
+                "greeting": "Chào anh Hùng! Chúc năm mới phát tài phát lộc!",
                 "has_motor": True,
                 "has_health": True,
                 "has_life": False,
@@ -635,15 +2231,22 @@ def main():
         
         st.session_state.current_phase = phase_options[selected_phase]
         
+        # Drop the pooled agent for the previous selection when profile or phase changes
+        agent_selection = (st.session_state.customer_profile['name'], st.session_state.current_phase)
+        previous_selection = st.session_state.get('agent_selection')
+        if gemini_api_key and previous_selection and previous_selection != agent_selection:
+            get_agent_pool().invalidate(gemini_api_key, *previous_selection)
+        st.session_state.agent_selection = agent_selection
+        
         # Display phase info
-        phase_info = {
-            "pre-tet": {"discount": "15%", "focus": "Planning & Preparation"},
-            "tet-peak": {"discount": "30%", "focus": "Urgent Coverage & Flash Sales"},
-            "post-tet": {"discount": "10%", "focus": "Renewals & Resolutions"}
+        phase_focus = {
+            "pre-tet": "Planning & Preparation",
+            "tet-peak": "Urgent Coverage & Flash Sales",
+            "post-tet": "Renewals & Resolutions"
         }
         
-        current_phase_info = phase_info[st.session_state.current_phase]
-        st.info(f"**Discount:** {current_phase_info['discount']}\n\n**Focus:** {current_phase_info['focus']}")
+        current_phase = st.session_state.current_phase
+        st.info(f"**Discount:** {PHASE_DISCOUNTS[current_phase]}%\n\n**Focus:** {phase_focus[current_phase]}")
         
         st.divider()
         
@@ -653,13 +2256,12 @@ def main():
         if st.button("🎯 Generate Proactive Message", use_container_width=True):
             if not gemini_api_key or not st.session_state.get('api_key_validated'):
                 st.error("Please enter valid Gemini API key first!")
+            elif config.STREAM_RESPONSES:
+                # Streamed into the chat container below
+                st.session_state.pending_proactive = True
             else:
                 with st.spinner("Generating personalized message..."):
-                    agent = TetInsuranceAgent(
-                        gemini_api_key,
-                        st.session_state.customer_profile,
-                        st.session_state.current_phase
-                    )
+                    agent = get_session_agent(gemini_api_key)
                     
                     proactive_msg = agent.get_proactive_message()
                     
@@ -674,11 +2276,7 @@ def main():
             if not gemini_api_key or not st.session_state.get('api_key_validated'):
                 st.error("Please enter valid Gemini API key first!")
             else:
-                agent = TetInsuranceAgent(
-                    gemini_api_key,
-                    st.session_state.customer_profile,
-                    st.session_state.current_phase
-                )
+                agent = get_session_agent(gemini_api_key)
                 
                 docs = agent.knowledge_base.get_all_documents()
                 
@@ -690,7 +2288,7 @@ def main():
         
         if st.button("🔄 Reset Conversation", use_container_width=True):
             st.session_state.messages = []
-            st.session_state.short_term_memory = []
+            st.session_state.short_term_memory.clear()
             st.session_state.conversation_summary = ""
             st.rerun()
         
@@ -699,7 +2297,7 @@ def main():
         # Statistics
         st.subheader("📈 Statistics")
         st.metric("Total Messages", len(st.session_state.messages))
-        st.metric("Memory Items", len(st.session_state.get('short_term_memory', [])))
+        st.metric("Memory Items", len(st.session_state.short_term_memory))
         st.metric("Current Phase", st.session_state.current_phase.replace("-", " ").title())
     
     # Main Chat Interface
@@ -715,6 +2313,19 @@ def main():
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
         
+        # Proactive message requested from the sidebar (streaming mode)
+        if st.session_state.pop('pending_proactive', False):
+            agent = get_session_agent(gemini_api_key)
+            
+            proactive_msg = stream_into_chat(chat_container, agent.get_proactive_message_stream())
+            
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": proactive_msg
+            })
+            
+            st.rerun()
+        
         # Chat input
         if gemini_api_key and st.session_state.get('api_key_validated'):
             user_input = st.chat_input("Nhắn tin với AI Agent...")
@@ -726,27 +2337,21 @@ def main():
                     "content": user_input
                 })
                 
+                # Pooled agent with this session's short-term memory
+                agent = get_session_agent(gemini_api_key)
+                
                 # Generate AI response
-                with st.spinner("Agent đang suy nghĩ..."):
-                    agent = TetInsuranceAgent(
-                        gemini_api_key,
-                        st.session_state.customer_profile,
-                        st.session_state.current_phase
-                    )
-                    
-                    # Update agent's short-term memory from session
-                    if st.session_state.short_term_memory:
-                        agent.short_term_memory.items = st.session_state.short_term_memory
-                    
-                    response = agent.generate_response(user_input)
-                    
-                    # Save updated memory to session
-                    st.session_state.short_term_memory = agent.short_term_memory.items
-                    
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response
-                    })
+                if config.STREAM_RESPONSES:
+                    response = stream_into_chat(chat_container, agent.generate_response_stream(user_input), user_input)
+                else:
+                    with st.spinner("Agent đang suy nghĩ..."):
+                        response = agent.generate_response(user_input)
+                st.session_state.last_context_stats = agent.last_context_stats
+                
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": response
+                })
                 
                 st.rerun()
         else:
@@ -772,24 +2377,19 @@ def main():
                             "content": prompt
                         })
                         
-                        with st.spinner("Agent đang suy nghĩ..."):
-                            agent = TetInsuranceAgent(
-                                gemini_api_key,
-                                st.session_state.customer_profile,
-                                st.session_state.current_phase
-                            )
-                            
-                            if st.session_state.short_term_memory:
-                                agent.short_term_memory.items = st.session_state.short_term_memory
-                            
-                            response = agent.generate_response(prompt)
-                            
-                            st.session_state.short_term_memory = agent.short_term_memory.items
-                            
-                            st.session_state.messages.append({
-                                "role": "assistant",
-                                "content": response
-                            })
+                        agent = get_session_agent(gemini_api_key)
+                        
+                        if config.STREAM_RESPONSES:
+                            response = stream_into_chat(chat_container, agent.generate_response_stream(prompt), prompt)
+                        else:
+                            with st.spinner("Agent đang suy nghĩ..."):
+                                response = agent.generate_response(prompt)
+                        st.session_state.last_context_stats = agent.last_context_stats
+                        
+                        st.session_state.messages.append({
+                            "role": "assistant",
+                            "content": response
+                        })
                         
                         st.rerun()
     
@@ -833,6 +2433,44 @@ def main():
         4. **Gemini LLM** → Generates natural response
         5. **Memory Update** → Stores conversation context
         """)
+        
+        # Debug panel: per-stage latency percentiles
+        if config.SHOW_DEBUG_INFO and config.TRACK_RESPONSE_TIME:
+            st.divider()
+            st.subheader("⏱️ Latency (debug)")
+            
+            tracker = get_latency_tracker()
+            snapshot = tracker.snapshot()
+            if snapshot:
+                st.dataframe(
+                    [
+                        {
+                            "stage": stage,
+                            "count": stats['count'],
+                            "p50 (ms)": round(stats['p50'] * 1000, 2),
+                            "p95 (ms)": round(stats['p95'] * 1000, 2),
+                            "p99 (ms)": round(stats['p99'] * 1000, 2)
+                        }
+                        for stage, stats in snapshot.items()
+                    ],
+                    use_container_width=True,
+                    hide_index=True
+                )
+                st.caption(f"Target response time: {config.TARGET_RESPONSE_TIME}s")
+                context_stats = st.session_state.get('last_context_stats')
+                if context_stats:
+                    st.caption(
+                        f"Last context: {context_stats['tokens']}/{context_stats['budget']} tokens "
+                        f"({context_stats['lines_dropped']} lines dropped"
+                        f"{', truncated' if context_stats['truncated'] else ''}), "
+                        f"full prompt ~{context_stats.get('prompt_tokens', 0)} tokens"
+                    )
+                st.download_button("Export JSON", tracker.to_json(), file_name="latency.json")
+                st.download_button("Export Prometheus", tracker.to_prometheus(), file_name="latency.prom")
+            else:
+                st.info("No timings yet. Start a conversation!")
+            
+            st.caption(f"Routes: {get_router().stats()} | Cache: {get_response_cache().stats()}")
     
     # Knowledge Base Viewer (Modal)
     if st.session_state.get('show_knowledge'):
@@ -866,16 +2504,16 @@ def main():
         st.divider()
         st.subheader("🧠 Short-Term Memory")
         
-        memory_items = st.session_state.get('short_term_memory', [])
+        memory_items = st.session_state.short_term_memory
         
         if memory_items:
             for i, item in enumerate(reversed(memory_items), 1):
-                with st.expander(f"Memory {i}: {item['type']}"):
-                    st.write(f"**Type:** {item['type']}")
-                    st.write(f"**Content:** {item['content']}")
-                    st.write(f"**Time:** {item['timestamp']}")
-                    if item.get('metadata'):
-                        st.write(f"**Metadata:** {item['metadata']}")
+                with st.expander(f"Memory {i}: {item.type}"):
+                    st.write(f"**Type:** {item.type}")
+                    st.write(f"**Content:** {item.content}")
+                    st.write(f"**Time:** {datetime.fromtimestamp(item.timestamp).isoformat(timespec='seconds')}")
+                    if item.metadata:
+                        st.write(f"**Metadata:** {item.metadata}")
         else:
             st.info("No memory items yet. Start a conversation!")
         